@@ -20,20 +20,28 @@ import os
 import re
 import bs4
 import sys
+import json
 import time
 import glob
 import math
 import tqdm
 import gzip
-import keras
+import queue
+import struct
+import shutil
+import hashlib
+import sqlite3
 import Bio.PDB
 import datetime
 import requests
 import argparse
+import threading
+import collections
+import socketserver
+import concurrent.futures
 import numpy as np
 import pandas as pd
 import urllib.request
-import tensorflow as tf
 import Bio.pairwise2
 from pyrosetta import *
 from pyrosetta.toolbox import *
@@ -42,10 +50,434 @@ init('-out:level 0 -no_his_his_pairE -extrachi_cutoff 1 -multi_cool_annealer 10
 parser = argparse.ArgumentParser(description='De Novo Protein Design Neural Network')
 parser.add_argument('-d', '--dataset', action='store_true', help='Build the dataset')
 parser.add_argument('-t', '--train', action='store_true', help='Train the neural network')
+parser.add_argument('-e', '--export', action='store_true', help='Export the trained weights for sampling without TensorFlow')
 parser.add_argument('-f', '--fragments', nargs='+', metavar='', help='Generate a structure and get its fragments from the Robetta server, you must specify a username')
+parser.add_argument('-D', '--daemon', metavar='', help='Keep PyRosetta and TensorFlow loaded and serve requests on a Unix socket')
+parser.add_argument('-s', '--summary', nargs='?', const='funnel.jsonl', metavar='', help='Summarise the acceptance funnel of generated structures')
+parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), metavar='', help='Number of worker processes used to build the dataset')
 args = parser.parse_args()
 
+class DSSPCache():
+	'''
+	A persistent on-disk cache of DSSP results keyed by a hash of each file's
+	content, so the dssp binary is only run once for every unique structure.
+	Each entry stores the DSSP index, amino acid, secondary structure,
+	relative accessibility, and phi/psi angles of every residue in a compact
+	binary form (16 bytes per residue). Workers only add entries, the parent
+	process calls evict() once its work is done to remove the least recently
+	used entries if the cache grew beyond its size cap
+	'''
+	def __init__(self, directory='~/.cache/RamaNet/dssp', cap=2**30):
+		self.directory = os.path.expanduser(directory)
+		self.cap = cap
+	def __call__(self, filename):
+		'''
+		Returns the DSSP of a file as a list of (index, aa, ss, acc, phi, psi)
+		tuples, indexed the same way as the items of Bio.PDB.DSSP, a residue without
+		an accessibility (a non-standard amino acid) has an acc of 'NA' like in Bio.PDB.DSSP
+		'''
+		with open(filename, 'rb') as f:
+			key = hashlib.sha1(f.read() + b'Wilke').hexdigest()
+		path = os.path.join(self.directory, key[:2], key)
+		try:
+			with open(path, 'rb') as f:
+				data = f.read()
+			os.utime(path)																	#Mark as recently used
+			return(self.decode(data))
+		except (FileNotFoundError, struct.error, ValueError):
+			pass
+		structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', filename)
+		dssp = Bio.PDB.DSSP(structure[0], filename, acc_array='Wilke')
+		data = self.encode([residue[:6] for residue in dssp])
+		self.store(path, data)
+		return(self.decode(data))
+	def encode(self, residues):
+		''' Pack a list of DSSP residue tuples into bytes '''
+		index = np.array([r[0] for r in residues], dtype=np.int32)
+		aa = ''.join(r[1] for r in residues).encode()
+		ss = ''.join(r[2] for r in residues).encode()
+		acc = np.array([r[3] if r[3] != 'NA' else np.nan for r in residues], dtype=np.float16)	#NaN marks an 'NA' accessibility
+		phi = np.array([r[4] for r in residues], dtype=np.float32)
+		psi = np.array([r[5] for r in residues], dtype=np.float32)
+		header = struct.pack('<I', len(residues))
+		return(header + index.tobytes() + aa + ss + acc.tobytes() + phi.tobytes() + psi.tobytes())
+	def decode(self, data):
+		''' Unpack the bytes of a cache entry into a list of DSSP residue tuples '''
+		n = struct.unpack_from('<I', data)[0]
+		if len(data) != 4 + 16*n:
+			raise ValueError('Corrupt DSSP cache entry')
+		bounds = np.cumsum([4, 4*n, n, n, 2*n, 4*n, 4*n])
+		index, aa, ss, acc, phi, psi = [data[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+		index = np.frombuffer(index, dtype=np.int32).tolist()
+		acc = ['NA' if np.isnan(a) else a for a in np.frombuffer(acc, dtype=np.float16).tolist()]
+		phi = np.frombuffer(phi, dtype=np.float32).tolist()
+		psi = np.frombuffer(psi, dtype=np.float32).tolist()
+		return(list(zip(index, aa.decode(), ss.decode(), acc, phi, psi)))
+	def store(self, path, data):
+		''' Atomically write a cache entry '''
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		temp = '{}.{}'.format(path, os.getpid())
+		with open(temp, 'wb') as f:
+			f.write(data)
+		os.replace(temp, path)
+	def entries(self):
+		''' All the entries currently in the cache '''
+		for sub in os.scandir(self.directory):
+			if sub.is_dir():
+				for entry in os.scandir(sub.path):
+					if '.' not in entry.name:
+						yield(entry)
+	def evict(self):
+		''' If the cache is over its cap remove the least recently used entries until under 90% of the cap, stats every entry so only the parent process calls it '''
+		if not os.path.isdir(self.directory):
+			return
+		entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in self.entries()]
+		size = sum(e[1] for e in entries)
+		if size <= self.cap:
+			return
+		for mtime, length, path in sorted(entries):
+			if size <= 0.9 * self.cap:
+				break
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+			size -= length
+
+DSSP = DSSPCache()
+
+def RadiusOfGyration(coord, element):
+	'''
+	Calculate the mass weighted radius of gyration of an (N, 3) array of atom coordinates
+	given an array of the atoms' element symbols. A stacked (B, N, 3) batch of structures
+	returns an array of B values, unknown elements (or padding) are given a mass of 0
+	'''
+	Mass = {'C':12.0107, 'O':15.9994, 'N':14.0067, 'S':32.0650, 'H':1.00794}
+	coord = np.asarray(coord, dtype=np.float64)
+	element = np.asarray(element)
+	mass = np.zeros(element.shape)
+	for symbol, value in Mass.items(): mass[element == symbol] = value
+	mass = np.broadcast_to(mass, coord.shape[:-1])
+	tmass = mass.sum(axis=-1)
+	center = np.einsum('...n,...ni->...i', mass, coord) / tmass[..., None]
+	deviation = coord - center[..., None, :]
+	rg = np.sqrt(np.einsum('...n,...ni,...ni->...', mass, deviation, deviation) / tmass)
+	return(rg)
+
+def Kabsch(X, Y):
+	'''
+	Superimpose a (B, N, 3) batch of coordinates onto another using the Kabsch
+	algorithm and return the B minimum RMSD values in a single vectorised pass
+	'''
+	X = X - X.mean(axis=1, keepdims=True)
+	Y = Y - Y.mean(axis=1, keepdims=True)
+	H = np.einsum('bni,bnj->bij', X, Y)
+	U, S, Vt = np.linalg.svd(H)
+	d = np.sign(np.linalg.det(U) * np.linalg.det(Vt))
+	S[:, -1] *= d																		#Avoid reflections
+	E = (X**2).sum(axis=(1, 2)) + (Y**2).sum(axis=(1, 2)) - 2 * S.sum(axis=1)
+	return(np.sqrt(np.maximum(E, 0) / X.shape[1]))
+
+class Clusters():
+	''' Disjoint sets of item indices, the smallest index of each set is its representative '''
+	def __init__(self, size):
+		self.parent = list(range(size))
+	def find(self, i):
+		''' Return the representative of the set item i belongs to '''
+		while self.parent[i] != i:
+			self.parent[i] = self.parent[self.parent[i]]
+			i = self.parent[i]
+		return(i)
+	def union(self, i, j):
+		''' Merge the sets of items i and j '''
+		i, j = self.find(i), self.find(j)
+		if i != j: self.parent[max(i, j)] = min(i, j)
+
+def Row(values, width):
+	''' A float32 dataset row of the values, padded with zeros or truncated to width '''
+	values = np.asarray(values, dtype=np.float32)[:width]
+	row = np.zeros(width, dtype=np.float32)
+	row[:len(values)] = values
+	return(row)
+
+def Codes(text, width):
+	''' A uint8 dataset row of the ASCII codes of a string, padded with zeros or truncated to width '''
+	codes = np.frombuffer(text.encode('ascii')[:width], dtype=np.uint8)
+	row = np.zeros(width, dtype=np.uint8)
+	row[:len(codes)] = codes
+	return(row)
+
+class ShardWriter():
+	'''
+	Buffered writer of a binary dataset, rows are typed NumPy arrays that are collected in
+	memory and written as .npy shards of a fixed number of rows into a {name}/ directory,
+	along with an ids.csv side table of the structure each row came from (the file name
+	without its extension, so the rows of every dataset can be joined) and a columns.txt
+	file of the column names
+	'''
+	def __init__(self, name, columns, dtype=np.float32, size=4096):
+		self.name = name
+		self.dtype = dtype
+		self.size = size
+		self.shard = 0
+		self.ids = []
+		self.rows = []
+		if os.path.isdir(name):
+			shutil.rmtree(name)
+		os.makedirs(name)
+		with open('{}/columns.txt'.format(name), 'w') as File:
+			File.write(''.join('{}\n'.format(column) for column in columns))
+		self.index = open('{}/ids.csv'.format(name), 'w')
+		self.index.write('PDB_ID\n')
+	def __enter__(self):
+		return(self)
+	def __exit__(self, *exception):
+		self.close()
+	def write(self, ID, row):
+		''' Add one structure's row to the dataset '''
+		self.ids.append(ID.split('.')[0])
+		self.rows.append(row)
+		if len(self.rows) == self.size:
+			self.flush()
+	def flush(self):
+		''' Write the buffered rows as the next shard '''
+		if self.rows == []:
+			return
+		np.save('{}/{:05d}.npy'.format(self.name, self.shard), np.array(self.rows, dtype=self.dtype))
+		self.index.write(''.join('{}\n'.format(ID) for ID in self.ids))
+		self.index.flush()
+		self.shard += 1
+		self.ids = []
+		self.rows = []
+	def close(self):
+		self.flush()
+		self.index.close()
+
+class Shards():
+	'''
+	Loader of a binary dataset written by ShardWriter, the shards are memory mapped so rows
+	are only read from disk when indexed. Index with an int, a slice, or an array of row
+	numbers to get a NumPy array, ids and columns are the side tables. The rows of a uint8
+	dataset of strings (FASTA/ and SS/) are decoded with text()
+	'''
+	def __init__(self, name):
+		with open('{}/ids.csv'.format(name), 'r') as File:
+			self.ids = [line.strip() for line in File][1:]
+		with open('{}/columns.txt'.format(name), 'r') as File:
+			self.columns = [line.strip() for line in File]
+		self.shards = [np.load(shard, mmap_mode='r') for shard in sorted(glob.glob('{}/*.npy'.format(name)))]
+		self.offsets = np.cumsum([0] + [len(shard) for shard in self.shards])
+		self.dtype = np.result_type(*self.shards) if self.shards else np.float32
+		self.shape = (int(self.offsets[-1]), len(self.columns))
+	def __len__(self):
+		return(self.shape[0])
+	def __getitem__(self, index):
+		if isinstance(index, (int, np.integer)):
+			if index < 0:
+				index += len(self)
+			if not 0 <= index < len(self):
+				raise IndexError('row {} is out of range'.format(index))
+			shard = np.searchsorted(self.offsets, index, side='right') - 1
+			return(self.shards[shard][index - self.offsets[shard]])
+		rows = np.arange(len(self))[index]
+		shard = np.searchsorted(self.offsets, rows, side='right') - 1
+		data = np.empty((len(rows),) + self.shards[0].shape[1:], dtype=self.dtype) if self.shards else np.empty((0,), self.dtype)
+		for number in np.unique(shard):
+			mask = shard == number
+			data[mask] = self.shards[number][rows[mask] - self.offsets[number]]
+		return(data)
+	def text(self, index):
+		''' The strings of a uint8 dataset written with Codes(), a list of them unless index is an int '''
+		rows = self[index]
+		if rows.ndim == 1:
+			return(rows.tobytes().rstrip(b'\0').decode('ascii'))
+		return([row.tobytes().rstrip(b'\0').decode('ascii') for row in rows])
+
+class Journal():
+	'''
+	An SQLite journal of the dataset build, it records the state of every file at every
+	stage (running, done, failed, or rejected with a reason) and which whole stages are
+	finished so an interrupted build resumes where it stopped. Rejected files are kept
+	on disk and skipped by every later stage until they are purged. Only the parent
+	process writes to the journal, a chunk of files at a time
+	'''
+	def __init__(self, filename='journal.db'):
+		self.filename = filename
+		connection = self.connect()
+		with connection:
+			connection.execute('CREATE TABLE IF NOT EXISTS files (stage TEXT, file TEXT, state TEXT, reason TEXT, PRIMARY KEY (stage, file))')
+			connection.execute('CREATE TABLE IF NOT EXISTS stages (stage TEXT PRIMARY KEY)')
+	def __getstate__(self):
+		return({'filename': self.filename})
+	def connect(self):
+		''' Return this process's connection to the journal '''
+		if getattr(self, 'pid', None) != os.getpid():
+			self.connection = sqlite3.connect(self.filename, timeout=600)
+			self.connection.execute('PRAGMA journal_mode=WAL')
+			self.pid = os.getpid()
+		return(self.connection)
+	def mark(self, stage, File, state, reason=None):
+		''' Record the state of a file at a stage '''
+		with self.connect() as connection:
+			connection.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', (stage, File, state, reason))
+	def start(self, stage, Files):
+		''' Mark a chunk of files as running in one transaction '''
+		with self.connect() as connection:
+			connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, 'running', NULL)", [(stage, File) for File in Files])
+	def settle(self, stage, results):
+		''' Record the final (File, state, reason) of a chunk of processed files in one transaction, unless the stage already rejected them '''
+		with self.connect() as connection:
+			connection.executemany("UPDATE files SET state = ?, reason = ? WHERE stage = ? AND file = ? AND state IN ('running', 'ran')", [(state, reason, stage, File) for File, state, reason in results])
+	def reject(self, stage, File, reason):
+		''' Reject a file, every later stage skips it '''
+		self.mark(stage, File, 'rejected', reason)
+	def rejected(self):
+		''' Return the set of all rejected files '''
+		rows = self.connect().execute("SELECT DISTINCT file FROM files WHERE state = 'rejected'")
+		return({File for File, in rows})
+	def states(self, stage):
+		''' Return the state of every file the stage has seen '''
+		rows = self.connect().execute('SELECT file, state FROM files WHERE stage = ?', (stage,))
+		return(dict(rows))
+	def finished(self, stage):
+		''' Return whether a whole stage is finished '''
+		rows = self.connect().execute('SELECT 1 FROM stages WHERE stage = ?', (stage,))
+		return(rows.fetchone() is not None)
+	def finish(self, stage):
+		''' Record a whole stage as finished '''
+		with self.connect() as connection:
+			connection.execute('INSERT OR IGNORE INTO stages VALUES (?)', (stage,))
+
+def Job(job):
+	''' Run a stage function on one file, this is what each Dataset worker process executes '''
+	function, TheFile, arguments = job
+	try:
+		return((TheFile, function(TheFile, *arguments), None))
+	except Exception as TheError:
+		return((TheFile, None, str(TheError)))
+
+def Jobs(jobs):
+	''' Run a chunk of jobs inside a Dataset worker process '''
+	return([Job(job) for job in jobs])
+
 class Dataset():
+	def __init__(self, workers=1, journal='journal.db'):
+		self.workers = workers
+		self.journal = Journal(journal)
+	def Map(self, function, directory, *arguments, files=None, stage=None):
+		'''
+		Runs a per-file stage function on every file in a directory (or only on the given
+		list of its files) that the journal has not rejected, across a pool of self.workers
+		processes (in this process if workers is 1). Yields (File, result, error) in sorted
+		file order so the merged output of every stage is deterministic, the progress bar
+		and the failure count are aggregated across all the workers. If a stage name is
+		given files the stage already settled are skipped, and every chunk of files is
+		journaled as running when it is submitted and settled when it returns, one
+		transaction each. The files left running by a crashed process (a segmentation
+		fault) are retried in chunks of one, and if they crash again one at a time in
+		their own process so the culprit is rejected
+		'''
+		rejected = self.journal.rejected()
+		pdbfilelist = sorted(File for File in (os.listdir(directory) if files is None else files) if File not in rejected)
+		strikes = collections.Counter()
+		if stage is not None:
+			states = self.journal.states(stage)
+			pdbfilelist = [File for File in pdbfilelist if states.get(File) in (None, 'running', 'ran')]
+			# Files left running by a crashed build are isolated right away
+			strikes.update({File: 2 for File in pdbfilelist if states.get(File) in ('running', 'ran')})
+		total = len(pdbfilelist)
+		failed = 0
+		bar = tqdm.tqdm(total=total)
+		try:
+			while pdbfilelist:
+				for File in [File for File in pdbfilelist if strikes[File] > 1]:
+					job = (function, '{}/{}'.format(directory, File), arguments)
+					self.journal.start(stage, [File])
+					with concurrent.futures.ProcessPoolExecutor(1) as pool:
+						try:
+							TheFile, result, TheError = pool.submit(Job, job).result()
+						except concurrent.futures.process.BrokenProcessPool:
+							self.journal.reject(stage, File, 'Crashed')
+							TheFile, result, TheError = job[1], None, 'Crashed'
+					pdbfilelist.remove(File)
+					bar.update(1)
+					if TheError is not None:
+						failed += 1
+					yield(File, result, TheError)
+					self.journal.settle(stage, [(File, 'done' if TheError is None else 'failed', TheError)])
+				retry = [File for File in pdbfilelist if strikes[File] == 1]
+				rest = [File for File in pdbfilelist if strikes[File] == 0]
+				size = max(1, min(64, len(rest)//(self.workers*4)))
+				chunks = [[File] for File in retry] + [rest[n:n+size] for n in range(0, len(rest), size)]
+				handled = set()
+				try:
+					for results in self.Chunks(function, directory, arguments, chunks, stage):
+						settled = []
+						for TheFile, result, TheError in results:
+							File = os.path.basename(TheFile)
+							handled.add(File)
+							bar.update(1)
+							if TheError is not None:
+								failed += 1
+							yield(File, result, TheError)
+							settled.append((File, 'done' if TheError is None else 'failed', TheError))
+						if stage is not None:
+							self.journal.settle(stage, settled)
+				except concurrent.futures.process.BrokenProcessPool:
+					if stage is None:
+						raise
+					states = self.journal.states(stage)
+					suspects = [File for File in pdbfilelist if File not in handled and states.get(File) == 'running']
+					if not suspects:
+						raise
+					strikes.update(suspects)
+					print('\x1b[31m[-] A worker process crashed, retrying the {} files it could have been running\x1b[0m'.format(len(suspects)))
+				pdbfilelist = [File for File in pdbfilelist if File not in handled]
+		finally:
+			bar.close()
+			DSSP.evict()
+		if failed > 0:
+			print('\x1b[31m[-] {} of {} files failed\x1b[0m'.format(failed, total))
+	def Chunks(self, function, directory, arguments, chunks, stage=None):
+		''' Run chunks of files across the pool (in this process if workers is 1) with at most two chunks per worker in flight, every chunk is journaled as running in one transaction when it is submitted, yields the results of every chunk in order '''
+		def jobs(chunk):
+			return([(function, '{}/{}'.format(directory, File), arguments) for File in chunk])
+		if self.workers == 1:
+			for chunk in chunks:
+				if stage is not None:
+					self.journal.start(stage, chunk)
+				yield(Jobs(jobs(chunk)))
+			return
+		chunks = iter(chunks)
+		pending = collections.deque()
+		with concurrent.futures.ProcessPoolExecutor(self.workers) as pool:
+			while True:
+				while len(pending) < 2 * self.workers:
+					chunk = next(chunks, None)
+					if chunk is None:
+						break
+					if stage is not None:
+						self.journal.start(stage, chunk)
+					pending.append(pool.submit(Jobs, jobs(chunk)))
+				if not pending:
+					return
+				yield(pending.popleft().result())
+	def Stage(self, name, function, *arguments, **keywords):
+		''' Run a whole build stage unless the journal records it as finished '''
+		if self.journal.finished(name):
+			print('\x1b[32m[+] Skipping finished stage {}\x1b[0m'.format(name))
+			return
+		function(*arguments, **keywords)
+		self.journal.finish(name)
+	def Purge(self, directory):
+		''' Delete the files the journal rejected from a directory '''
+		rejected = self.journal.rejected()
+		purged = 0
+		for File in os.listdir(directory):
+			if File in rejected:
+				os.remove('{}/{}'.format(directory, File))
+				purged += 1
+		print('\x1b[32m[+] Purged {} rejected structures\x1b[0m'.format(purged))
 	def Database(self, TempDIR, FinalDIR):
 		'''
 		Downloads the entire PDB database from https://www.wwpdb.org/
@@ -53,7 +485,7 @@ class Dataset():
 		Generates a directory which contains all .PDB structure files
 		'''
 		os.system('rsync -rlpt -v -z --delete --port=33444 rsync.wwpdb.org::ftp/data/structures/divided/pdb/ ./{}'.format(TempDIR))
-		os.mkdir(FinalDIR)
+		os.makedirs(FinalDIR, exist_ok=True)
 		filelist = os.listdir(TempDIR)
 		print('\x1b[32m[+] Download complete\x1b[0m')
 		print('\x1b[32m[+] Moving files\x1b[0m')
@@ -69,349 +501,342 @@ class Dataset():
 		seperate .pdb files. Replaces each .ent.gz file with the .pdb file of each
 		chain
 		'''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		io = Bio.PDB.PDBIO()
-		os.chdir(directory)
 		print('\x1b[32m[+] Extracting files\x1b[0m')
-		for TheFile in tqdm.tqdm(pdbfilelist):
+		for File in os.listdir(directory):
+			if File.endswith('.tmp'):													#Leftovers of an interrupted run
+				os.remove('{}/{}'.format(directory, File))
+		done = {File.split('_')[0] for File in os.listdir(directory) if File.endswith('.pdb')}
+		files = []
+		for File in os.listdir(directory):
+			if not File.endswith('.ent.gz'):
+				continue
+			if File.split('.')[0].split('pdb')[1].upper() in done:					#Chains already extracted
+				os.remove('{}/{}'.format(directory, File))
+			else:
+				files.append(File)
+		for File, result, TheError in self.Map(self.ExtractFile, directory, files=files):
+			if TheError is not None:
+				print('\x1b[31m[-] Failed to extract\t{}\x1b[33m{}\x1b[0m'.format(File.upper(), TheError))
+			os.remove('{}/{}'.format(directory, File))
+	def ExtractFile(self, TheFile):
+		'''
+		Stream one .ent.gz file and route the ATOM and HETATM records of its first
+		model (first alternate location only) by chain ID into a .pdb file per chain
+		next to it, each chain's file is only written once the stream is complete
+		'''
+		directory, File = os.path.split(TheFile)
+		TheName = File.split('.')[0].split('pdb')[1].upper()
+		chains = {}
+		with gzip.open(TheFile, 'rt') as InFile:
+			for line in InFile:
+				if line.startswith('ENDMDL'):
+					break
+				if line.startswith(('ATOM  ', 'HETATM')) and line[16] in ' A':
+					chains.setdefault(line[21], []).append(line)
+		for chain, lines in chains.items():
+			filename = '{}/{}_{}.pdb'.format(directory, TheName, chain)
+			with open(filename + '.tmp', 'w') as OutFile:
+				for serial, line in enumerate(lines, 1):								#Renumber atoms as PDBIO does
+					OutFile.write('{}{:>5}{}'.format(line[:6], serial, line[11:]))
+				OutFile.write('TER   {:>5}      {}\n'.format(len(lines)+1, lines[-1][17:27]))
+				OutFile.write('END\n')
+			os.replace(filename + '.tmp', filename)
+		return(len(chains))
+	def Inspect(self, TheFile, NonProtein=False, Size=None, Break=False, Loops=None, Rg=None):
+		'''
+		Parses a structure once and evaluates all the enabled filters on it in
+		one pass, the DSSP binary is run at most once and only if a filter that
+		needs it is enabled. Returns (True, None) if the structure is kept or
+		(False, reason) if it is rejected. Like the separate filters it replaces, a
+		structure whose size cannot be found is kept by the Size filter, while an
+		error in the Loops filter rejects it
+		'''
+		structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', TheFile)
+		Type = Bio.PDB.Polypeptide.PPBuilder().build_peptides(structure, aa_only=True)
+		if NonProtein and Type == []:													#Non-protein structures have Type = []
+			return(False, 'NonProtein')
+		if Break and len(Type) > 1:														#Broken chains have more than one peptide
+			return(False, 'Break')
+		if Rg is not None:
+			atoms = list(structure.get_atoms())
+			coord = np.array([atom.get_coord() for atom in atoms])
+			rg = RadiusOfGyration(coord, [atom.element for atom in atoms])
+			if rg <= Rg:
+				return(False, 'Rg')
+		if Size is not None or Loops is not None:
 			try:
-				TheName = TheFile.split('.')[0].split('pdb')[1].upper()						#Open file
-				InFile = gzip.open(TheFile, 'rt')											#Extract file
-				structure = Bio.PDB.PDBParser(QUIET=True).get_structure(TheName, InFile)	#Separate chains and save to different files
-				count = 0
-				for chain in structure.get_chains():
-					io.set_structure(chain)
-					io.save(structure.get_id()+'_'+chain.get_id()+'.pdb')
-				os.remove(TheFile)
-			except Exception as TheError:
-				print('\x1b[31m[-] Failed to extract\t{}\x1b[33m{}\x1b[0m'.format(thefile.upper(), str(TheError)))
-				os.remove(TheFile)
-		os.chdir(current)
+				dssp = DSSP(TheFile)
+				length = [aa[0] for aa in dssp][-1]										#Identify final structure's length
+			except Exception:
+				if Loops is not None:
+					raise																#The Loops filter rejects structures DSSP fails on
+				print('\x1b[31m[-] Error in finding protein size\x1b[0m')					#The Size filter keeps them
+				return(True, None)
+			if Size is not None:
+				if length >= int(Size[1]) or length <= int(Size[0]):
+					return(False, 'Size')
+			if Loops is not None:
+				SS = ['L' if aa[2] in ('-', 'T', 'S') else '.' for aa in dssp]				#Loop (DSSP code is - or T or S)
+				loops = [item for item in ''.join(SS).split('.') if item]
+				if any(len(item) > Loops for item in loops):
+					return(False, 'Loops')
+		return(True, None)
+	def Filter(self, directory, NonProtein=False, Size=None, Break=False, Loops=None, Rg=None):
+		'''
+		Fused filter engine, rejects the structures that fail any of the enabled
+		filters in the journal while parsing each structure only once (see Inspect).
+		Size takes a (From, To) tuple, Loops the maximum loop length, and Rg the radius
+		of gyration cutoff. Returns the number of rejected structures per reason
+		'''
+		print('\x1b[32m[+] Filtering structures\x1b[0m')
+		enabled = [name for name, value in zip(('NonProtein', 'Size', 'Break', 'Loops', 'Rg'), (NonProtein, Size, Break, Loops, Rg)) if value]
+		stage = 'Filter:{}'.format(','.join(enabled))
+		rejected = {}
+		for File, result, TheError in self.Map(self.Inspect, directory, NonProtein, Size, Break, Loops, Rg, stage=stage):
+			keep, reason = result if TheError is None else (False, 'Error')
+			if not keep:
+				self.journal.reject(stage, File, reason)
+				rejected[reason] = rejected.get(reason, 0) + 1
+		for reason, count in sorted(rejected.items()):
+			print('\x1b[31m[-] Rejected {} structures\t\x1b[33m{}\x1b[0m'.format(count, reason))
+		return(rejected)
 	def NonProtein(self, directory):
 		''' Remove non-protein structures '''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
 		print('\x1b[32m[+] Deleting none-protein structures\x1b[0m')
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', TheFile)
-			ppb = Bio.PDB.Polypeptide.PPBuilder()
-			Type = ppb.build_peptides(structure, aa_only=True)
-			if Type == []:																	#Non-protein structures have Type = []
-				os.remove(TheFile)
-			else:
-				continue
-		os.chdir(current)
+		self.Filter(directory, NonProtein=True)
 	def Size(self, directory, Size_From, Size_To):
 		''' Remove 80AA < structures < 150AA '''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
 		print('\x1b[32m[+] Removing structure sizes less than 80 amino acids or larger than 150 amino acids\x1b[0m')
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			try:
-				parser = Bio.PDB.PDBParser()
-				structure = parser.get_structure('X', TheFile)
-				model = structure[0]
-				dssp = Bio.PDB.DSSP(model, TheFile, acc_array='Wilke')
-				for aa in dssp:																#Identify final structure's length
-					length = aa[0]
-				if length >= int(Size_To) or length <= int(Size_From):
-					os.remove(TheFile)
-			except:
-				print('\x1b[31m[-] Error in finding protein size\x1b[0m')
-		os.chdir(current)
+		self.Filter(directory, Size=(Size_From, Size_To))
 	def Break(self, directory):
 		''' Remove structures with a broken (non-continuous) chains '''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
 		print('\x1b[32m[+] Removing structures with non-continuous chains\x1b[0m')
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', TheFile)
-			ppb = Bio.PDB.Polypeptide.PPBuilder()
-			Type = ppb.build_peptides(structure, aa_only=True)
-			try:
-				x = Type[1]
-				os.remove(TheFile)
-			except:
-				continue
-		os.chdir(current)
+		self.Filter(directory, Break=True)
 	def Loops(self, directory, LoopLength):
 		''' Remove structures that have loops that are larger than a spesific length '''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
 		print('\x1b[32m[+] Removing structures with long loops\x1b[0m')
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			try:
-				parser = Bio.PDB.PDBParser()
-				structure = parser.get_structure('X', TheFile)
-				model = structure[0]
-				dssp = Bio.PDB.DSSP(model, TheFile, acc_array='Wilke')
-				SS = list()
-				for res in dssp:
-					ss = res[2]
-					if ss == '-' or ss == 'T' or ss == 'S':										#Loop (DSSP code is - or T or S)
-						SS.append('L')
-					else:
-						SS.append('.')
-				loops = ''.join(SS).split('.')
-				loops = [item for item in loops if item]
-				LargeLoop = None
-				for item in loops:
-					if len(item) <= LoopLength:
-						continue
-					else:
-						LargeLoop = 'LargeLoop'
-				if LargeLoop == 'LargeLoop':
-					os.remove(TheFile)
-				else:
-					continue
-			except:
-				os.remove(TheFile)
-		os.chdir(current)
+		self.Filter(directory, Loops=LoopLength)
 	def Renumber(self, directory):
 		''' Renumber structures starting at 1 '''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
 		print('\x1b[32m[+] Renumbering structures\x1b[0m')
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			pdb = open(TheFile , 'r')
-			PDB = open(TheFile + 'X' , 'w')
-			count = 0
-			num = 0
-			AA2 = None
-			for line in pdb:
-				count += 1																	#Sequencially number atoms
-				AA1 = line[23:27]															#Sequencially number residues
-				if not AA1 == AA2:
-					num += 1			
-				final_line = line[:7] + '{:4d}'.format(count) + line[11:17] + line[17:21] + 'A' + '{:4d}'.format(num) + line[26:]	#Update each line to have its atoms and residues sequencially labeled, as well as being in chain A
-				AA2 = AA1
-				PDB.write(final_line)														#Write to new file called motif.pdb
-			PDB.close()
-			os.remove(TheFile)
-			os.rename(TheFile + 'X' , TheFile)
-		os.chdir(current)
-	def RMSD(self, directory, RMSDcutoff):
-		''' Remove structures that are similar to each other '''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
+		for File, result, TheError in self.Map(self.RenumberFile, directory, stage='Renumber'):
+			continue
+	def RenumberFile(self, TheFile):
+		''' Renumber one structure starting at 1 '''
+		pdb = open(TheFile , 'r')
+		PDB = open(TheFile + 'X' , 'w')
+		count = 0
+		num = 0
+		AA2 = None
+		for line in pdb:
+			count += 1																		#Sequencially number atoms
+			AA1 = line[23:27]																#Sequencially number residues
+			if not AA1 == AA2:
+				num += 1
+			final_line = line[:7] + '{:4d}'.format(count) + line[11:17] + line[17:21] + 'A' + '{:4d}'.format(num) + line[26:]	#Update each line to have its atoms and residues sequencially labeled, as well as being in chain A
+			AA2 = AA1
+			PDB.write(final_line)															#Write to new file called motif.pdb
+		pdb.close()
+		PDB.close()
+		os.replace(TheFile + 'X' , TheFile)
+	def RMSD(self, directory, RMSDcutoff, Window=10, Block=1024):
+		'''
+		Remove structures that are similar to each other. The CA coordinates of every
+		structure are extracted once into a packed array and grouped by length, every pair
+		of structures whose lengths differ by at most Window residues is compared over the
+		residues of the shorter of the two (pairs further apart in length are not compared,
+		unlike the all-pairs comparison this replaced). The profiles of CA distances to the
+		centroid give a lower bound of the RMSD that discards most pairs cheaply, only
+		the surviving pairs are superimposed with a batched Kabsch. Similar structures
+		are clustered and only one representative of each cluster is kept
+		'''
+		print('\x1b[32m[+] Extracting CA coordinates\x1b[0m')
+		names = []
+		coords = []
+		for File, CA, TheError in self.Map(self.RMSDFile, directory):
+			if CA is None or len(CA) < 3: continue
+			names.append(File)
+			coords.append(CA)
+		if names == []: return
+		lengths = np.array([len(CA) for CA in coords])
+		offsets = np.concatenate([[0], np.cumsum(lengths)])
+		packed = np.concatenate(coords)
+		groups = {}
+		for i, length in enumerate(lengths):
+			groups.setdefault(length, []).append(i)
+		clusters = Clusters(len(names))
+		candidates = 0
 		print('\x1b[32m[+] Removing structure with similar RMSD\x1b[0m')
-		for File1 in tqdm.tqdm(pdbfilelist):
-			for File2 in pdbfilelist:
-				if File1 == File2:
-					continue
-				else:
-					try:
-						#First structure
-						type1 = Bio.PDB.Polypeptide.PPBuilder().build_peptides(Bio.PDB.PDBParser(QUIET=True).get_structure('X', File1), aa_only=True)
-						length1 = type1[-1][-1].get_full_id()[3][1]
-						fixed = [atom['CA'] for atom in type1[0]]
-						#Second structure
-						type2 = Bio.PDB.Polypeptide.PPBuilder().build_peptides(Bio.PDB.PDBParser(QUIET=True).get_structure('X', File2), aa_only=True)
-						length2 = type2[-1][-1].get_full_id()[3][1]
-						moving = [atom['CA'] for atom in type2[0]]
-						#Choose the length of the smallest structure
-						lengths = [length1, length2]
-						smallest = min(int(item) for item in lengths)
-						#Find RMSD
-						sup = Bio.PDB.Superimposer()
-						sup.set_atoms(fixed[:smallest], moving[:smallest])
-						sup.apply(Bio.PDB.PDBParser(QUIET=True).get_structure('X', File2)[0].get_atoms())
-						RMSD = round(sup.rms, 4)
-						print(File1, File2, RMSD)
-						#Delete similar structures
-						if RMSD < RMSDcutoff:
-							os.remove(File2)
-					except:
-						continue
-		os.chdir(current)
-	def Sequence(self, directory, Cutoff):
-		''' Remove structures that have similar sequences, which means they most likely have similar structures '''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
-		print('\x1b[32m[+] Measuring sequence similarity, round 1/2\x1b[0m')
-		for File1 in tqdm.tqdm(pdbfilelist):
-			for File2 in pdbfilelist:
-				try:
-					if File1 == File2:
-						continue
-					else:
-						if File1.split('.')[0].split('_')[0] == File2.split('.')[0].split('_')[0]:
-							seq1 = Bio.PDB.Polypeptide.PPBuilder().build_peptides(Bio.PDB.PDBParser(QUIET=True).get_structure('X', File1), aa_only= True)[0].get_sequence()
-							seq2 = Bio.PDB.Polypeptide.PPBuilder().build_peptides(Bio.PDB.PDBParser(QUIET=True).get_structure('X', File2), aa_only= True)[0].get_sequence()
-							alignment = Bio.pairwise2.align.globalxx(seq1, seq2)
-							total = alignment[0][4]
-							similarity = alignment[0][2]
-							percentage = (similarity*100) / total
-							if percentage > Cutoff:
-								os.remove(File2)
-				except:
-					continue
-		print('\x1b[32m[+] Measuring sequence similarity, round 2/2\x1b[0m')
-		for File1 in tqdm.tqdm(pdbfilelist):
-			for File2 in pdbfilelist:
-				try:
-					if File1 == File2:
-						continue
-					else:
-						if File1.split('.')[0].split('_')[0][:3] == File2.split('.')[0].split('_')[0][:3]:
-							seq1 = Bio.PDB.Polypeptide.PPBuilder().build_peptides(Bio.PDB.PDBParser(QUIET=True).get_structure('X', File1), aa_only=True)[0].get_sequence()
-							seq2 = Bio.PDB.Polypeptide.PPBuilder().build_peptides(Bio.PDB.PDBParser(QUIET=True).get_structure('X', File2), aa_only=True)[0].get_sequence()
-							alignment = Bio.pairwise2.align.globalxx(seq1, seq2)
-							total = alignment[0][4]
-							similarity = alignment[0][2]
-							percentage = (similarity*100) / total
-							if percentage > Cutoff:
-								os.remove(File2)
-				except:
-					continue
+		for size in tqdm.tqdm(sorted(groups)):
+			longer = [i for length in range(size+1, size+Window+1) for i in groups.get(length, [])]
+			members = np.array(groups[size] + longer)										#The structures of this length first, then the longer ones
+			rows = len(groups[size])
+			X = np.stack([packed[offsets[i]:offsets[i]+size] for i in members]).astype(np.float64)
+			X -= X.mean(axis=1, keepdims=True)
+			profile = np.linalg.norm(X, axis=2)											#Distances of every CA to the centroid
+			square = (profile**2).sum(axis=1)
+			for start in range(0, rows, Block):
+				stop = min(start + Block, rows)
+				bound = square[start:stop, None] + square[None, :] - 2 * profile[start:stop] @ profile.T
+				bound[np.arange(stop-start)[:, None] >= np.arange(len(members))[None, :] - start] = np.inf
+				I, J = np.nonzero(bound < size * RMSDcutoff**2)
+				I += start
+				pairs = [(i, j) for i, j in zip(I, J) if clusters.find(members[i]) != clusters.find(members[j])]
+				candidates += len(pairs)
+				for batch in range(0, len(pairs), Block):
+					I, J = np.array(pairs[batch:batch+Block]).T
+					for i, j, rmsd in zip(I, J, Kabsch(X[I], X[J])):
+						if rmsd < RMSDcutoff:
+							clusters.union(members[i], members[j])
+		print('\x1b[32m[+] Superimposed {} candidate pairs\x1b[0m'.format(candidates))
+		self.Representatives('RMSD', names, clusters)
+	def RMSDFile(self, TheFile):
+		''' Get one structure's CA coordinates as an (N, 3) array '''
+		structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', TheFile)
+		Type = Bio.PDB.Polypeptide.PPBuilder().build_peptides(structure, aa_only=True)
+		return(np.array([residue['CA'].get_coord() for residue in Type[0]], dtype=np.float32))
+	def Representatives(self, stage, names, clusters):
+		''' Write every structure's cluster to a clusters_{stage}.csv file and reject all but one representative of each cluster '''
+		rejected = 0
+		with open('clusters_{}.csv'.format(stage), 'w') as data:
+			data.write('PDB_ID;Cluster\n')
+			for i, File in enumerate(names):
+				representative = clusters.find(i)
+				data.write('{};{}\n'.format(File, names[representative]))
+				if representative != i:
+					self.journal.reject(stage, File, 'Similar to {}'.format(names[representative]))
+					rejected += 1
+		print('\x1b[32m[+] Kept {} representatives, rejected {} similar structures\x1b[0m'.format(len(names)-rejected, rejected))
+	def Sequence(self, directory, Cutoff, k=3, Hashes=128, Bands=64, Jaccard=0.2):
+		'''
+		Remove structures that have similar sequences, which means they most likely have
+		similar structures. Every sequence is extracted once and indexed by a MinHash
+		signature of its k-mers, locality sensitive hashing over bands of the signatures
+		gives the candidate pairs and only the candidates with an estimated k-mer Jaccard
+		similarity above the threshold are aligned. Structures with an identity above the
+		Cutoff percentage are clustered and one representative of each cluster is kept.
+		Every k-mer is packed into 8 bits per residue of an int64, so k is at most 7
+		'''
+		if not 1 <= k <= 7:
+			raise ValueError('k must be between 1 and 7, got {}'.format(k))
+		print('\x1b[32m[+] Extracting sequences\x1b[0m')
+		names = []
+		sequences = []
+		for File, seq, TheError in self.Map(self.FastaFile, directory):
+			if seq is None or len(seq) < k: continue
+			names.append(File)
+			sequences.append(seq)
+		print('\x1b[32m[+] Computing MinHash signatures\x1b[0m')
+		prime = 2**31 - 1
+		generator = np.random.RandomState(0)
+		a = generator.randint(1, prime, size=Hashes, dtype=np.int64)
+		b = generator.randint(0, prime, size=Hashes, dtype=np.int64)
+		signatures = np.empty((len(sequences), Hashes), dtype=np.int64)
+		for i, seq in enumerate(tqdm.tqdm(sequences)):
+			codes = np.frombuffer(seq.encode(), dtype=np.uint8).astype(np.int64)
+			kmers = sum(codes[n:len(codes)-k+n+1] << (8*n) for n in range(k))		#Pack each k-mer into one integer
+			kmers = np.unique(kmers % prime)	# a, b and the k-mers stay below prime < 2**31 so a*k-mer+b fits an int64
+			signatures[i] = ((a[:, None] * kmers[None, :] + b[:, None]) % prime).min(axis=1)
+		candidates = set()
+		rows = Hashes // Bands
+		for band in range(Bands):
+			buckets = {}
+			for i, key in enumerate(signatures[:, band*rows:(band+1)*rows]):
+				buckets.setdefault(key.tobytes(), []).append(i)
+			for members in buckets.values():
+				candidates.update((i, j) for n, i in enumerate(members) for j in members[n+1:])
+		candidates = np.array(sorted(candidates), dtype=np.int64).reshape(-1, 2)
+		estimate = (signatures[candidates[:, 0]] == signatures[candidates[:, 1]]).mean(axis=1)
+		candidates = candidates[estimate >= Jaccard]
+		clusters = Clusters(len(names))
+		print('\x1b[32m[+] Aligning {} candidate pairs\x1b[0m'.format(len(candidates)))
+		for i, j in tqdm.tqdm(candidates):
+			if clusters.find(i) == clusters.find(j): continue
+			alignment = Bio.pairwise2.align.globalxx(sequences[i], sequences[j], one_alignment_only=True)
+			total = alignment[0][4]
+			similarity = alignment[0][2]
+			percentage = (similarity*100) / total
+			if percentage > Cutoff:
+				clusters.union(i, j)
+		self.Representatives('Sequence', names, clusters)
 	def Rg(self, directory, RGcutoff):
 		''' Remove structures that are below the Raduis of Gyration's value '''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
 		print('\x1b[32m[+] Removing structure low Rg values\x1b[0m')
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			mass = list()
-			Structure = open(TheFile, 'r')
-			for line in Structure:
-				line = line.split()
-				if line[0] == 'TER' or line[0] == 'END':
-					continue
-				else:
-					if line[-1] == 'C':
-						mass.append(12.0107)
-					elif line[-1] == 'O':
-						mass.append(15.9994)
-					elif line[-1] == 'N':
-						mass.append(14.0067)
-					elif line[-1] == 'S':
-						mass.append(32.0650)
-					elif line[-1] == 'H':
-						mass.append(1.00794)
-					else:
-						continue
-			coord = list()
-			p = Bio.PDB.PDBParser()
-			structure = p.get_structure('X', TheFile)
-			for model in structure:
-				for chain in model:
-					for residue in chain:
-						for atom in residue:
-							coord.append(atom.get_coord())
-			xm = [(m*i, m*j, m*k) for (i, j, k), m in zip(coord, mass)]
-			tmass = sum(mass)
-			rr = sum(mi*i + mj*j + mk*k for (i, j, k), (mi, mj, mk) in zip(coord, xm))
-			mm = sum((sum(i)/tmass)**2 for i in zip( * xm))
-			rg = math.sqrt(rr/tmass-mm)
-			if rg <= RGcutoff:
-				os.remove(TheFile)
-			else:
-				continue
-		os.chdir(current)
+		self.Filter(directory, Rg=RGcutoff)
 	def Fasta(self, directory):
-		''' Get each protein's sequence. Generates a the FASTA.csv dataset file '''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
+		'''
+		Get each protein's sequence. Generates the FASTA/ binary dataset of the
+		sequence of each protein as uint8 ASCII codes, read it with Shards.text()
+		'''
 		print('\x1b[32m[+] Getting the sequence\x1b[0m')
-		data = open('FASTA.csv', 'a')
-		data.write('PDB_ID;Sequence\n')
-		data.close()
-		count = 1
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			structure = Bio.PDB.PDBParser().get_structure('X', TheFile)
-			ppb = Bio.PDB.PPBuilder()
-			seq = ppb.build_peptides(structure, aa_only=False)[0].get_sequence()
-			TheLine = '{};{}\n'.format(TheFile, str(seq))
-			data = open('FASTA.csv', 'a')
-			data.write(TheLine)
-			data.close()
-			count += 1
-		os.system('mv FASTA.csv {}'.format(current))
+		columns = ['Sequence_{}'.format(i) for i in range(1, 151)]
+		with ShardWriter('FASTA', columns, dtype=np.uint8) as data:
+			for File, seq, TheError in self.Map(self.FastaFile, directory):
+				if seq is None:
+					continue
+				data.write(File, Codes(seq, 150))
+	def FastaFile(self, TheFile):
+		''' Get one protein's sequence as a FASTA row '''
+		structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', TheFile)
+		ppb = Bio.PDB.PPBuilder()
+		seq = ppb.build_peptides(structure, aa_only=False)[0].get_sequence()
+		return(str(seq))
 	def SS(self, directory):
-		''' Get each residue's secondary structure. Generates a the SS.csv dataset file '''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
+		'''
+		Get each residue's secondary structure. Generates the SS/ binary dataset
+		of the secondary structures of each protein as uint8 ASCII codes, read it
+		with Shards.text()
+		'''
 		print('\x1b[32m[+] Getting the secondary structures\x1b[0m')
-		data = open('SS.csv', 'a')
-		data.write('PDB_ID;Secondary_Structures\n')
-		data.close()
-		count = 1
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			try:
-				structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', TheFile)
-				dssp = Bio.PDB.DSSP(structure[0], TheFile, acc_array='Wilke')
-				SS = list()
-				for res in dssp:
-					ss = res[2]
-					if ss == '-' or ss == 'T' or ss == 'S':		#Loop (DSSP code is - or T or S)
-						SS.append('L')
-					elif ss == 'G' or ss == 'H' or ss == 'I':	#Helix (DSSP code is G or H or I)
-						SS.append('H')
-					elif ss == 'B' or ss == 'E':				#Sheet (DSSP code is B or E)
-						SS.append('S')
-			except Exception as Error:
-				print(Error)
-			SS = ''.join(SS)
-			TheLine = '{};{}\n'.format(TheFile, str(seq))
-			data = open('SS.csv', 'a')
-			data.write(TheLine)
-			data.close()
-			count += 1
-		os.system('mv SS.csv {}'.format(current))
+		columns = ['Secondary_Structure_{}'.format(i) for i in range(1, 151)]
+		with ShardWriter('SS', columns, dtype=np.uint8) as data:
+			for File, row, TheError in self.Map(self.SSFile, directory):
+				if row is None:
+					continue
+				data.write(File, row)
+	def SSFile(self, TheFile):
+		''' Get one protein's secondary structures as an SS row '''
+		dssp = DSSP(TheFile)
+		SS = list()
+		for res in dssp:
+			ss = res[2]
+			if ss == '-' or ss == 'T' or ss == 'S':		#Loop (DSSP code is - or T or S)
+				SS.append('L')
+			elif ss == 'G' or ss == 'H' or ss == 'I':	#Helix (DSSP code is G or H or I)
+				SS.append('H')
+			elif ss == 'B' or ss == 'E':				#Sheet (DSSP code is B or E)
+				SS.append('S')
+		return(Codes(''.join(SS), 150))
 	def Clean(self, directory):
 		''' Clean each structure within a directory '''
-		os.mkdir('PDBCleaned')
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
+		os.makedirs('PDBCleaned', exist_ok=True)
 		print('\x1b[32m[+] Cleaning structures\x1b[0m')
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			CurFile = open(TheFile, 'r')
-			NewFile = open('Clean-{}'.format(TheFile), 'a')
-			for line in CurFile:
-				if line.split()[0] == 'ATOM':
-					NewFile.write(line)
-			CurFile.close()
-			NewFile.close()
-			os.system('mv Clean-{} ../PDBCleaned'.format(TheFile))
+		for File, result, TheError in self.Map(self.CleanFile, directory, stage='Clean'):
+			continue
+	def CleanFile(self, TheFile):
+		''' Clean one structure into the PDBCleaned directory '''
+		CurFile = open(TheFile, 'r')
+		NewFile = open('PDBCleaned/Clean-{}'.format(os.path.basename(TheFile)), 'w')
+		for line in CurFile:
+			if line.split()[0] == 'ATOM':
+				NewFile.write(line)
+		CurFile.close()
+		NewFile.close()
 	def Score(self, directory):
 		''' Score each structure using PyRosetta to make sure it is Rosetta compatible '''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
-		scorefnx = get_fa_scorefxn()
 		print('\x1b[32m[+] Scoring structures\x1b[0m')
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			try:
-				pose = pose_from_pdb(TheFile)
-				print(scorefnx(pose))
-			except:
-				os.remove(TheFile)
-	def CSTMax(self, filename):
-		''' find the minimum and maximum range of the constraints values of a dataset '''
-		maxline = []
-		data = open(filename, 'r')
-		next(data)
-		for line in data:
-			line = line.strip().split(';')
-			cst = []
-			count = 1
-			for item in line:
-				if count < 450:
-					count += 3
-					cst.append(float(line[count]))
-			maxline.append(max(cst))
-		maximum = max(maxline)
+		for File, score, TheError in self.Map(self.ScoreFile, directory, stage='Score'):
+			if TheError is not None:
+				self.journal.reject('Score', File, TheError)
+	def ScoreFile(self, TheFile):
+		''' Score one structure using PyRosetta '''
+		scorefnx = get_fa_scorefxn()
+		pose = pose_from_pdb(TheFile)
+		return(scorefnx(pose))
+	def CSTMax(self, name):
+		''' find the maximum of the constraints values of a dataPSC binary dataset '''
+		data = Shards(name)
+		maximum = max(float(shard[:, 2::3].max()) for shard in data.shards)
 		return(maximum)
 	def Path(self, directory, path):
 		''' Generate a file with the path to each file '''
@@ -419,7 +844,7 @@ class Dataset():
 		pdbfilelist = os.listdir(directory)
 		os.chdir(directory)
 		print('\x1b[32m[+] Generating Paths\x1b[0m')
-		PathFile = open('PDB.list', 'a')
+		PathFile = open('PDB.list', 'w')
 		for TheFile in tqdm.tqdm(pdbfilelist):
 			line = '{}/PDBCleaned/{}\n'.format(path, TheFile)
 			PathFile.write(line)
@@ -456,612 +881,277 @@ class Dataset():
 		HPCfile.write('{}/main/source/bin/relax.default.linuxgccrelease -relax:thorough -nstruct 100 -database {}/main/database -s $thefile'.format(path, path))
 	def DatasetR(self, directory):
 		'''
-		Get the secondary structures and distances. Generates a the dataR.csv with
-		each amino acid's secondary strucure and 10 distances between the first
-		amino acid's CA atom and others for each protein in a directory
+		Get the secondary structures and distances. Generates the dataR/ binary
+		dataset with each amino acid's secondary strucure and 10 distances between
+		the first amino acid's CA atom and others for each protein in a directory
 		'''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
 		print('\x1b[32m[+] Getting the secondary structures of each protein\x1b[0m')
-		data = open('dataR.csv', 'a')
-		data.write(';PDB_ID;1;2;3;4;5;6;7;8;9;10;11;12;13;14;15;16;17;18;19;20;21;')
-		data.write('22;23;24;25;26;27;28;29;30;31;32;33;34;35;36;37;38;39;40;41;')
-		data.write('42;43;44;45;46;47;48;49;50;51;52;53;54;55;56;57;58;59;60;61;')
-		data.write('62;63;64;65;66;67;68;69;70;71;72;73;74;75;76;77;78;79;80;81;')
-		data.write('82;83;84;85;86;87;88;89;90;91;92;93;94;95;96;97;98;99;100;')
-		data.write('101;102;103;104;105;106;107;108;109;110;111;112;113;114;115;')
-		data.write('116;117;118;119;120;121;122;123;124;125;126;127;128;129;130;')
-		data.write('131;132;133;134;135;136;137;138;139;140;141;142;143;144;145;')
-		data.write('146;147;148;149;150;Distance_1;Distance_2;Distance_3;')
-		data.write('Distance_4;Distance_5;Distance_6;Distance_7;Distance_8;')
-		data.write('Distance_9;Distance_10\n')
-		data.close()
-		count = 1
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			try:
-				structure = Bio.PDB.PDBParser().get_structure('X', TheFile)
-				model = structure[0]
-				dssp = Bio.PDB.DSSP(model, TheFile, acc_array='Wilke')
-				length = [aa[0] for aa in dssp][-1]				#Identify final structure's length
-				SS = list()
-				for res in dssp:
-					ss = res[2]
-					if ss == '-' or ss == 'T' or ss == 'S':		#Loop (DSSP code is - or T or S)
-						SS.append('L')
-					elif ss == 'G' or ss == 'H' or ss == 'I':	#Helix (DSSP code is G or H or I)
-						SS.append('H')
-					elif ss == 'B' or ss == 'E':				#Sheet (DSSP code is B or E)
-						SS.append('S')
-				SS = ['1' if x == 'L' else x for x in SS]
-				SS = ['2' if x == 'H' else x for x in SS]
-				SS = ['3' if x == 'S' else x for x in SS]
-				addition = 150 - len(SS)
-				for zeros in range(addition):
-					SS.append('0')
-				SSline = ';'.join(SS)
-				chain = Bio.PDB.Polypeptide.PPBuilder().build_peptides(structure, aa_only=True)[0]
-				positions = [(i+1)*(length//10) for i in range(10)]
-				distances = list()
-				for res in positions:
-					try:
-						residue1 = chain[0]
-						residue2 = chain[res - 1]
-						atom1 = residue1['CA']
-						atom2 = residue2['CA']
-						distance = atom1-atom2
-						distances.append(str(distance))
-					except:
-						continue
-				if distances == []:
+		columns = [str(i) for i in range(1, 151)] + ['Distance_{}'.format(i) for i in range(1, 11)]
+		with ShardWriter('dataR', columns) as data:
+			for File, row, TheError in self.Map(self.DatasetRFile, directory):
+				if row is None:
 					continue
-				elif len(distances) != 10:
-					continue
-				DIline = ';'.join(distances)
-				data = open('dataR.csv' , 'a')
-				data.write('{};{};{};{}\n'.format(str(count), TheFile.split('.')[0], SSline, DIline))
-				data.close()
-				count += 1
+				data.write(File, row)
+	def DatasetRFile(self, TheFile):
+		''' Get one protein's secondary structures and distances as a dataR row '''
+		structure = Bio.PDB.PDBParser().get_structure('X', TheFile)
+		dssp = DSSP(TheFile)
+		length = [aa[0] for aa in dssp][-1]				#Identify final structure's length
+		SS = list()
+		for res in dssp:
+			ss = res[2]
+			if ss == '-' or ss == 'T' or ss == 'S':		#Loop (DSSP code is - or T or S)
+				SS.append('L')
+			elif ss == 'G' or ss == 'H' or ss == 'I':	#Helix (DSSP code is G or H or I)
+				SS.append('H')
+			elif ss == 'B' or ss == 'E':				#Sheet (DSSP code is B or E)
+				SS.append('S')
+		SS = [{'L': 1, 'H': 2, 'S': 3}[x] for x in SS]
+		chain = Bio.PDB.Polypeptide.PPBuilder().build_peptides(structure, aa_only=True)[0]
+		positions = [(i+1)*(length//10) for i in range(10)]
+		distances = list()
+		for res in positions:
+			try:
+				residue1 = chain[0]
+				residue2 = chain[res - 1]
+				atom1 = residue1['CA']
+				atom2 = residue2['CA']
+				distance = atom1-atom2
+				distances.append(distance)
 			except:
 				continue
-		os.chdir(current)
-		os.rename('{}/dataR.csv'.format(directory), 'dataR.csv')
+		if len(distances) != 10:
+			return(None)
+		return(np.concatenate([Row(SS, 150), Row(distances, 10)]))
 	def DatasetCA(self, directory):
 		'''
-		Get each residue's CA atom's XYZ coordinates. Generates a the dataCA.csv
-		with the XYZ coordinates of the CA atom for each amino acid
+		Get each residue's CA atom's XYZ coordinates. Generates the dataCA/ binary
+		dataset with the XYZ coordinates of the CA atom for each amino acid
 		'''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
 		print("\x1b[32m[+] Getting the CA atom's XYZ coordinates\x1b[0m")
-		data = open('dataCA.csv', 'a')
-		data.write(';PDB_ID;X_1;Y_1;Z_1;X_2;Y_2;Z_2;X_3;Y_3;Z_3;X_4;Y_4;Z_4;X_5;')
-		data.write('Y_5;Z_5;X_6;Y_6;Z_6;X_7;Y_7;Z_7;X_8;Y_8;Z_8;X_9;Y_9;')
-		data.write('Z_9;X_10;Y_10;Z_10;X_11;Y_11;Z_11;X_12;Y_12;Z_12;X_13;')
-		data.write('Y_13;Z_13;X_14;Y_14;Z_14;X_15;Y_15;Z_15;X_16;Y_16;Z_16;')
-		data.write('X_17;Y_17;Z_17;X_18;Y_18;Z_18;X_19;Y_19;Z_19;X_20;Y_20;')
-		data.write('Z_20;X_21;Y_21;Z_21;X_22;Y_22;Z_22;X_23;Y_23;Z_23;X_24;')
-		data.write('Y_24;Z_24;X_25;Y_25;Z_25;X_26;Y_26;Z_26;X_27;Y_27;Z_27;')
-		data.write('X_28;Y_28;Z_28;X_29;Y_29;Z_29;X_30;Y_30;Z_30;X_31;Y_31;')
-		data.write('Z_31;X_32;Y_32;Z_32;X_33;Y_33;Z_33;X_34;Y_34;Z_34;X_35;')
-		data.write('Y_35;Z_35;X_36;Y_36;Z_36;X_37;Y_37;Z_37;X_38;Y_38;Z_38;')
-		data.write('X_39;Y_39;Z_39;X_40;Y_40;Z_40;X_41;Y_41;Z_41;X_42;Y_42;')
-		data.write('Z_42;X_43;Y_43;Z_43;X_44;Y_44;Z_44;X_45;Y_45;Z_45;X_46;')
-		data.write('Y_46;Z_46;X_47;Y_47;Z_47;X_48;Y_48;Z_48;X_49;Y_49;Z_49;')
-		data.write('X_50;Y_50;Z_50;X_51;Y_51;Z_51;X_52;Y_52;Z_52;X_53;Y_53;')
-		data.write('Z_53;X_54;Y_54;Z_54;X_55;Y_55;Z_55;X_56;Y_56;Z_56;X_57;')
-		data.write('Y_57;Z_57;X_58;Y_58;Z_58;X_59;Y_59;Z_59;X_60;Y_60;Z_60;')
-		data.write('X_61;Y_61;Z_61;X_62;Y_62;Z_62;X_63;Y_63;Z_63;X_64;Y_64;')
-		data.write('Z_64;X_65;Y_65;Z_65;X_66;Y_66;Z_66;X_67;Y_67;Z_67;X_68;')
-		data.write('Y_68;Z_68;X_69;Y_69;Z_69;X_70;Y_70;Z_70;X_71;Y_71;Z_71;')
-		data.write('X_72;Y_72;Z_72;X_73;Y_73;Z_73;X_74;Y_74;Z_74;X_75;Y_75;')
-		data.write('Z_75;X_76;Y_76;Z_76;X_77;Y_77;Z_77;X_78;Y_78;Z_78;X_79;')
-		data.write('Y_79;Z_79;X_80;Y_80;Z_80;X_81;Y_81;Z_81;X_82;Y_82;Z_82;')
-		data.write('X_83;Y_83;Z_83;X_84;Y_84;Z_84;X_85;Y_85;Z_85;X_86;Y_86;')
-		data.write('Z_86;X_87;Y_87;Z_87;X_88;Y_88;Z_88;X_89;Y_89;Z_89;X_90;')
-		data.write('Y_90;Z_90;X_91;Y_91;Z_91;X_92;Y_92;Z_92;X_93;Y_93;Z_93;')
-		data.write('X_94;Y_94;Z_94;X_95;Y_95;Z_95;X_96;Y_96;Z_96;X_97;Y_97;')
-		data.write('Z_97;X_98;Y_98;Z_98;X_99;Y_99;Z_99;X_100;Y_100;Z_100;')
-		data.write('X_101;Y_101;Z_101;X_102;Y_102;Z_102;X_103;Y_103;Z_103;')
-		data.write('X_104;Y_104;Z_104;X_105;Y_105;Z_105;X_106;Y_106;Z_106;')
-		data.write('X_107;Y_107;Z_107;X_108;Y_108;Z_108;X_109;Y_109;Z_109;')
-		data.write('X_110;Y_110;Z_110;X_111;Y_111;Z_111;X_112;Y_112;Z_112;')
-		data.write('X_113;Y_113;Z_113;X_114;Y_114;Z_114;X_115;Y_115;Z_115;')
-		data.write('X_116;Y_116;Z_116;X_117;Y_117;Z_117;X_118;Y_118;Z_118;')
-		data.write('X_119;Y_119;Z_119;X_120;Y_120;Z_120;X_121;Y_121;Z_121;')
-		data.write('X_122;Y_122;Z_122;X_123;Y_123;Z_123;X_124;Y_124;Z_124;')
-		data.write('X_125;Y_125;Z_125;X_126;Y_126;Z_126;X_127;Y_127;Z_127;')
-		data.write('X_128;Y_128;Z_128;X_129;Y_129;Z_129;X_130;Y_130;Z_130;')
-		data.write('X_131;Y_131;Z_131;X_132;Y_132;Z_132;X_133;Y_133;Z_133;')
-		data.write('X_134;Y_134;Z_134;X_135;Y_135;Z_135;X_136;Y_136;Z_136;')
-		data.write('X_137;Y_137;Z_137;X_138;Y_138;Z_138;X_139;Y_139;Z_139;')
-		data.write('X_140;Y_140;Z_140;X_141;Y_141;Z_141;X_142;Y_142;Z_142;')
-		data.write('X_143;Y_143;Z_143;X_144;Y_144;Z_144;X_145;Y_145;Z_145;')
-		data.write('X_146;Y_146;Z_146;X_147;Y_147;Z_147;X_148;Y_148;Z_148;')
-		data.write('X_149;Y_149;Z_149;X_150;Y_150;Z_150\n')
+		columns = ['{}_{}'.format(axis, i) for i in range(1, 151) for axis in 'XYZ']
+		with ShardWriter('dataCA', columns) as data:
+			for File, row, TheError in self.Map(self.DatasetCAFile, directory):
+				if row is None:
+					continue
+				data.write(File, row)
+	def DatasetCAFile(self, TheFile):
+		''' Get one protein's CA atom's XYZ coordinates as a dataCA row '''
+		data = open(TheFile, 'r')
+		seen = set()
+		coordinates = list()
+		for line in data:
+			if line.split()[0] == 'ATOM' and line.split()[2] == 'CA':
+				line_lower = line.split()[5].lower()
+				if line_lower not in seen:
+					seen.add(line_lower)
+					line = [char for char in line]
+					x = ''.join(line[30:38]).strip()
+					y = ''.join(line[38:46]).strip()
+					z = ''.join(line[46:54]).strip()
+					coordinates.append(x)
+					coordinates.append(y)
+					coordinates.append(z)
 		data.close()
-		count = 1
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			data = open(TheFile, 'r')
-			seen = set()
-			coordinates = list()
-			for line in data:
-				if line.split()[0] == 'ATOM' and line.split()[2] == 'CA':
-					line_lower = line.split()[5].lower()
-					if line_lower not in seen:
-						seen.add(line_lower)
-						line = [char for char in line]
-						x = ''.join(line[30:38]).strip()
-						y = ''.join(line[38:46]).strip()
-						z = ''.join(line[46:54]).strip()
-						coordinates.append(x)
-						coordinates.append(y)
-						coordinates.append(z)
-			if len(coordinates) > 450:
-				continue
-			addition = 450 - len(coordinates)
-			for zeros in range(addition):
-				coordinates.append('0')
-			COline = ';'.join(coordinates)
-			data = open('dataCA.csv', 'a')
-			data.write('{};{};{}\n'.format(str(count), TheFile.split('.')[0], COline))
-			data.close()
-			count += 1
-		os.chdir(current)
-		os.rename('{}/dataCA.csv'.format(directory), 'dataCA.csv')
+		return(Row(coordinates, 450))
 	def DatasetPSO(self, directory):
 		'''
 		Get each residue's phi, psi, and omega angles (uses the PyRosetta library).
-		Generates a the dataPSO.csv with the phi, psi, and omega angles for each
-		amino acid
+		Generates the dataPSO/ binary dataset with the phi, psi, and omega angles
+		for each amino acid
 		'''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
 		print('\x1b[32m[+] Getting the psi, psi, and omega angles\x1b[0m')
-		data = open('dataPSO.csv', 'a')
-		data.write(';PDB_ID;phi_1;psi_1;omg_1;phi_2;psi_2;omg_2;phi_3;psi_3;')
-		data.write('omg_3;phi_4;psi_4;omg_4;phi_5;psi_5;omg_5;phi_6;psi_6;omg_6;phi_7;psi_7;')
-		data.write('omg_7;phi_8;psi_8;omg_8;phi_9;psi_9;omg_9;phi_10;psi_10;omg_10;phi_11;')
-		data.write('psi_11;omg_11;phi_12;psi_12;omg_12;phi_13;psi_13;omg_13;phi_14;psi_14;')
-		data.write('omg_14;phi_15;psi_15;omg_15;phi_16;psi_16;omg_16;phi_17;psi_17;omg_17;')
-		data.write('phi_18;psi_18;omg_18;phi_19;psi_19;omg_19;phi_20;psi_20;omg_20;phi_21;')
-		data.write('psi_21;omg_21;phi_22;psi_22;omg_22;phi_23;psi_23;omg_23;phi_24;psi_24;')
-		data.write('omg_24;phi_25;psi_25;omg_25;phi_26;psi_26;omg_26;phi_27;psi_27;omg_27;')
-		data.write('phi_28;psi_28;omg_28;phi_29;psi_29;omg_29;phi_30;psi_30;omg_30;phi_31;')
-		data.write('psi_31;omg_31;phi_32;psi_32;omg_32;phi_33;psi_33;omg_33;phi_34;psi_34;')
-		data.write('omg_34;phi_35;psi_35;omg_35;phi_36;psi_36;omg_36;phi_37;psi_37;omg_37;')
-		data.write('phi_38;psi_38;omg_38;phi_39;psi_39;omg_39;phi_40;psi_40;omg_40;phi_41;')
-		data.write('psi_41;omg_41;phi_42;psi_42;omg_42;phi_43;psi_43;omg_43;phi_44;psi_44;')
-		data.write('omg_44;phi_45;psi_45;omg_45;phi_46;psi_46;omg_46;phi_47;psi_47;omg_47;')
-		data.write('phi_48;psi_48;omg_48;phi_49;psi_49;omg_49;phi_50;psi_50;omg_50;phi_51;')
-		data.write('psi_51;omg_51;phi_52;psi_52;omg_52;phi_53;psi_53;omg_53;phi_54;psi_54;')
-		data.write('omg_54;phi_55;psi_55;omg_55;phi_56;psi_56;omg_56;phi_57;psi_57;omg_57;')
-		data.write('phi_58;psi_58;omg_58;phi_59;psi_59;omg_59;phi_60;psi_60;omg_60;phi_61;')
-		data.write('psi_61;omg_61;phi_62;psi_62;omg_62;phi_63;psi_63;omg_63;phi_64;psi_64;')
-		data.write('omg_64;phi_65;psi_65;omg_65;phi_66;psi_66;omg_66;phi_67;psi_67;omg_67;')
-		data.write('phi_68;psi_68;omg_68;phi_69;psi_69;omg_69;phi_70;psi_70;omg_70;phi_71;')
-		data.write('psi_71;omg_71;phi_72;psi_72;omg_72;phi_73;psi_73;omg_73;phi_74;psi_74;')
-		data.write('omg_74;phi_75;psi_75;omg_75;phi_76;psi_76;omg_76;phi_77;psi_77;omg_77;')
-		data.write('phi_78;psi_78;omg_78;phi_79;psi_79;omg_79;phi_80;psi_80;omg_80;phi_81;')
-		data.write('psi_81;omg_81;phi_82;psi_82;omg_82;phi_83;psi_83;omg_83;phi_84;psi_84;')
-		data.write('omg_84;phi_85;psi_85;omg_85;phi_86;psi_86;omg_86;phi_87;psi_87;omg_87;')
-		data.write('phi_88;psi_88;omg_88;phi_89;psi_89;omg_89;phi_90;psi_90;omg_90;phi_91;')
-		data.write('psi_91;omg_91;phi_92;psi_92;omg_92;phi_93;psi_93;omg_93;phi_94;psi_94;')
-		data.write('omg_94;phi_95;psi_95;omg_95;phi_96;psi_96;omg_96;phi_97;psi_97;omg_97;')
-		data.write('phi_98;psi_98;omg_98;phi_99;psi_99;omg_99;phi_100;psi_100;omg_100;')
-		data.write('phi_101;psi_101;omg_101;phi_102;psi_102;omg_102;phi_103;psi_103;')
-		data.write('omg_103;phi_104;psi_104;omg_104;phi_105;psi_105;omg_105;phi_106;')
-		data.write('psi_106;omg_106;phi_107;psi_107;omg_107;phi_108;psi_108;omg_108;')
-		data.write('phi_109;psi_109;omg_109;phi_110;psi_110;omg_110;phi_111;psi_111;')
-		data.write('omg_111;phi_112;psi_112;omg_112;phi_113;psi_113;omg_113;phi_114;')
-		data.write('psi_114;omg_114;phi_115;psi_115;omg_115;phi_116;psi_116;omg_116;')
-		data.write('phi_117;psi_117;omg_117;phi_118;psi_118;omg_118;phi_119;psi_119;')
-		data.write('omg_119;phi_120;psi_120;omg_120;phi_121;psi_121;omg_121;phi_122;')
-		data.write('psi_122;omg_122;phi_123;psi_123;omg_123;phi_124;psi_124;omg_124;')
-		data.write('phi_125;psi_125;omg_125;phi_126;psi_126;omg_126;phi_127;psi_127;')
-		data.write('omg_127;phi_128;psi_128;omg_128;phi_129;psi_129;omg_129;phi_130;')
-		data.write('psi_130;omg_130;phi_131;psi_131;omg_131;phi_132;psi_132;omg_132;')
-		data.write('phi_133;psi_133;omg_133;phi_134;psi_134;omg_134;phi_135;psi_135;')
-		data.write('omg_135;phi_136;psi_136;omg_136;phi_137;psi_137;omg_137;phi_138;')
-		data.write('psi_138;omg_138;phi_139;psi_139;omg_139;phi_140;psi_140;omg_140;')
-		data.write('phi_141;psi_141;omg_141;phi_142;psi_142;omg_142;phi_143;psi_143;')
-		data.write('omg_143;phi_144;psi_144;omg_144;phi_145;psi_145;omg_145;phi_146;')
-		data.write('psi_146;omg_146;phi_147;psi_147;omg_147;phi_148;psi_148;omg_148;')
-		data.write('phi_149;psi_149;omg_149;phi_150;psi_150;omg_150\n')
-		data.close()
-		count = 1
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			pose = pose_from_pdb(TheFile)
-			size = len(pose)
-			angles = list()
-			for aa in range(size):
-				phi = pose.phi(aa+1)
-				psi = pose.psi(aa+1)
-				omg = pose.omega(aa+1)
-				angles.append('{};{};{}'.format(str(phi), str(psi), str(omg)))
-			Angles = ';'.join(angles)
-			if len(angles) >= 150:
-				AngLine = Angles
-			else:
-				addition = 150 - len(angles)
-				zeros = list()
-				for adds in range(addition):
-					zeros.append('0.0;0.0;0.0')
-				Zeros = ';'.join(zeros)
-				AngLine = Angles + ';' + Zeros
-			data = open('dataPSO.csv', 'a')
-			data.write('{};{};{}\n'.format(str(count), TheFile, AngLine))
-			data.close()
-			count += 1
+		columns = ['{}_{}'.format(angle, i) for i in range(1, 151) for angle in ('phi', 'psi', 'omg')]
+		with ShardWriter('dataPSO', columns) as data:
+			for File, row, TheError in self.Map(self.DatasetPSOFile, directory):
+				if row is None:
+					continue
+				data.write(File, row)
+	def DatasetPSOFile(self, TheFile):
+		''' Get one protein's phi, psi, and omega angles as a dataPSO row '''
+		pose = pose_from_pdb(TheFile)
+		size = len(pose)
+		angles = list()
+		for aa in range(size):
+			phi = pose.phi(aa+1)
+			psi = pose.psi(aa+1)
+			omg = pose.omega(aa+1)
+			angles.extend((phi, psi, omg))
+		return(Row(angles, 450))
 	def DatasetPS(self, directory):
 		'''
 		Get each residue's phi and psi angles (uses the BioPython library).
-		Generates a the dataPS.csv with the phi and psi angles for each amino acid
+		Generates the dataPS/ binary dataset with the phi and psi angles for each
+		amino acid
 		'''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
 		print('\x1b[32m[+] Getting the psi and psi angles\x1b[0m')
-		data = open('dataPS.csv', 'a')
-		data.write(';PDB_ID;phi_1;psi_1;phi_2;psi_2;phi_3;psi_3;phi_4;')
-		data.write('psi_4;phi_5;psi_5;phi_6;psi_6;phi_7;psi_7;phi_8;psi_8;phi_9;psi_9;')
-		data.write('phi_10;psi_10;phi_11;psi_11;phi_12;psi_12;phi_13;psi_13;phi_14;psi_14;')
-		data.write('phi_15;psi_15;phi_16;psi_16;phi_17;psi_17;phi_18;psi_18;phi_19;psi_19;')
-		data.write('phi_20;psi_20;phi_21;psi_21;phi_22;psi_22;phi_23;psi_23;phi_24;psi_24;')
-		data.write('phi_25;psi_25;phi_26;psi_26;phi_27;psi_27;phi_28;psi_28;phi_29;psi_29;')
-		data.write('phi_30;psi_30;phi_31;psi_31;phi_32;psi_32;phi_33;psi_33;phi_34;psi_34;')
-		data.write('phi_35;psi_35;phi_36;psi_36;phi_37;psi_37;phi_38;psi_38;phi_39;psi_39;')
-		data.write('phi_40;psi_40;phi_41;psi_41;phi_42;psi_42;phi_43;psi_43;phi_44;psi_44;')
-		data.write('phi_45;psi_45;phi_46;psi_46;phi_47;psi_47;phi_48;psi_48;phi_49;psi_49;')
-		data.write('phi_50;psi_50;phi_51;psi_51;phi_52;psi_52;phi_53;psi_53;phi_54;psi_54;')
-		data.write('phi_55;psi_55;phi_56;psi_56;phi_57;psi_57;phi_58;psi_58;phi_59;psi_59;')
-		data.write('phi_60;psi_60;phi_61;psi_61;phi_62;psi_62;phi_63;psi_63;phi_64;psi_64;')
-		data.write('phi_65;psi_65;phi_66;psi_66;phi_67;psi_67;phi_68;psi_68;phi_69;psi_69;')
-		data.write('phi_70;psi_70;phi_71;psi_71;phi_72;psi_72;phi_73;psi_73;phi_74;psi_74;')
-		data.write('phi_75;psi_75;phi_76;psi_76;phi_77;psi_77;phi_78;psi_78;phi_79;psi_79;')
-		data.write('phi_80;psi_80;phi_81;psi_81;phi_82;psi_82;phi_83;psi_83;phi_84;psi_84;')
-		data.write('phi_85;psi_85;phi_86;psi_86;phi_87;psi_87;phi_88;psi_88;phi_89;psi_89;')
-		data.write('phi_90;psi_90;phi_91;psi_91;phi_92;psi_92;phi_93;psi_93;phi_94;psi_94;')
-		data.write('phi_95;psi_95;phi_96;psi_96;phi_97;psi_97;phi_98;psi_98;phi_99;psi_99;')
-		data.write('phi_100;psi_100;phi_101;psi_101;phi_102;psi_102;phi_103;psi_103;phi_104;')
-		data.write('psi_104;phi_105;psi_105;phi_106;psi_106;phi_107;psi_107;phi_108;psi_108;')
-		data.write('phi_109;psi_109;phi_110;psi_110;phi_111;psi_111;phi_112;psi_112;phi_113;')
-		data.write('psi_113;phi_114;psi_114;phi_115;psi_115;phi_116;psi_116;phi_117;psi_117;')
-		data.write('phi_118;psi_118;phi_119;psi_119;phi_120;psi_120;phi_121;psi_121;phi_122;')
-		data.write('psi_122;phi_123;psi_123;phi_124;psi_124;phi_125;psi_125;phi_126;psi_126;')
-		data.write('phi_127;psi_127;phi_128;psi_128;phi_129;psi_129;phi_130;psi_130;phi_131;')
-		data.write('psi_131;phi_132;psi_132;phi_133;psi_133;phi_134;psi_134;phi_135;psi_135;')
-		data.write('phi_136;psi_136;phi_137;psi_137;phi_138;psi_138;phi_139;psi_139;phi_140;')
-		data.write('psi_140;phi_141;psi_141;phi_142;psi_142;phi_143;psi_143;phi_144;psi_144;')
-		data.write('phi_145;psi_145;phi_146;psi_146;phi_147;psi_147;phi_148;psi_148;phi_149;')
-		data.write('psi_149;phi_150;psi_150\n')
-		data.close()
-		count = 1
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			try:
-				structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', TheFile)
-				dssp = Bio.PDB.DSSP(structure[0], TheFile, acc_array='Wilke')
-				for aa in dssp:
-					length = aa[0]
-				phi = list()
-				psi = list()
-				for aa in dssp:
-					#Convert all phi angle values to 0 to 360 (rather than +180 to -180)
-					p = aa[4]
-					if p < 0:
-						p = p + 360
-					phi.append(p)
-					#Convert all psi angle values to 0 to 360 (rather than +180 to -180)
-					s = aa[5]
-					if s < 0:
-						s = s + 360
-					psi.append(s)
-				angles = list()
-				for P, S in zip(phi, psi):
-					angles.append('{};{}'.format(str(round(P, 3)), str(round(S, 3))))
-				Angles = ';'.join(angles)
-				if len(angles) >= 150:
-					AngLine = Angles
-				else:
-					addition = 150 - len(angles)
-					zeros = list()
-					for adds in range(addition):
-						zeros.append('0.0;0.0')
-					Zeros = ';'.join(zeros)
-					AngLine = '{};{}'.format(Angles, Zeros)
-				TheLine = '{};{};{}\n'.format(str(count), TheFile, AngLine)
-				data = open('dataPS.csv', 'a')
-				data.write(TheLine)
-				data.close()
-				count += 1
-			except Exception as Error:
-				print(Error)
-		os.system('mv dataPS.csv {}'.format(current))
+		columns = ['{}_{}'.format(angle, i) for i in range(1, 151) for angle in ('phi', 'psi')]
+		with ShardWriter('dataPS', columns) as data:
+			for File, row, TheError in self.Map(self.DatasetPSFile, directory):
+				if row is None:
+					continue
+				data.write(File, row)
+	def DatasetPSFile(self, TheFile):
+		''' Get one protein's phi and psi angles as a dataPS row '''
+		dssp = DSSP(TheFile)
+		phi = list()
+		psi = list()
+		for aa in dssp:
+			#Convert all phi angle values to 0 to 360 (rather than +180 to -180)
+			p = aa[4]
+			if p < 0:
+				p = p + 360
+			phi.append(p)
+			#Convert all psi angle values to 0 to 360 (rather than +180 to -180)
+			s = aa[5]
+			if s < 0:
+				s = s + 360
+			psi.append(s)
+		return(Row([angle for P, S in zip(phi, psi) for angle in (P, S)], 300))
 	def DatasetPSOC(self, directory):
 		'''
 		Get each residue's phi, psi, and omega angles as well as CA atom
-		constraints (uses the PyRosetta library). Generates a the dataPSOC.csv
-		with the phi, psi, and omega angles as well as CA atom constraints
+		constraints (uses the PyRosetta library). Generates the dataPSOC/ binary
+		dataset with the phi, psi, and omega angles as well as CA atom constraints
 		for each amino acid
 		'''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
 		print('\x1b[32m[+] Getting the psi, psi, and omega angles and CA atom constraints\x1b[0m')
-		data = open('dataPSOC.csv', 'a')
-		data.write(';PDB_ID;phi_1;psi_1;omg_1;cst_1;phi_2;psi_2;omg_2;cst_2;')
-		data.write('phi_3;psi_3;omg_3;cst_3;phi_4;psi_4;omg_4;cst_4;phi_5;psi_5;omg_5;cst_5;')
-		data.write('phi_6;psi_6;omg_6;cst_6;phi_7;psi_7;omg_7;cst_7;phi_8;psi_8;omg_8;cst_8;')
-		data.write('phi_9;psi_9;omg_9;cst_9;phi_10;psi_10;omg_10;cst_10;phi_11;psi_11;omg_11;')
-		data.write('cst_11;phi_12;psi_12;omg_12;cst_12;phi_13;psi_13;omg_13;cst_13;phi_14;')
-		data.write('psi_14;omg_14;cst_14;phi_15;psi_15;omg_15;cst_15;phi_16;psi_16;omg_16;')
-		data.write('cst_16;phi_17;psi_17;omg_17;cst_17;phi_18;psi_18;omg_18;cst_18;phi_19;')
-		data.write('psi_19;omg_19;cst_19;phi_20;psi_20;omg_20;cst_20;phi_21;psi_21;omg_21;')
-		data.write('cst_21;phi_22;psi_22;omg_22;cst_22;phi_23;psi_23;omg_23;cst_23;phi_24;')
-		data.write('psi_24;omg_24;cst_24;phi_25;psi_25;omg_25;cst_25;phi_26;psi_26;omg_26;')
-		data.write('cst_26;phi_27;psi_27;omg_27;cst_27;phi_28;psi_28;omg_28;cst_28;phi_29;')
-		data.write('psi_29;omg_29;cst_29;phi_30;psi_30;omg_30;cst_30;phi_31;psi_31;omg_31;')
-		data.write('cst_31;phi_32;psi_32;omg_32;cst_32;phi_33;psi_33;omg_33;cst_33;phi_34;')
-		data.write('psi_34;omg_34;cst_34;phi_35;psi_35;omg_35;cst_35;phi_36;psi_36;omg_36;')
-		data.write('cst_36;phi_37;psi_37;omg_37;cst_37;phi_38;psi_38;omg_38;cst_38;phi_39;')
-		data.write('psi_39;omg_39;cst_39;phi_40;psi_40;omg_40;cst_40;phi_41;psi_41;omg_41;')
-		data.write('cst_41;phi_42;psi_42;omg_42;cst_42;phi_43;psi_43;omg_43;cst_43;phi_44;')
-		data.write('psi_44;omg_44;cst_44;phi_45;psi_45;omg_45;cst_45;phi_46;psi_46;omg_46;')
-		data.write('cst_46;phi_47;psi_47;omg_47;cst_47;phi_48;psi_48;omg_48;cst_48;phi_49;')
-		data.write('psi_49;omg_49;cst_49;phi_50;psi_50;omg_50;cst_50;phi_51;psi_51;omg_51;')
-		data.write('cst_51;phi_52;psi_52;omg_52;cst_52;phi_53;psi_53;omg_53;cst_53;phi_54;')
-		data.write('psi_54;omg_54;cst_54;phi_55;psi_55;omg_55;cst_55;phi_56;psi_56;omg_56;')
-		data.write('cst_56;phi_57;psi_57;omg_57;cst_57;phi_58;psi_58;omg_58;cst_58;phi_59;')
-		data.write('psi_59;omg_59;cst_59;phi_60;psi_60;omg_60;cst_60;phi_61;psi_61;omg_61;')
-		data.write('cst_61;phi_62;psi_62;omg_62;cst_62;phi_63;psi_63;omg_63;cst_63;phi_64;')
-		data.write('psi_64;omg_64;cst_64;phi_65;psi_65;omg_65;cst_65;phi_66;psi_66;omg_66;')
-		data.write('cst_66;phi_67;psi_67;omg_67;cst_67;phi_68;psi_68;omg_68;cst_68;phi_69;')
-		data.write('psi_69;omg_69;cst_69;phi_70;psi_70;omg_70;cst_70;phi_71;psi_71;omg_71;')
-		data.write('cst_71;phi_72;psi_72;omg_72;cst_72;phi_73;psi_73;omg_73;cst_73;phi_74;')
-		data.write('psi_74;omg_74;cst_74;phi_75;psi_75;omg_75;cst_75;phi_76;psi_76;omg_76;')
-		data.write('cst_76;phi_77;psi_77;omg_77;cst_77;phi_78;psi_78;omg_78;cst_78;phi_79;')
-		data.write('psi_79;omg_79;cst_79;phi_80;psi_80;omg_80;cst_80;phi_81;psi_81;omg_81;')
-		data.write('cst_81;phi_82;psi_82;omg_82;cst_82;phi_83;psi_83;omg_83;cst_83;phi_84;')
-		data.write('psi_84;omg_84;cst_84;phi_85;psi_85;omg_85;cst_85;phi_86;psi_86;omg_86;')
-		data.write('cst_86;phi_87;psi_87;omg_87;cst_87;phi_88;psi_88;omg_88;cst_88;phi_89;')
-		data.write('psi_89;omg_89;cst_89;phi_90;psi_90;omg_90;cst_90;phi_91;psi_91;omg_91;')
-		data.write('cst_91;phi_92;psi_92;omg_92;cst_92;phi_93;psi_93;omg_93;cst_93;phi_94;')
-		data.write('psi_94;omg_94;cst_94;phi_95;psi_95;omg_95;cst_95;phi_96;psi_96;omg_96;')
-		data.write('cst_96;phi_97;psi_97;omg_97;cst_97;phi_98;psi_98;omg_98;cst_98;phi_99;')
-		data.write('psi_99;omg_99;cst_99;phi_100;psi_100;omg_100;cst_100;phi_101;psi_101;')
-		data.write('omg_101;cst_101;phi_102;psi_102;omg_102;cst_102;phi_103;psi_103;omg_103;')
-		data.write('cst_103;phi_104;psi_104;omg_104;cst_104;phi_105;psi_105;omg_105;cst_105;')
-		data.write('phi_106;psi_106;omg_106;cst_106;phi_107;psi_107;omg_107;cst_107;phi_108;')
-		data.write('psi_108;omg_108;cst_108;phi_109;psi_109;omg_109;cst_109;phi_110;psi_110;')
-		data.write('omg_110;cst_110;phi_111;psi_111;omg_111;cst_111;phi_112;psi_112;omg_112;')
-		data.write('cst_112;phi_113;psi_113;omg_113;cst_113;phi_114;psi_114;omg_114;cst_114;')
-		data.write('phi_115;psi_115;omg_115;cst_115;phi_116;psi_116;omg_116;cst_116;phi_117;')
-		data.write('psi_117;omg_117;cst_117;phi_118;psi_118;omg_118;cst_118;phi_119;psi_119;')
-		data.write('omg_119;cst_119;phi_120;psi_120;omg_120;cst_120;phi_121;psi_121;omg_121;')
-		data.write('cst_121;phi_122;psi_122;omg_122;cst_122;phi_123;psi_123;omg_123;cst_123;')
-		data.write('phi_124;psi_124;omg_124;cst_124;phi_125;psi_125;omg_125;cst_125;phi_126;')
-		data.write('psi_126;omg_126;cst_126;phi_127;psi_127;omg_127;cst_127;phi_128;psi_128;')
-		data.write('omg_128;cst_128;phi_129;psi_129;omg_129;cst_129;phi_130;psi_130;omg_130;')
-		data.write('cst_130;phi_131;psi_131;omg_131;cst_131;phi_132;psi_132;omg_132;cst_132;')
-		data.write('phi_133;psi_133;omg_133;cst_133;phi_134;psi_134;omg_134;cst_134;phi_135;')
-		data.write('psi_135;omg_135;cst_135;phi_136;psi_136;omg_136;cst_136;phi_137;psi_137;')
-		data.write('omg_137;cst_137;phi_138;psi_138;omg_138;cst_138;phi_139;psi_139;omg_139;')
-		data.write('cst_139;phi_140;psi_140;omg_140;cst_140;phi_141;psi_141;omg_141;cst_141;')
-		data.write('phi_142;psi_142;omg_142;cst_142;phi_143;psi_143;omg_143;cst_143;phi_144;')
-		data.write('psi_144;omg_144;cst_144;phi_145;psi_145;omg_145;cst_145;phi_146;psi_146;')
-		data.write('omg_146;cst_146;phi_147;psi_147;omg_147;cst_147;phi_148;psi_148;omg_148;')
-		data.write('cst_148;phi_149;psi_149;omg_149;cst_149;phi_150;psi_150;omg_150;cst_150\n')
-		data.close()
-		count = 1
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			pyrosetta.toolbox.cleaning.cleanATOM(TheFile)
-			TheFile2 = TheFile.split('.')
-			pose = pose_from_pdb('{}.clean.pdb'.format(TheFile2[0]))
-			size = len(pose)
-			phi = list()
-			psi = list()
-			omg = list()
-			cst = list()
-			for aa in range(size):
-				p = pose.phi(aa+1)
-				#Convert all phi angle values to 0 to 360 (rather than +180 to -180)
-				if p < 0:
-					p = p + 360
-				phi.append(p)
-				s = pose.psi(aa+1)
-				#Convert all psi angle values to 0 to 360 (rather than +180 to -180)
-				if s < 0:
-					s = s + 360
-				psi.append(s)
-				o = pose.omega(aa+1)
-				#Convert all omega angle values to 0 to 360 (rather than +180 to -180)
-				if o < 0:
-					o = o + 360
-				omg.append(o)
-			structure = Bio.PDB.PDBParser().get_structure('X', TheFile)
-			dssp = Bio.PDB.DSSP(structure[0], TheFile, acc_array='Wilke')
-			for aa in dssp:
-				length = aa[0]
-			structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', TheFile)
-			ppb = Bio.PDB.Polypeptide.PPBuilder()
-			Type = ppb.build_peptides(structure, aa_only=False)
-			model = Type
-			chain = model[0]
-			cst.append(0.0)
-			for aa in range(1, length+1):
-				try:
-					residue1 = chain[0]
-					residue2 = chain[aa]
-					atom1 = residue1['CA']
-					atom2 = residue2['CA']
-					cst.append(atom1-atom2)
-				except:
-					pass
-			angles = list()
-			for P, S, O, C in zip(phi, psi, omg, cst):
-				angles.append('{};{};{};{}'.format(str(round(P, 3)), str(round(S, 3)), str(round(O, 3)), str(round(C, 3))))
-			Angles = ';'.join(angles)
-			if len(angles) >= 150:
-				AngLine = Angles
-			else:
-				addition = 150 - len(angles)
-				zeros = list()
-				for adds in range(addition):
-					zeros.append('0.0;0.0;0.0;0.0')
-				Zeros = ';'.join(zeros)
-				AngLine = '{};{}'.format(Angles, Zeros)
-			TheLine = '{};{};{}\n'.format(str(count), TheFile, AngLine)
-			data = open('dataPSOC.csv', 'a')
-			data.write(TheLine)
-			data.close()
-			count += 1
-		os.system('mv dataPSOC.csv {}'.format(current))
+		columns = ['{}_{}'.format(angle, i) for i in range(1, 151) for angle in ('phi', 'psi', 'omg', 'cst')]
+		with ShardWriter('dataPSOC', columns) as data:
+			for File, row, TheError in self.Map(self.DatasetPSOCFile, directory):
+				if row is None:
+					continue
+				data.write(File, row)
+	def DatasetPSOCFile(self, TheFile):
+		''' Get one protein's phi, psi, and omega angles and CA atom constraints as a dataPSOC row '''
+		pyrosetta.toolbox.cleaning.cleanATOM(TheFile)
+		CleanFile = '{}.clean.pdb'.format(os.path.splitext(TheFile)[0])
+		pose = pose_from_pdb(CleanFile)
+		os.remove(CleanFile)
+		size = len(pose)
+		phi = list()
+		psi = list()
+		omg = list()
+		cst = list()
+		for aa in range(size):
+			p = pose.phi(aa+1)
+			#Convert all phi angle values to 0 to 360 (rather than +180 to -180)
+			if p < 0:
+				p = p + 360
+			phi.append(p)
+			s = pose.psi(aa+1)
+			#Convert all psi angle values to 0 to 360 (rather than +180 to -180)
+			if s < 0:
+				s = s + 360
+			psi.append(s)
+			o = pose.omega(aa+1)
+			#Convert all omega angle values to 0 to 360 (rather than +180 to -180)
+			if o < 0:
+				o = o + 360
+			omg.append(o)
+		structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', TheFile)
+		dssp = DSSP(TheFile)
+		for aa in dssp:
+			length = aa[0]
+		ppb = Bio.PDB.Polypeptide.PPBuilder()
+		Type = ppb.build_peptides(structure, aa_only=False)
+		model = Type
+		chain = model[0]
+		cst.append(0.0)
+		for aa in range(1, length+1):
+			try:
+				residue1 = chain[0]
+				residue2 = chain[aa]
+				atom1 = residue1['CA']
+				atom2 = residue2['CA']
+				cst.append(atom1-atom2)
+			except:
+				pass
+		return(Row([value for P, S, O, C in zip(phi, psi, omg, cst) for value in (P, S, O, C)], 600))
 	def DatasetPSC(self, directory):
-		''' Get each residue's phi and psi angles as well as CA atom constraints (uses the PyRosetta library) '''
-		''' Generates a the dataPSC.csv with the phi and psi angles as well as CA atom constraints for each amino acid '''
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
+		'''
+		Get each residue's phi and psi angles as well as CA atom constraints (uses
+		the PyRosetta library). Generates the dataPSC/ binary dataset with the phi
+		and psi angles as well as CA atom constraints for each amino acid
+		'''
 		print('\x1b[32m[+] Getting the psi and psi angles as well as CA atom constraints\x1b[0m')
-		data = open('dataPSC.csv', 'a')
-		data.write(';PDB_ID;phi_1;psi_1;cst_1;phi_2;psi_2;cst_2;phi_3;psi_3;')
-		data.write('cst_3;phi_4;psi_4;cst_4;phi_5;psi_5;cst_5;phi_6;psi_6;cst_6;phi_7;psi_7;')
-		data.write('cst_7;phi_8;psi_8;cst_8;phi_9;psi_9;cst_9;phi_10;psi_10;cst_10;phi_11;')
-		data.write('psi_11;cst_11;phi_12;psi_12;cst_12;phi_13;psi_13;cst_13;phi_14;psi_14;')
-		data.write('cst_14;phi_15;psi_15;cst_15;phi_16;psi_16;cst_16;phi_17;psi_17;cst_17;')
-		data.write('phi_18;psi_18;cst_18;phi_19;psi_19;cst_19;phi_20;psi_20;cst_20;phi_21;')
-		data.write('psi_21;cst_21;phi_22;psi_22;cst_22;phi_23;psi_23;cst_23;phi_24;psi_24;')
-		data.write('cst_24;phi_25;psi_25;cst_25;phi_26;psi_26;cst_26;phi_27;psi_27;cst_27;')
-		data.write('phi_28;psi_28;cst_28;phi_29;psi_29;cst_29;phi_30;psi_30;cst_30;phi_31;')
-		data.write('psi_31;cst_31;phi_32;psi_32;cst_32;phi_33;psi_33;cst_33;phi_34;psi_34;')
-		data.write('cst_34;phi_35;psi_35;cst_35;phi_36;psi_36;cst_36;phi_37;psi_37;cst_37;')
-		data.write('phi_38;psi_38;cst_38;phi_39;psi_39;cst_39;phi_40;psi_40;cst_40;phi_41;')
-		data.write('psi_41;cst_41;phi_42;psi_42;cst_42;phi_43;psi_43;cst_43;phi_44;psi_44;')
-		data.write('cst_44;phi_45;psi_45;cst_45;phi_46;psi_46;cst_46;phi_47;psi_47;cst_47;')
-		data.write('phi_48;psi_48;cst_48;phi_49;psi_49;cst_49;phi_50;psi_50;cst_50;phi_51;')
-		data.write('psi_51;cst_51;phi_52;psi_52;cst_52;phi_53;psi_53;cst_53;phi_54;psi_54;')
-		data.write('cst_54;phi_55;psi_55;cst_55;phi_56;psi_56;cst_56;phi_57;psi_57;cst_57;')
-		data.write('phi_58;psi_58;cst_58;phi_59;psi_59;cst_59;phi_60;psi_60;cst_60;phi_61;')
-		data.write('psi_61;cst_61;phi_62;psi_62;cst_62;phi_63;psi_63;cst_63;phi_64;psi_64;')
-		data.write('cst_64;phi_65;psi_65;cst_65;phi_66;psi_66;cst_66;phi_67;psi_67;cst_67;')
-		data.write('phi_68;psi_68;cst_68;phi_69;psi_69;cst_69;phi_70;psi_70;cst_70;phi_71;')
-		data.write('psi_71;cst_71;phi_72;psi_72;cst_72;phi_73;psi_73;cst_73;phi_74;psi_74;')
-		data.write('cst_74;phi_75;psi_75;cst_75;phi_76;psi_76;cst_76;phi_77;psi_77;cst_77;')
-		data.write('phi_78;psi_78;cst_78;phi_79;psi_79;cst_79;phi_80;psi_80;cst_80;phi_81;')
-		data.write('psi_81;cst_81;phi_82;psi_82;cst_82;phi_83;psi_83;cst_83;phi_84;psi_84;')
-		data.write('cst_84;phi_85;psi_85;cst_85;phi_86;psi_86;cst_86;phi_87;psi_87;cst_87;')
-		data.write('phi_88;psi_88;cst_88;phi_89;psi_89;cst_89;phi_90;psi_90;cst_90;phi_91;')
-		data.write('psi_91;cst_91;phi_92;psi_92;cst_92;phi_93;psi_93;cst_93;phi_94;psi_94;')
-		data.write('cst_94;phi_95;psi_95;cst_95;phi_96;psi_96;cst_96;phi_97;psi_97;cst_97;')
-		data.write('phi_98;psi_98;cst_98;phi_99;psi_99;cst_99;phi_100;psi_100;cst_100;phi_101;')
-		data.write('psi_101;cst_101;phi_102;psi_102;cst_102;phi_103;psi_103;cst_103;phi_104;')
-		data.write('psi_104;cst_104;phi_105;psi_105;cst_105;phi_106;psi_106;cst_106;phi_107;')
-		data.write('psi_107;cst_107;phi_108;psi_108;cst_108;phi_109;psi_109;cst_109;phi_110;')
-		data.write('psi_110;cst_110;phi_111;psi_111;cst_111;phi_112;psi_112;cst_112;phi_113;')
-		data.write('psi_113;cst_113;phi_114;psi_114;cst_114;phi_115;psi_115;cst_115;phi_116;')
-		data.write('psi_116;cst_116;phi_117;psi_117;cst_117;phi_118;psi_118;cst_118;phi_119;')
-		data.write('psi_119;cst_119;phi_120;psi_120;cst_120;phi_121;psi_121;cst_121;phi_122;')
-		data.write('psi_122;cst_122;phi_123;psi_123;cst_123;phi_124;psi_124;cst_124;phi_125;')
-		data.write('psi_125;cst_125;phi_126;psi_126;cst_126;phi_127;psi_127;cst_127;phi_128;')
-		data.write('psi_128;cst_128;phi_129;psi_129;cst_129;phi_130;psi_130;cst_130;phi_131;')
-		data.write('psi_131;cst_131;phi_132;psi_132;cst_132;phi_133;psi_133;cst_133;phi_134;')
-		data.write('psi_134;cst_134;phi_135;psi_135;cst_135;phi_136;psi_136;cst_136;phi_137;')
-		data.write('psi_137;cst_137;phi_138;psi_138;cst_138;phi_139;psi_139;cst_139;phi_140;')
-		data.write('psi_140;cst_140;phi_141;psi_141;cst_141;phi_142;psi_142;cst_142;phi_143;')
-		data.write('psi_143;cst_143;phi_144;psi_144;cst_144;phi_145;psi_145;cst_145;phi_146;')
-		data.write('psi_146;cst_146;phi_147;psi_147;cst_147;phi_148;psi_148;cst_148;phi_149;')
-		data.write('psi_149;cst_149;phi_150;psi_150;cst_150\n')
-		data.close()
-		count = 1
-		for TheFile in tqdm.tqdm(pdbfilelist):
+		columns = ['{}_{}'.format(angle, i) for i in range(1, 151) for angle in ('phi', 'psi', 'cst')]
+		with ShardWriter('dataPSC', columns) as data:
+			for File, row, TheError in self.Map(self.DatasetPSCFile, directory):
+				if row is None:
+					continue
+				data.write(File, row)
+	def DatasetPSCFile(self, TheFile):
+		''' Get one protein's phi and psi angles and CA atom constraints as a dataPSC row '''
+		structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', TheFile)
+		dssp = DSSP(TheFile)
+		for aa in dssp:
+			length = aa[0]
+		phi = list()
+		psi = list()
+		cst = list()
+		for aa in dssp:
+			#Convert all phi angle values to 0 to 360 (rather than +180 to -180)
+			p = aa[4]
+			if p < 0:
+				p = p + 360
+			phi.append(p)
+			#Convert all psi angle values to 0 to 360 (rather than +180 to -180)
+			s = aa[5]
+			if s < 0:
+				s = s + 360
+			psi.append(s)
+		ppb = Bio.PDB.Polypeptide.PPBuilder()
+		Type = ppb.build_peptides(structure, aa_only=False)
+		model = Type
+		chain = model[0]
+		cst.append(0.0)
+		for aa in range(1, length+1):
 			try:
-				structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', TheFile)
-				dssp = Bio.PDB.DSSP(structure[0], TheFile, acc_array='Wilke')
-				for aa in dssp:
-					length = aa[0]
-				phi = list()
-				psi = list()
-				cst = list()
-				for aa in dssp:
-					#Convert all phi angle values to 0 to 360 (rather than +180 to -180)
-					p = aa[4]
-					if p < 0:
-						p = p + 360
-					phi.append(p)
-					#Convert all psi angle values to 0 to 360 (rather than +180 to -180)
-					s = aa[5]
-					if s < 0:
-						s = s + 360
-					psi.append(s)
-				ppb = Bio.PDB.Polypeptide.PPBuilder()
-				Type = ppb.build_peptides(structure, aa_only=False)
-				model = Type
-				chain = model[0]
-				cst.append(0.0)
-				for aa in range(1, length+1):
-					try:
-						residue1 = chain[0]
-						residue2 = chain[aa]
-						atom1 = residue1['CA']
-						atom2 = residue2['CA']
-						cst.append(atom1-atom2)
-					except:
-						pass
-				angles = list()
-				for P, S, C in zip(phi, psi, cst):
-					angles.append('{};{};{}'.format(str(round(P, 3)), str(round(S, 3)), str(round(C, 3))))
-				Angles = ';'.join(angles)
-				if len(angles) >= 150:
-					AngLine = Angles
-				else:
-					addition = 150 - len(angles)
-					zeros = list()
-					for adds in range(addition):
-						zeros.append('0.0;0.0;0.0')
-					Zeros = ';'.join(zeros)
-					AngLine = '{};{}'.format(Angles, Zeros)
-				TheLine = '{};{};{}\n'.format(str(count), TheFile, AngLine)
-				data = open('dataPSC.csv', 'a')
-				data.write(TheLine)
-				data.close()
-				count += 1
-			except Exception as Error:
-				print(Error)
-		os.system('mv dataPSC.csv {}'.format(current))
+				residue1 = chain[0]
+				residue2 = chain[aa]
+				atom1 = residue1['CA']
+				atom2 = residue2['CA']
+				cst.append(atom1-atom2)
+			except:
+				pass
+		return(Row([value for P, S, C in zip(phi, psi, cst) for value in (P, S, C)], 450))
 	def build(self):
+		''' Build the dataset, every stage is journaled so an interrupted build resumes where it stopped '''
 		#||| Isolate specific types of structures |||
 		#--------------------------------------------
-		self.Database('DATABASE', 'PDBDatabase')# 1. Download the PDB database
-		self.DatExtract('PDBDatabase')			# 2. Extract files
-		self.DatNonProtein('PDBDatabase')		# 3. Remove non-protein structures
-		self.DatSize('PDBDatabase', 80, 150)	# 4. Remove structures less than or larger than a specified amino acid length
-		self.DatBreak('PDBDatabase')			# 5. Remove structure with broken chains
-		self.DatLoops('PDBDatabase', 10)		# 6. Remove structures that have loops that are larger than a spesific length
-		self.DatRenumber('PDBDatabase')			# 7. Renumber structures starting at amino acid 1
-		self.DatRg('PDBDatabase', 15)			# 8. Remove structures that are below a specified Radius of Gyration value
-		#self.RMSD('PDBDatabase', 5)			# 9. Measure RMSD of each structure to each structure, remove if RMSD < specified value (CODE IS NOT VERY RELIABLE)
-		#self.Sequence('PDBDatabase', 75)		# 10. Align the sequences of each structure to each structure, remove structures with similar sequences that fall above a user defined percentage
+		self.Stage('Database', self.Database, 'DATABASE', 'PDBDatabase')# 1. Download the PDB database
+		self.Stage('Extract', self.Extract, 'PDBDatabase')				# 2. Extract files
+		self.Stage('Filter', self.Filter, 'PDBDatabase',				# 3-6,8. In a single pass reject:
+			NonProtein=True,											# 3. non-protein structures
+			Size=(80, 150),												# 4. structures less than or larger than a specified amino acid length
+			Break=True,													# 5. structure with broken chains
+			Loops=10,													# 6. structures that have loops that are larger than a spesific length
+			Rg=15)														# 8. structures that are below a specified Radius of Gyration value
+		self.Stage('Renumber', self.Renumber, 'PDBDatabase')			# 7. Renumber structures starting at amino acid 1
+		self.Stage('RMSD', self.RMSD, 'PDBDatabase', 5)					# 9. Cluster structures by RMSD, keep one structure from each cluster where RMSD < specified value
+		self.Stage('Sequence', self.Sequence, 'PDBDatabase', 75)		# 10. Cluster structures by sequence identity, keep one structure from each cluster with identity above a user defined percentage
+		self.Purge('PDBDatabase')										# Delete the rejected structures
 		########## --- HUMAN EYE FILTERING --- ##########
 		#||| Extract specific information from isolated structures |||
 		#-------------------------------------------------------------
-		#self.Clean('PDBDatabase')				# 11. Clean every structure in the database
-		#self.Score('PDBCleaned')				# 12. Score each structure in PyRosetta and get only those that pass through (if you get a segmentation fault, you must manually delete that file, python cannot try/except arround it)
-		#self.Path('PDBCleaned', '{PATH}')		# 13. Make a list of all paths
-		#self.Relax('PDBCleaned')				# 14. Relax each structure and generate 100 structures
-		#self.RelaxHPC('~/Rosetta', 829)		# 15. Relax each structure and generate 100 in HPC
+		#self.Stage('Clean', self.Clean, 'PDBDatabase')					# 11. Clean every structure in the database
+		#self.Stage('Score', self.Score, 'PDBCleaned')					# 12. Score each structure in PyRosetta and reject those that fail (a structure that crashes PyRosetta with a segmentation fault is isolated and rejected)
+		#self.Purge('PDBCleaned')										# Delete the rejected structures
+		#self.Stage('Path', self.Path, 'PDBCleaned', '{PATH}')			# 13. Make a list of all paths
+		#self.Stage('Relax', self.Relax, 'PDBCleaned')					# 14. Relax each structure and generate 100 structures
+		#self.Stage('RelaxHPC', self.RelaxHPC, '~/Rosetta', 829)		# 15. Relax each structure and generate 100 in HPC
 		#||| Generate the dataset |||
 		#----------------------------
-		self.DatasetPSC('PDBDatabase')			# 16. Get each residue's phi and psi angles as well as CA atom constraints
-		#self.DatasetR('PDBDatabase')			# 17. Get the secondary structures and distances
-		#self.DatasetCA('PDBDatabase')			# 18. Get each residue's CA atom's XYZ coordinates
-		#self.DatasetPSO('PDBDatabase')			# 19. Get each residue's phi, psi, and omega angles
-		#self.DatasetPS('PDBDatabase')			# 20. Get each residue's phi and psi angles
-		#self.DatasetPSOC('PDBDatabase')		# 21. Get each residue's phi, psi, and omega angles as well as CA atom constraints
-		#self.Seq('PDBDatabase')				# 22. Get each protein's sequence
-		#self.SS('PDBDatabase')					# 23. Get each residue's secondary structure
-		self.CSTMax('dataPSC.csv')				# 24. Get the maximum cst value in a dataset
+		self.Stage('DatasetPSC', self.DatasetPSC, 'PDBDatabase')		# 16. Get each residue's phi and psi angles as well as CA atom constraints
+		#self.Stage('DatasetR', self.DatasetR, 'PDBDatabase')			# 17. Get the secondary structures and distances
+		#self.Stage('DatasetCA', self.DatasetCA, 'PDBDatabase')			# 18. Get each residue's CA atom's XYZ coordinates
+		#self.Stage('DatasetPSO', self.DatasetPSO, 'PDBDatabase')		# 19. Get each residue's phi, psi, and omega angles
+		#self.Stage('DatasetPS', self.DatasetPS, 'PDBDatabase')			# 20. Get each residue's phi and psi angles
+		#self.Stage('DatasetPSOC', self.DatasetPSOC, 'PDBDatabase')		# 21. Get each residue's phi, psi, and omega angles as well as CA atom constraints
+		#self.Stage('Fasta', self.Fasta, 'PDBDatabase')					# 22. Get each protein's sequence
+		#self.Stage('SS', self.SS, 'PDBDatabase')						# 23. Get each residue's secondary structure
+		self.CSTMax('dataPSC')											# 24. Get the maximum cst value in a dataset
 
 class RosettaDesign(object):
 	def __init__(self, filename):
@@ -1072,11 +1162,11 @@ class RosettaDesign(object):
 						'L':201, 'W':285, 'E':223, 'T':172,
 						'M':224, 'R':274, 'G':104, 'D':193}
 		self.filename = filename
-		parser = Bio.PDB.PDBParser()
-		structure = parser.get_structure('{}'.format(filename), filename)
-		dssp = Bio.PDB.DSSP(structure[0], filename, acc_array='Wilke')
+		dssp = DSSP(filename)
 		sasalist = []
 		for aa in dssp:
+			if aa[3] == 'NA':
+				raise ValueError('DSSP has no accessibility for residue {} ({})'.format(aa[0], aa[1]))
 			sasa = AminoAcid[aa[1]]*aa[3]
 			if sasa <= 25:      sasa = 'C'
 			elif 25 < sasa < 40:sasa = 'B'
@@ -1383,7 +1473,139 @@ _  _, _// /_/ /  /_/ /  __/ /_ / /_ / /_/ /
 	print('\u001b[34mAverage RMSD:\u001b[0m {}'.format(round(Average_RMSD, 3)))
 	return(Average_RMSD)
 
-def LSTM(choice):
+class Funnel():
+	'''
+	Per-attempt instrumentation of a generate, fold, and filter loop. Every attempt is
+	appended to a JSON lines file with the stage it ended at (accepted, or the stage that
+	rejected it and why), the CPU seconds spent in each step, and the filter measurements.
+	summary() reports the acceptance rate and the CPU seconds per accepted design
+	'''
+	def __init__(self, filename='funnel.jsonl'):
+		self.filename = filename
+	def write(self, stage, reason=None, seconds=None, components=None):
+		''' Append one attempt to the funnel '''
+		if self.filename is None:
+			return
+		record = {'time': time.time(), 'stage': stage, 'reason': reason, 'seconds': seconds or {}, 'components': components or {}}
+		with open(self.filename, 'a') as f:
+			f.write(json.dumps(record) + '\n')
+	def summary(self):
+		''' Print the acceptance rate, costs, and rejections of the funnel '''
+		attempts, accepted, cpu = 0, 0, 0
+		steps = collections.Counter()
+		rejections = collections.Counter()
+		with open(self.filename) as f:
+			for line in f:
+				record = json.loads(line)
+				attempts += 1
+				cpu += sum(record['seconds'].values())
+				steps.update(record['seconds'])
+				if record['stage'] == 'accepted':
+					accepted += 1
+				else:
+					rejections[(record['stage'], record['reason'])] += 1
+		print('\x1b[32m[+] Attempts {}, accepted {} ({:.2%})\x1b[0m'.format(attempts, accepted, accepted / max(attempts, 1)))
+		print('\x1b[32m[+] CPU seconds per accepted design: {}\x1b[0m'.format(round(cpu / accepted, 2) if accepted else 'none accepted'))
+		print('\x1b[32m[+] CPU seconds per attempt: {}\x1b[0m'.format(', '.join('{} {:.3f}'.format(step, total / attempts) for step, total in steps.items())))
+		for (stage, reason), count in rejections.most_common():
+			print('\x1b[33m[.] Rejected at {}: {} {}\x1b[0m'.format(stage, reason, count))
+
+def TrimLoop(pose, extra=0):
+	''' Delete the trailing loop (and extra residues before it) of a pose in place, the secondary structure is computed on the pose itself. Raises a ValueError if the whole structure is a loop '''
+	SS = pyrosetta.rosetta.core.scoring.dssp.Dssp(pose).get_dssp_secstruct()
+	core = len(SS.rstrip('L'))
+	if core == 0:
+		raise ValueError('Unsatisfactory structure')
+	start = core + 1 - extra
+	if start <= pose.size():
+		pose.delete_residue_range_slow(start, pose.size())
+	return(pose)
+
+def PoseDSSP(pose):
+	''' DSSP records (number, amino acid, secondary structure, relative solvent accessibility) of every residue of a pose, computed in memory with PyRosetta's DSSP and SASA instead of running DSSP on a .pdb file. The accessibility is relative to the theoretical maximum of Tien et al. 2013 '''
+	MaxASA = {'A':129, 'V':174, 'I':197, 'L':201, 'M':224, 'P':159, 'Y':263, 'F':240, 'W':285, 'R':274, 'N':195, 'C':167, 'Q':225, 'E':223, 'G':104, 'H':224, 'K':236, 'S':155, 'T':172, 'D':193}
+	SS = pyrosetta.rosetta.core.scoring.dssp.Dssp(pose).get_dssp_secstruct()
+	sasa_calc = pyrosetta.rosetta.core.scoring.sasa.SasaCalc()
+	sasa_calc.calculate(pose)
+	surf = list(sasa_calc.get_residue_sasa())
+	records = []
+	for r in range(pose.size()):
+		aa = pose.residue(r+1).name1()
+		records.append((r+1, aa, {'H':'H', 'E':'E'}.get(SS[r], '-'), surf[r] / MaxASA[aa]))
+	return(records)
+
+def AtomPairs(pose, first, second, distances, sd=1.0):
+	''' Add a CA-CA AtomPairConstraint with a GaussianFunc (mean distance, standard deviation sd) between every pair of residues to a pose, the constraints are collected in one ConstraintSet that is set on the pose '''
+	constraints = pose.constraint_set().clone()
+	for a, A, distance in zip(first, second, distances):
+		a, A = int(a), int(A)
+		atom1 = pyrosetta.rosetta.core.id.AtomID(pose.residue(a).atom_index('CA'), a)
+		atom2 = pyrosetta.rosetta.core.id.AtomID(pose.residue(A).atom_index('CA'), A)
+		func = pyrosetta.rosetta.core.scoring.func.GaussianFunc(float(distance), sd)
+		constraints.add_constraint(pyrosetta.rosetta.core.scoring.constraints.AtomPairConstraint(atom1, atom2, func))
+	pose.constraint_set(constraints)
+	return(pose)
+
+class MDN():
+	'''
+	A NumPy inference engine of the LSTM's mixture density network, it runs the LSTM cells,
+	the sigmoid hidden layer, and the Gaussian mixture sampling for a batch of chains at
+	once from the weights exported by LSTM('export'), so TensorFlow is never imported
+	'''
+	def __init__(self, filename='./weights/weights.npz', batch_size=16):
+		W = np.load(filename)
+		layers = sorted(int(name.split('_')[1]) for name in W.files if name.startswith('kernel_'))
+		self.layers = [(W['kernel_{}'.format(n)], W['bias_{}'.format(n)]) for n in layers]
+		self.w1, self.b1, self.w2, self.b2 = W['w1'], W['b1'], W['w2'], W['b2']
+		self.rnn_size = self.layers[0][1].shape[0] // 4
+		self.num_mixtures = self.b2.shape[0] // 3
+		self.batch_size = batch_size
+	@staticmethod
+	def sigmoid(x):
+		return(0.5 * (np.tanh(0.5 * x) + 1.0))
+	@staticmethod
+	def draw(mu, sigma, pi):
+		''' Draw one value per row, every row picks its mixture by inverting its cumulative pi at a uniform draw '''
+		rows = np.arange(pi.shape[0])
+		select_mixture = (pi.cumsum(axis=1) < np.random.uniform(size=(pi.shape[0], 1))).sum(axis=1)
+		select_mixture = np.minimum(select_mixture, pi.shape[1] - 1)
+		return(np.random.normal(loc=mu[rows, select_mixture], scale=sigma[rows, select_mixture]))
+	def step(self, x, state):
+		''' One time step of a (batch, 1) input, state is a (c, h) pair per layer, returns mu, sigma, pi and the new state '''
+		new_state = []
+		for (kernel, bias), (c, h) in zip(self.layers, state):
+			# TensorFlow's LSTMCell gate order is input, new input, forget, output with a forget bias of 1
+			i, j, f, o = np.split(np.concatenate((x, h), axis=1) @ kernel + bias, 4, axis=1)
+			c = self.sigmoid(f + 1.0) * c + self.sigmoid(i) * np.tanh(j)
+			h = self.sigmoid(o) * np.tanh(c)
+			new_state.append((c, h))
+			x = h
+		h1 = self.sigmoid(x @ self.w1 + self.b1)
+		gmm_params = h1 @ self.w2 + self.b2
+		mu = gmm_params[:, :self.num_mixtures]
+		sigma = np.exp(gmm_params[:, self.num_mixtures:2 * self.num_mixtures] / 2.0)
+		pi = gmm_params[:, 2 * self.num_mixtures:]
+		pi = np.exp(pi - pi.max(axis=1, keepdims=True))
+		pi /= pi.sum(axis=1, keepdims=True)
+		return(mu, sigma, pi, new_state)
+	def sample(self, seq_len=300):
+		''' Returns a (batch_size, seq_len) array of normalised angles '''
+		zeros = np.zeros((self.batch_size, self.rnn_size), dtype=np.float32)
+		state = [(zeros, zeros) for layer in self.layers]
+		preds = np.empty((self.batch_size, seq_len))
+		x = np.random.uniform(size=self.batch_size)
+		for step in range(seq_len):
+			mu, sigma, pi, state = self.step(x.reshape((self.batch_size, 1)).astype(np.float32), state)
+			x = self.draw(mu, sigma, pi)
+			preds[:, step] = x
+		return(preds)
+	def angles(self, size=150):
+		''' Returns a (batch_size, size, 2) array of phi/psi angles in degrees '''
+		return(self.sample(size * 2).reshape((self.batch_size, size, 2)) * 360.0)
+	def close(self):
+		pass
+
+def LSTM(choice, sampler=None):
 	'''
 	A neural network that designs a helical protein topology using phi/psi angels
 	The neural network was chosen and optamised by Mikhail Markovsky.
@@ -1408,11 +1630,13 @@ def LSTM(choice):
 	-----------------------------------------------------------------------------------
 	'''
 	TRAIN_DATA_FILE = './PS_Helix_500.csv'	# Dataset location
-	NUM_EPOCHS = 3000						# Number of training epochs
+	NUM_EPOCHS = 100						# Number of training epochs over the whole dataset
 	MAX_ATOMS = 150							# Maximum protein chain length
 	SEQ_LEN = MAX_ATOMS * 2					# Total prediction sequence length (2 angles per atom)
-	N_STRUCTURES = 1						# Number of structures to predict
-	def FoldPDB_PS(data):
+	BATCH_SIZE = 16							# Number of structures sampled at once
+	WEIGHTS = './weights/weights.npz'		# Exported weights of the NumPy sampler
+	def FoldPDB_PS(data, filename='backbone.pdb'):
+		''' Fold a structure from phi/psi angles in memory, returns the pose (None if it failed) and only exports it if a filename is given '''
 		size = int(len(data[0]))
 		Vs = list()
 		for numb in range(size): Vs.append('V')
@@ -1425,60 +1649,53 @@ def LSTM(choice):
 			pose.set_phi(count, float(P))
 			pose.set_psi(count, float(S))
 			count += 1
-		atom = 1
 		scorefxn = get_fa_scorefxn()
 		relax = pyrosetta.rosetta.protocols.relax.FastRelax(scorefxn)
 		IHM = pyrosetta.rosetta.protocols.rbsegment_relax.IdealizeHelicesMover()
-		pose.dump_pdb('temp1.pdb')
-		structure = Bio.PDB.PDBParser().get_structure('temp1', 'temp1.pdb')
-		dssp = Bio.PDB.DSSP(structure[0], 'temp1.pdb', acc_array='Wilke')
-		ppb = Bio.PDB.Polypeptide.PPBuilder()
-		chain = ppb.build_peptides(structure, aa_only=False)[0]
-		SS = []
-		for aa in dssp:
-			if aa[2] == 'G' or aa[2] == 'H' or aa[2] == 'I': SSname = 'H'
-			elif aa[2] == 'B' or aa[2] == 'E': SSname = 'S'
-			else: SSname = 'L'
-			SS.append(SSname)
 		# Adjust End
 		try:
-			for i in enumerate(reversed(SS)):
-				if i[1] != 'L':
-					num = i[0]
-					break
-			for model in structure:
-				for chain in model:
-					for i in reversed(range(150-num, 150+1)):
-						chain.detach_child((' ', i, ' '))
-			io = Bio.PDB.PDBIO()
-			io.set_structure(structure)
-			io.save('temp2.pdb')
-			os.remove('temp1.pdb')
-			pose = pose_from_pdb('temp2.pdb')
+			TrimLoop(pose, 1)
 			relax.apply(pose)
 			IHM.apply(pose)
-			pose.dump_pdb('backbone.pdb')
-			os.remove('temp2.pdb')
 		except:
-			os.remove('temp1.pdb')
-	def Filter(TheFile):
+			return(None)
+		if filename:
+			pose.dump_pdb(filename)
+		return(pose)
+	def Filter(TheFile, components=False):
 		'''
-		A function that filters protein structures
+		A function that filters protein structures, with components=True also returns the
+		reasons it failed, its measurements, and the CPU seconds spent in DSSP. TheFile is
+		a .pdb filename or a pose, which is measured in memory
 		'''
-		structure = Bio.PDB.PDBParser().get_structure('{}'.format(TheFile), TheFile)
-		dssp = Bio.PDB.DSSP(structure[0], TheFile, acc_array='Wilke')
-		ppb = Bio.PDB.Polypeptide.PPBuilder()
-		chain = ppb.build_peptides(structure, aa_only=False)[0]
+		reasons = []
+		tic = time.process_time()
+		if isinstance(TheFile, str):
+			dssp = DSSP(TheFile)
+			toc = time.process_time() - tic
+			structure = Bio.PDB.PDBParser().get_structure('{}'.format(TheFile), TheFile)
+			ppb = Bio.PDB.Polypeptide.PPBuilder()
+			chain = ppb.build_peptides(structure, aa_only=False)[0]
+			CA = [residue['CA'].get_coord() for residue in chain]
+		else:
+			dssp = PoseDSSP(TheFile)
+			toc = time.process_time() - tic
+			CA = [TheFile.residue(r).xyz('CA') for r in range(1, TheFile.size()+1)]
+			CA = [np.array((v.x, v.y, v.z)) for v in CA]
 		choice = True
 		SS = []
 		CST = []
 		SASA = []
 		for aa in dssp:
-			if aa[2] == 'I': choice = False
+			if aa[2] == 'I' and choice:
+				choice = False
+				reasons.append('Pi helix')
 			if aa[2] == 'G' or aa[2] == 'H' or aa[2] == 'I': SSname = 'H'
 			elif aa[2] == 'B' or aa[2] == 'E': SSname = 'S'
 			else: SSname = 'L'
 			SS.append(SSname)
+			if aa[3] == 'NA':
+				raise ValueError('DSSP has no accessibility for residue {} ({})'.format(aa[0], aa[1]))
 			if   aa[1]=='A' : sasa=129*(aa[3])
 			elif aa[1]=='V' : sasa=174*(aa[3])
 			elif aa[1]=='I' : sasa=197*(aa[3])
@@ -1506,11 +1723,7 @@ def LSTM(choice):
 			elif 25 < sasa < 40 and SSname == 'L':                    layer = 'B'
 			elif sasa >= 40 and SSname == 'L':                        layer = 'S'
 			SASA.append(layer)
-			residue1 = chain[0]
-			residue2 = chain[aa[0]-1]
-			atom1 = residue1['CA']
-			atom2 = residue2['CA']
-			CST.append(atom1-atom2)
+			CST.append(np.linalg.norm(CA[0] - CA[aa[0]-1]))
 		# Secondary structure filter
 		Hs = [w.replace('L', '.') for w in SS]
 		Hs = [w.replace('S', '.') for w in Hs]
@@ -1530,15 +1743,25 @@ def LSTM(choice):
 		H = SS.count('H')
 		S = SS.count('S')
 		L = SS.count('L')
-		if len(SS) < 80: choice = False
-		if H+S < L:      choice = False
+		if len(SS) < 80:
+			choice = False
+			reasons.append('Size')
+		if H+S < L:
+			choice = False
+			reasons.append('Loops')
 		Surface = SASA.count('S')
 		Boundary = SASA.count('B')
 		Core = SASA.count('C')
 		percent = (Core*100)/(Surface+Boundary+Core)
-		if percent < 20: choice = False
+		if percent < 20:
+			choice = False
+			reasons.append('Core')
 		MaxCST = max(CST)
-		if MaxCST > 88:  choice = False
+		if MaxCST > 88:
+			choice = False
+			reasons.append('CST')
+		if components:
+			return(choice, {'reasons': reasons, 'size': len(SS), 'H': H, 'S': S, 'L': L, 'core': percent, 'cst': float(MaxCST), 'dssp': toc})
 		return(choice)
 	class ModelConfig(object):
 		def __init__(self):
@@ -1551,30 +1774,60 @@ def LSTM(choice):
 			self.dropout_rate = 0.5		# Dropout rate
 			self.learning_rate = 0.001	# Learning rate
 	def load_training_data():
-		''' Returns a matrix of training data '''
+		''' Returns a matrix of training data, from a binary dataset directory or a .csv file, the rows are normalised by the DataLoader as they are streamed '''
+		if os.path.isdir(TRAIN_DATA_FILE):
+			return(Shards(TRAIN_DATA_FILE)[:])
 		data = pd.read_csv(TRAIN_DATA_FILE, index_col=0, sep=';')
 		data.drop(data.columns[0], axis=1, inplace=True)	# Remove names
-		data = data.div(data.abs().max(axis=1), axis=0)		# Normalize by row
 		return data.values
 	class DataLoader(object):
-		def __init__(self, data, batch_size=128, num_steps=1):
+		'''
+		Streams the whole dataset in shuffled batches of row normalised sequences, every batch
+		is walked in truncated BPTT windows of num_steps with the state carried from window to
+		window. A background thread prepares the next windows while the current step runs
+		'''
+		def __init__(self, data, batch_size=128, num_steps=1, shuffle=True, prefetch=8):
+			self.data = data
 			self.batch_size = batch_size
 			self.n_data, self.seq_len = data.shape
-			self._data = data[:self.batch_size, :]
 			self.num_steps = num_steps
-			self._data = self._data.reshape((self.batch_size, self.seq_len, 1))
-			self._reset_pointer()
-		def _reset_pointer(self):
-			self.pointer = 0
-		def reset(self):
-			self._reset_pointer()
-		def has_next(self):
-			return self.pointer + self.num_steps < self.seq_len - 1
-		def next_batch(self):
-			batch_xs = self._data[:, self.pointer:self.pointer + self.num_steps, :]
-			batch_ys = self._data[:, self.pointer + 1:self.pointer + self.num_steps + 1, :]
-			self.pointer = self.pointer + self.num_steps
-			return batch_xs, batch_ys
+			self.shuffle = shuffle
+			self.prefetch = prefetch
+			self.n_batches = self.n_data // self.batch_size
+			assert self.n_batches > 0, 'The dataset is smaller than one batch'
+		def batches(self):
+			''' One epoch of (batch_xs, batch_ys, first) windows, first marks the first window of a new batch where the state is reset '''
+			order = np.random.permutation(self.n_data) if self.shuffle else np.arange(self.n_data)
+			for b in range(self.n_batches):
+				batch = self.data[order[b * self.batch_size:(b + 1) * self.batch_size]].astype(np.float32)
+				batch = batch / np.abs(batch).max(axis=1, keepdims=True)	# Normalize by row
+				batch = batch.reshape((self.batch_size, self.seq_len, 1))
+				pointer = 0
+				while pointer + self.num_steps < self.seq_len - 1:
+					batch_xs = batch[:, pointer:pointer + self.num_steps, :]
+					batch_ys = batch[:, pointer + 1:pointer + self.num_steps + 1, :]
+					yield(batch_xs, batch_ys, pointer == 0)
+					pointer += self.num_steps
+		def __iter__(self):
+			''' Iterate over one epoch of windows while they are prefetched in a background thread '''
+			windows = queue.Queue(self.prefetch)
+			def fill():
+				try:
+					for window in self.batches():
+						windows.put(window)
+				except Exception as TheError:
+					windows.put(TheError)
+				windows.put(None)
+			thread = threading.Thread(target=fill, daemon=True)
+			thread.start()
+			while True:
+				window = windows.get()
+				if window is None:
+					break
+				if isinstance(window, Exception):
+					raise window
+				yield(window)
+			thread.join()
 	def reset_session_and_model():
 		''' Resets the TensorFlow default graph and session '''
 		tf.reset_default_graph()
@@ -1627,13 +1880,10 @@ def LSTM(choice):
 				self.train_op = self.optimizer.minimize(self.loss)
 		def train_for_epoch(self, sess, data_loader):
 			assert self.is_training, 'Must be training model'
-			cur_state = sess.run(self.init_state)
-			data_loader.reset()
+			zero_state = sess.run(self.init_state)
 			epoch_loss = []
-			while data_loader.has_next():
-				batch_xs, batch_ys = data_loader.next_batch()
-				batch_xs = batch_xs.reshape((self.batch_size, self.num_steps, 1))
-				batch_ys = batch_ys.reshape((self.batch_size, self.num_steps, 1))
+			for batch_xs, batch_ys, first in data_loader:
+				if first: cur_state = zero_state
 				_, batch_loss_, new_state_ = sess.run([self.train_op, self.loss, self.final_state], feed_dict={self.x_holder: batch_xs, self.y_holder: batch_ys, self.init_state: cur_state,})
 				cur_state = new_state_
 				epoch_loss.append(batch_loss_)
@@ -1651,9 +1901,52 @@ def LSTM(choice):
 				preds.append(new_pred_)
 				cur_state = new_state_
 			return preds[1:]
+	class Sampler(object):
+		''' Restores the model once into a persistent session and samples batches of angle sequences, every row with its own mixture draws '''
+		def __init__(self, batch_size=BATCH_SIZE, ckpt_path='./weights/weights.ckpt'):
+			config = ModelConfig()
+			config.batch_size = batch_size
+			config.num_steps = 1
+			self.graph = tf.Graph()
+			with self.graph.as_default():
+				self.model = MDNModel(config, True)
+				self.model.is_training = False
+				self.sess = tf.Session(graph=self.graph)
+				self.sess.run(tf.global_variables_initializer())
+				tf.train.Saver().restore(self.sess, ckpt_path)
+			self.batch_size = batch_size
+		def sample(self, seq_len=SEQ_LEN):
+			''' Returns a (batch_size, seq_len) array of normalised angles '''
+			model = self.model
+			cur_state = self.sess.run(model.init_state)
+			preds = np.empty((self.batch_size, seq_len))
+			x = np.random.uniform(size=self.batch_size)
+			for step in range(seq_len):
+				batch_xs = x.reshape((self.batch_size, 1, 1))
+				mu_, sigma_, pi_, cur_state = self.sess.run([model.mu, model.sigma, model.pi, model.final_state], feed_dict={model.x_holder: batch_xs, model.init_state: cur_state})
+				x = MDN.draw(mu_, sigma_, pi_)
+				preds[:, step] = x
+			return(preds)
+		def angles(self):
+			''' Returns a (batch_size, MAX_ATOMS, 2) array of phi/psi angles in degrees '''
+			return(self.sample(SEQ_LEN).reshape((self.batch_size, MAX_ATOMS, 2)) * 360.0)
+		def close(self):
+			self.sess.close()
+	def Export(ckpt_path='./weights/weights.ckpt', filename=WEIGHTS):
+		''' Dump the trained LSTM/MDN weights of a checkpoint into a .npz file for the NumPy sampler '''
+		weights = {}
+		for name, shape in tf.train.list_variables(ckpt_path):
+			cell = re.search(r'^mdn_model/.*cell_(\d+)/lstm_cell/(kernel|bias)$', name)
+			if cell:
+				weights['{}_{}'.format(cell.group(2), cell.group(1))] = tf.train.load_variable(ckpt_path, name)
+			elif name in ('mdn_model/w1', 'mdn_model/b1', 'mdn_model/w2', 'mdn_model/b2'):
+				weights[name.split('/')[-1]] = tf.train.load_variable(ckpt_path, name)
+		np.savez(filename, **weights)
+		print('\x1b[32m[+] Exported the weights to {}\x1b[0m'.format(filename))
 	def Run(trn_prd):
 		train_config = ModelConfig()
 		train_config.learning_rate = 0.0003
+		train_config.batch_size = 64
 		test_config = ModelConfig()
 		test_config.batch_size = 1
 		test_config.num_steps = 1
@@ -1669,63 +1962,66 @@ def LSTM(choice):
 				sess.run(tf.global_variables_initializer())
 				saver = tf.train.Saver(max_to_keep=0)
 				for idx in range(NUM_EPOCHS):
+					tic = time.time()
 					epoch_loss = train_model.train_for_epoch(sess, loader)
-					print('Epoch: {}\tLoss: {}'.format(idx+1, epoch_loss))
+					speed = loader.n_batches * loader.batch_size / (time.time() - tic)
+					print('Epoch: {}\tLoss: {}\tSequences/s: {:.1f}'.format(idx+1, epoch_loss, speed))
 				saver.save(sess, f'./weights/weights.ckpt')
 			true_data = data[0]
-		# Predict
-		elif trn_prd == 'predict':
-			ckpt_path = f'./weights/weights.ckpt'
-			for structure in range(N_STRUCTURES):
-				reset_session_and_model()
-				with tf.Session() as sess:
-					test_model = MDNModel(test_config, True)
-					test_model.is_training = False
-					sess.run(tf.global_variables_initializer())
-					saver = tf.train.Saver()
-					saver.restore(sess, ckpt_path)
-					fake_data = test_model.predict(sess, SEQ_LEN)
-				np.savetxt(f'prediction.txt', np.array(fake_data).reshape((MAX_ATOMS, 2)), delimiter=';')
-	if choice == 'train': Run(choice)
+	if choice == 'train':
+		import tensorflow as tf
+		Run(choice)
+		Export()
+	elif choice == 'export':
+		import tensorflow as tf
+		Export()
+	elif choice == 'sampler':
+		if os.path.exists(WEIGHTS): return(MDN(WEIGHTS, BATCH_SIZE))
+		import tensorflow as tf
+		return(Sampler())
 	elif choice == 'predict':
-		with open('counts', 'a') as f:
-			count = 0
-			while True:
-				count += 1
-				Run(choice)
-				newfile = open('prediction.txt', 'r')
-				phiout = []
-				psiout = []
-				for line in newfile:
-					line = line.strip().split(';')
-					phiout.append(float(line[0]))
-					psiout.append(float(line[1]))
-				phiout = [x*360.0 for x in phiout]
-				psiout = [x*360.0 for x in psiout]
-				data = (phiout, psiout)
-				FoldPDB_PS(data)
-				os.remove('prediction.txt')
-#				if Filter('backbone.pdb'):
-#					print('success {}'.format(count))
-#					f.write('success {}\n'.format(str(count)))
-#					break
-#				else:
-#					os.remove('backbone.pdb')
-#					print('fail {}'.format(count))
-				try:
-					assert os.path.exists('backbone.pdb')
-					if Filter('backbone.pdb'):
-						print('success {}'.format(count))
-						f.write('success {}\n'.format(str(count)))
-						break
-					else:
-						os.remove('backbone.pdb')
-						print('fail {}'.format(count))
-				except:
-						os.remove('backbone.pdb')
-						print('fail {}'.format(count))
+		own = sampler is None
+		if own: sampler = LSTM('sampler')
+		funnel = Funnel()
+		try:
+			with open('counts', 'a') as f:
+				count = 0
+				while True:
+					tic = time.process_time()
+					batch = sampler.angles()
+					sample = (time.process_time() - tic) / len(batch)
+					for angles in batch:
+						count += 1
+						data = (angles[:, 0], angles[:, 1])
+						seconds = {'sample': sample}
+						tic = time.process_time()
+						pose = FoldPDB_PS(data, filename=None)
+						seconds['fold'] = time.process_time() - tic
+						if pose is None:
+							funnel.write('fold', 'Fold failed', seconds)
+							print('fail {}'.format(count))
+							continue
+						tic = time.process_time()
+						try:
+							passed, components = Filter(pose, components=True)
+						except Exception as TheError:
+							passed, components = False, {'reasons': [repr(TheError)], 'dssp': 0}
+						seconds['dssp'] = components.pop('dssp')
+						seconds['filter'] = time.process_time() - tic - seconds['dssp']
+						if passed:
+							pose.dump_pdb('backbone.pdb')
+							funnel.write('accepted', None, seconds, components)
+							print('success {}'.format(count))
+							f.write('success {}\n'.format(str(count)))
+							return
+						else:
+							funnel.write('filter', ', '.join(components.pop('reasons')), seconds, components)
+							print('fail {}'.format(count))
+		finally:
+			if own: sampler.close()
 
-def FoldPDB_PSC(filename, order):
+def FoldPDB_PSC(filename, order, output='backbone.pdb'):
+	''' Fold a structure from a phi/psi/constraint prediction file in memory, returns the pose and only exports it if an output filename is given '''
 	newfile = open(filename, 'r')
 	phiout = []
 	psiout = []
@@ -1752,32 +2048,86 @@ def FoldPDB_PSC(filename, order):
 		pose.set_phi(count, float(P))
 		pose.set_psi(count, float(S))
 		count += 1
-	atom = 1
-	for cst in CST:
-		line = 'AtomPair CA 1 CA '+str(atom)+' GAUSSIANFUNC '+str(cst)+' 1.0\n'
-		thefile = open('constraints.cst', 'a')
-		thefile.write(line)
-		thefile.close()
-		atom += 1
-	constraints = pyrosetta.rosetta.protocols.constraint_movers.ConstraintSetMover()
-	constraints.constraint_file('constraints.cst')
-	constraints.add_constraints(True)
-	constraints.apply(pose)
+	AtomPairs(pose, [1] * (size-1), range(2, size+1), CST[1:])
 	scorefxn = get_fa_scorefxn()
 	relaxC = pyrosetta.rosetta.protocols.relax.FastRelax()
 	relaxC.set_scorefxn(scorefxn)
 	relaxC.constrain_relax_to_start_coords(True)
 	relaxC.constrain_coords(True)
 	if order == True: relaxC.apply(pose)
-	pose.dump_pdb('backbone.pdb')
-	os.remove('constraints.cst')
+	if output:
+		pose.dump_pdb(output)
+	return(pose)
 			
+class Daemon(socketserver.StreamRequestHandler):
+	'''
+	The request handler of the daemon mode, PyRosetta and TensorFlow are only set up once
+	when the daemon starts. Every request is a JSON line, every result is streamed back as
+	a JSON line as soon as it is ready and a request ends with a {"done": true} (or an
+	{"error": ...}) line:
+	{"request": "predict", "filename": "backbone.pdb"} generate a backbone
+	{"request": "design", "filename": "backbone.pdb", "output": "structure.pdb"} design it
+	'''
+	def handle(self):
+		for line in self.rfile:
+			try:
+				message = json.loads(line)
+				requests = {'predict': self.predict, 'design': self.design}
+				request = requests[message.pop('request')]
+				for result in request(**message):
+					self.send(result)
+				self.send({'done': True})
+			except Exception as TheError:
+				self.send({'error': repr(TheError)})
+	def send(self, result):
+		''' Stream one result line back to the client '''
+		self.wfile.write((json.dumps(result) + '\n').encode())
+		self.wfile.flush()
+	def predict(self, filename='backbone.pdb'):
+		''' Generate a backbone that passes the filter '''
+		LSTM('predict', self.server.sampler)
+		filename = os.path.abspath(filename)
+		os.replace('backbone.pdb', filename)
+		yield({'structure': filename})
+	def design(self, filename='backbone.pdb', output='structure.pdb'):
+		''' Design the sequence of a backbone and keep the lowest scoring decoy '''
+		RD = RosettaDesign(filename)
+		RD.flxbb()
+		RD.choose()
+		del RD
+		output = os.path.abspath(output)
+		os.replace('structure.pdb', output)
+		yield({'structure': output})
+
+def Serve(filename, handler, **resources):
+	''' Run a daemon on a Unix socket, connections are handled one at a time by the handler with the preloaded resources as attributes of the server '''
+	if os.path.exists(filename):
+		os.remove(filename)
+	server = socketserver.UnixStreamServer(filename, handler)
+	for name, value in resources.items():
+		setattr(server, name, value)
+	print('\x1b[32m[+] Listening on {}\x1b[0m'.format(filename))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		os.remove(filename)
+		DSSP.evict()
+
 def main():
 	if args.dataset:
-		D = Dataset()
-		D.build
+		D = Dataset(args.workers)
+		D.build()
 	elif args.train:
 		LSTM('train')
+	elif args.export:
+		LSTM('export')
+	elif args.summary:
+		Funnel(args.summary).summary()
+	elif args.daemon:
+		Serve(args.daemon, Daemon, sampler=LSTM('sampler'))
 	elif args.fragments:
 		print('\x1b[32m[+] Generating a structure\x1b[0m')
 		LSTM('predict')
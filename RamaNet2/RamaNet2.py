@@ -20,22 +20,33 @@ import os
 import re
 import sys
 import h5py
+import json
 import time
+import queue
 import glob
 import math
 import tqdm
 import gzip
+import struct
+import shutil
+import hashlib
+import sqlite3
 import keras
 import sklearn
 import Bio.PDB
 import datetime
 import warnings
 import argparse
+import socketserver
+import threading
+import collections
+import concurrent.futures
 import numpy as np
 import pandas as pd
 import tensorflow as tf
 from pyrosetta import *
 from pyrosetta.toolbox import *
+from features import ContactMap, ContactWriter, Contacts, Prefilter
 from keras.optimizers import Adam
 from keras.models import Sequential, Model
 from keras.losses import BinaryCrossentropy
@@ -61,31 +72,528 @@ parser.add_argument('-ds', '--DatasetSeq' , nargs='+', metavar='', help='Build t
 parser.add_argument('-tb', '--TrainBack'  , action='store_true'  , help='Train the Backbone neural network')
 parser.add_argument('-tf', '--TrainFrag'  , action='store_true'  , help='Train the Fragment neural network')
 parser.add_argument('-ts', '--TrainSeq'   , action='store_true'  , help='Train the Sequence neural network')
+parser.add_argument('-rb', '--RefreshBack', action='store_true'  , help='Incrementally refresh the Backbone dataset after the PDB changed')
+parser.add_argument('-D',  '--daemon'     , metavar='', help='Keep the generator and PyRosetta loaded and serve requests on a Unix socket')
+parser.add_argument('-s',  '--summary'    , nargs='?', const='funnel.jsonl', metavar='', help='Summarise the acceptance funnel of generated backbones')
+parser.add_argument('-w',  '--workers'    , type=int, default=os.cpu_count(), metavar='', help='Number of worker processes used to build the dataset or fold structures')
 
 args = parser.parse_args()
 
+class DSSPCache():
+	'''
+	A persistent on-disk cache of DSSP results keyed by a hash of each
+	file's content, so the dssp binary is only run once for every unique
+	structure. Each entry stores the DSSP index, amino acid, secondary
+	structure, relative accessibility, and phi/psi angles of every residue
+	in a compact binary form (16 bytes per residue). Workers only add
+	entries, the parent process calls evict() once its work is done to
+	remove the least recently used entries if the cache grew beyond its cap
+	'''
+	def __init__(self, directory='~/.cache/RamaNet/dssp', cap=2**30):
+		self.directory = os.path.expanduser(directory)
+		self.cap = cap
+	def __call__(self, filename):
+		'''
+		Return the DSSP of a file as a list of (index, aa, ss, acc, phi,
+		psi) tuples, indexed the same way as the items of Bio.PDB.DSSP, a
+		residue without an accessibility (a non-standard amino acid) has an
+		acc of 'NA' like in Bio.PDB.DSSP
+		'''
+		with open(filename, 'rb') as f:
+			key = hashlib.sha1(f.read() + b'Wilke').hexdigest()
+		path = os.path.join(self.directory, key[:2], key)
+		try:
+			with open(path, 'rb') as f:
+				data = f.read()
+			os.utime(path)
+			return(self.decode(data))
+		except (FileNotFoundError, struct.error, ValueError):
+			pass
+		structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', filename)
+		dssp = Bio.PDB.DSSP(structure[0], filename, acc_array='Wilke')
+		data = self.encode([residue[:6] for residue in dssp])
+		self.store(path, data)
+		return(self.decode(data))
+	def encode(self, residues):
+		''' Pack a list of DSSP residue tuples into bytes '''
+		index = np.array([r[0] for r in residues], dtype=np.int32)
+		aa = ''.join(r[1] for r in residues).encode()
+		ss = ''.join(r[2] for r in residues).encode()
+		# NaN marks an 'NA' accessibility
+		acc = [r[3] if r[3] != 'NA' else np.nan for r in residues]
+		acc = np.array(acc, dtype=np.float16)
+		phi = np.array([r[4] for r in residues], dtype=np.float32)
+		psi = np.array([r[5] for r in residues], dtype=np.float32)
+		header = struct.pack('<I', len(residues))
+		return(header + index.tobytes() + aa + ss + acc.tobytes()\
+		+ phi.tobytes() + psi.tobytes())
+	def decode(self, data):
+		''' Unpack the bytes of a cache entry into DSSP residue tuples '''
+		n = struct.unpack_from('<I', data)[0]
+		if len(data) != 4 + 16*n:
+			raise ValueError('Corrupt DSSP cache entry')
+		bounds = np.cumsum([4, 4*n, n, n, 2*n, 4*n, 4*n])
+		index, aa, ss, acc, phi, psi = [data[a:b] for a, b\
+		in zip(bounds[:-1], bounds[1:])]
+		index = np.frombuffer(index, dtype=np.int32).tolist()
+		acc = np.frombuffer(acc, dtype=np.float16).tolist()
+		acc = ['NA' if np.isnan(a) else a for a in acc]
+		phi = np.frombuffer(phi, dtype=np.float32).tolist()
+		psi = np.frombuffer(psi, dtype=np.float32).tolist()
+		return(list(zip(index, aa.decode(), ss.decode(), acc, phi, psi)))
+	def store(self, path, data):
+		''' Atomically write a cache entry '''
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		temp = '{}.{}'.format(path, os.getpid())
+		with open(temp, 'wb') as f:
+			f.write(data)
+		os.replace(temp, path)
+	def entries(self):
+		''' All the entries currently in the cache '''
+		for sub in os.scandir(self.directory):
+			if sub.is_dir():
+				for entry in os.scandir(sub.path):
+					if '.' not in entry.name:
+						yield(entry)
+	def evict(self):
+		'''
+		If the cache is over its cap remove the oldest entries until under
+		90% of the cap, this stats every entry so only the parent calls it
+		'''
+		if not os.path.isdir(self.directory): return
+		entries = [(e.stat().st_mtime, e.stat().st_size, e.path)\
+		for e in self.entries()]
+		size = sum(e[1] for e in entries)
+		if size <= self.cap: return
+		for mtime, length, path in sorted(entries):
+			if size <= 0.9 * self.cap:
+				break
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+			size -= length
+
+DSSP = DSSPCache()
+
+def RadiusOfGyration(coord, element):
+	'''
+	Calculate the mass weighted radius of gyration of an (N, 3) array of atom
+	coordinates given an array of the atoms' element symbols. A stacked
+	(B, N, 3) batch of structures returns an array of B values, unknown
+	elements (or padding) are given a mass of 0
+	'''
+	Mass = {'C':12.0107, 'O':15.9994, 'N':14.0067, 'S':32.0650, 'H':1.00794}
+	coord = np.asarray(coord, dtype=np.float64)
+	element = np.asarray(element)
+	mass = np.zeros(element.shape)
+	for symbol, value in Mass.items(): mass[element == symbol] = value
+	mass = np.broadcast_to(mass, coord.shape[:-1])
+	tmass = mass.sum(axis=-1)
+	center = np.einsum('...n,...ni->...i', mass, coord) / tmass[..., None]
+	deviation = coord - center[..., None, :]
+	rg = np.einsum('...n,...ni,...ni->...', mass, deviation, deviation)
+	rg = np.sqrt(rg / tmass)
+	return(rg)
+
+class Sampler():
+	'''
+	Streaming batch sampler of an HDF5 tensor, a background thread reads
+	random batches of rows (sorted, without replacement within a batch)
+	lazily from disk and keeps up to prefetch batches ready in a queue, so
+	memory stays flat whatever the size of the dataset
+	'''
+	def __init__(self, filename, batch=64, dataset='default', prefetch=4):
+		self.data = h5py.File(filename, 'r')
+		self.dataset = self.data[dataset]
+		self.batch = min(batch, len(self.dataset))
+		self.shape = self.dataset.shape[1:] + (1,)
+		self.queue = queue.Queue(prefetch)
+		self.stop = threading.Event()
+		self.thread = threading.Thread(target=self.fill, daemon=True)
+		self.thread.start()
+	def __enter__(self):
+		return(self)
+	def __exit__(self, *exception):
+		self.close()
+	def __iter__(self):
+		return(self)
+	def __next__(self):
+		batch = self.queue.get()
+		if isinstance(batch, Exception): raise batch
+		return(batch)
+	def fill(self):
+		''' Read random batches into the queue until the sampler is closed '''
+		try:
+			while not self.stop.is_set():
+				index = np.sort(np.random.choice(len(self.dataset),
+										self.batch, replace=False))
+				batch = self.dataset[index].reshape((-1,) + self.shape)
+				while not self.stop.is_set():
+					try: self.queue.put(batch, timeout=0.1)
+					except queue.Full: continue
+					break
+		except Exception as TheError: self.queue.put(TheError)
+	def close(self):
+		self.stop.set()
+		self.thread.join()
+		self.data.close()
+
+class Journal():
+	'''
+	An SQLite journal of the dataset build, records the state of every file
+	at every stage (running, done, failed, or rejected with a reason) and
+	which whole stages are finished, so an interrupted build resumes where
+	it stopped. Rejected files stay on disk and every later stage skips them
+	until they are purged. Only the parent process writes to the journal,
+	a chunk of files at a time
+	'''
+	def __init__(self, filename='journal.db'):
+		self.filename = filename
+		connection = self.connect()
+		with connection:
+			connection.execute('CREATE TABLE IF NOT EXISTS files (stage TEXT,'
+			' file TEXT, state TEXT, reason TEXT, PRIMARY KEY (stage, file))')
+			connection.execute('CREATE TABLE IF NOT EXISTS stages'
+			' (stage TEXT PRIMARY KEY)')
+			connection.execute('CREATE TABLE IF NOT EXISTS manifest'
+			' (entry TEXT PRIMARY KEY, mtime REAL, size INTEGER)')
+	def __getstate__(self):
+		return({'filename': self.filename})
+	def connect(self):
+		''' Return this process's connection to the journal '''
+		if getattr(self, 'pid', None) != os.getpid():
+			self.connection = sqlite3.connect(self.filename, timeout=600)
+			self.connection.execute('PRAGMA journal_mode=WAL')
+			self.pid = os.getpid()
+		return(self.connection)
+	def mark(self, stage, File, state, reason=None):
+		''' Record the state of a file at a stage '''
+		with self.connect() as connection:
+			connection.execute('INSERT OR REPLACE INTO files VALUES'
+			' (?, ?, ?, ?)', (stage, File, state, reason))
+	def start(self, stage, Files):
+		''' Mark a chunk of files as running in one transaction '''
+		with self.connect() as connection:
+			connection.executemany('INSERT OR REPLACE INTO files VALUES'
+			' (?, ?, \'running\', NULL)', [(stage, File) for File in Files])
+	def settle(self, stage, results):
+		'''
+		Record the final (File, state, reason) of a chunk of processed files in
+		one transaction, unless they were rejected
+		'''
+		with self.connect() as connection:
+			connection.executemany('UPDATE files SET state = ?, reason = ?'
+			' WHERE stage = ? AND file = ? AND state IN (\'running\', \'ran\')',
+			[(state, reason, stage, File) for File, state, reason in results])
+	def reject(self, stage, File, reason):
+		''' Reject a file, every later stage skips it '''
+		self.mark(stage, File, 'rejected', reason)
+	def rejected(self):
+		''' Return the set of all rejected files '''
+		rows = self.connect().execute('SELECT DISTINCT file FROM files'
+		' WHERE state = \'rejected\'')
+		return({File for File, in rows})
+	def states(self, stage):
+		''' Return the state of every file the stage has seen '''
+		rows = self.connect().execute('SELECT file, state FROM files'
+		' WHERE stage = ?', (stage,))
+		return(dict(rows))
+	def finished(self, stage):
+		''' Return whether a whole stage is finished '''
+		rows = self.connect().execute('SELECT 1 FROM stages WHERE stage = ?',
+		(stage,))
+		return(rows.fetchone() is not None)
+	def finish(self, stage):
+		''' Record a whole stage as finished '''
+		with self.connect() as connection:
+			connection.execute('INSERT OR IGNORE INTO stages VALUES (?)',
+			(stage,))
+	def reopen(self, stage):
+		''' Forget that a stage finished and its files' states, so it runs again '''
+		with self.connect() as connection:
+			connection.execute('DELETE FROM stages WHERE stage = ?', (stage,))
+			connection.execute('DELETE FROM files WHERE stage = ?', (stage,))
+	def manifest(self):
+		''' Return the (mtime, size) of every processed PDB entry '''
+		rows = self.connect().execute('SELECT entry, mtime, size'
+		' FROM manifest')
+		return({entry: (mtime, size) for entry, mtime, size in rows})
+	def record(self, entries, withdrawn=()):
+		''' Record processed {entry: (mtime, size)} and withdrawn entries '''
+		with self.connect() as connection:
+			connection.executemany('INSERT OR REPLACE INTO manifest VALUES'
+			' (?, ?, ?)', [(entry, mtime, size) for entry, (mtime, size)\
+			in entries.items()])
+			connection.executemany('DELETE FROM manifest WHERE entry = ?',
+			[(entry,) for entry in withdrawn])
+	def forget(self, entries):
+		''' Delete the journaled states of every file of the given entries '''
+		with self.connect() as connection:
+			for entry in entries:
+				for pattern in ('{}\\_%', 'Clean-{}\\_%'):
+					connection.execute('DELETE FROM files WHERE file LIKE ?'
+					' ESCAPE \'\\\'', (pattern.format(entry),))
+
+def Job(job):
+	''' Run a stage function on one file inside a Dataset worker process '''
+	function, TheFile, arguments = job
+	try: return((TheFile, function(TheFile, *arguments), None))
+	except Exception as TheError: return((TheFile, None, str(TheError)))
+
+def Jobs(jobs):
+	''' Run a chunk of jobs inside a Dataset worker process '''
+	return([Job(job) for job in jobs])
+
 class Dataset():
 	''' Build a machine learning dataset of protein structures '''
+	def __init__(self, workers=1, journal='journal.db'):
+		self.workers = workers
+		self.journal = Journal(journal)
+	def Map(self, function, directory, *arguments, files=None, stage=None):
+		'''
+		Run a per-file stage function on every file in a directory (or only
+		on the given list of its files) that the journal has not rejected,
+		across a pool of self.workers processes (in this process if workers
+		is 1). Yields (File, result, error) in sorted file order so the
+		merged output of every stage is deterministic, the progress bar and
+		the failure count are aggregated across all the workers. If a stage
+		name is given the files the stage already settled are skipped, and
+		every chunk of files is journaled as running when it is submitted
+		and settled when it returns, one transaction each. The files left
+		running by a crashed process (a segmentation fault) are retried in
+		chunks of one, and if they crash again one at a time in a process of
+		their own so that the culprit gets rejected
+		'''
+		if files is None: files = os.listdir(directory)
+		rejected = self.journal.rejected()
+		pdbfilelist = sorted(File for File in files if File not in rejected)
+		strikes = collections.Counter()
+		if stage is not None:
+			states = self.journal.states(stage)
+			pdbfilelist = [File for File in pdbfilelist\
+			if states.get(File) in (None, 'running', 'ran')]
+			# Files left running by a crashed build are isolated right away
+			strikes.update({File: 2 for File in pdbfilelist\
+			if states.get(File) in ('running', 'ran')})
+		total = len(pdbfilelist)
+		failed = 0
+		bar = tqdm.tqdm(total=total)
+		try:
+			while pdbfilelist:
+				for File in [File for File in pdbfilelist if strikes[File] > 1]:
+					job = (function, '{}/{}'.format(directory, File), arguments)
+					self.journal.start(stage, [File])
+					with concurrent.futures.ProcessPoolExecutor(1) as pool:
+						try:
+							TheFile, result, TheError = \
+							pool.submit(Job, job).result()
+						except concurrent.futures.process.BrokenProcessPool:
+							self.journal.reject(stage, File, 'Crashed')
+							result, TheError = None, 'Crashed'
+					pdbfilelist.remove(File)
+					bar.update(1)
+					if TheError is not None: failed += 1
+					yield(File, result, TheError)
+					if TheError is None: state = 'done'
+					else: state = 'failed'
+					self.journal.settle(stage, [(File, state, TheError)])
+				retry = [File for File in pdbfilelist if strikes[File] == 1]
+				rest = [File for File in pdbfilelist if strikes[File] == 0]
+				size = max(1, min(64, len(rest)//(self.workers*4)))
+				chunks = [[File] for File in retry] +\
+						[rest[n:n+size] for n in range(0, len(rest), size)]
+				handled = set()
+				try:
+					for results in self.Chunks(function, directory, arguments,
+												chunks, stage):
+						settled = []
+						for TheFile, result, TheError in results:
+							File = os.path.basename(TheFile)
+							handled.add(File)
+							bar.update(1)
+							if TheError is not None: failed += 1
+							yield(File, result, TheError)
+							if TheError is None: state = 'done'
+							else: state = 'failed'
+							settled.append((File, state, TheError))
+						if stage is not None: self.journal.settle(stage, settled)
+				except concurrent.futures.process.BrokenProcessPool:
+					if stage is None: raise
+					states = self.journal.states(stage)
+					suspects = [File for File in pdbfilelist\
+					if File not in handled and states.get(File) == 'running']
+					if not suspects: raise
+					strikes.update(suspects)
+					print('\x1b[31m[-] A worker process crashed, retrying the {} '
+					'files it could have been running\x1b[0m'.format(len(suspects)))
+				pdbfilelist = [File for File in pdbfilelist\
+								if File not in handled]
+		finally:
+			bar.close()
+			DSSP.evict()
+		if failed > 0:
+			print('\x1b[31m[-] {} of {} files failed\x1b[0m'\
+			.format(failed, total))
+	def Chunks(self, function, directory, arguments, chunks, stage=None):
+		'''
+		Run chunks of files across the pool (in this process if workers is
+		1), at most two chunks per worker in flight. Every chunk is journaled
+		as running in one transaction when it is submitted, yields the
+		results of every chunk in order
+		'''
+		def jobs(chunk):
+			return([(function, '{}/{}'.format(directory, File), arguments)\
+					for File in chunk])
+		if self.workers == 1:
+			for chunk in chunks:
+				if stage is not None: self.journal.start(stage, chunk)
+				yield(Jobs(jobs(chunk)))
+			return
+		chunks = iter(chunks)
+		pending = collections.deque()
+		with concurrent.futures.ProcessPoolExecutor(self.workers) as pool:
+			while True:
+				while len(pending) < 2 * self.workers:
+					chunk = next(chunks, None)
+					if chunk is None: break
+					if stage is not None: self.journal.start(stage, chunk)
+					pending.append(pool.submit(Jobs, jobs(chunk)))
+				if not pending: return
+				yield(pending.popleft().result())
+	def Stage(self, name, function, *arguments, **keywords):
+		''' Run a whole build stage unless the journal says it finished '''
+		if self.journal.finished(name):
+			print('\x1b[33m[.] Skipping finished stage {}\x1b[0m'.format(name))
+			return
+		function(*arguments, **keywords)
+		self.journal.finish(name)
+	def Purge(self, directory):
+		''' Delete the files the journal rejected from a directory '''
+		rejected = self.journal.rejected()
+		purged = 0
+		for File in os.listdir(directory):
+			if File in rejected:
+				os.remove('{}/{}'.format(directory, File))
+				purged += 1
+		print('\x1b[32m[+] Purged {} rejected structures\x1b[0m'.format(purged))
 	def Database(self, TempDIR, FinalDIR):
 		'''
 		Downloads the entire PDB database from https://www.wwpdb.org/
-		moves all files into one directory, then uncompresses all the files
-		Generates a directory which contains all .PDB structure files
+		and links all files into one directory. The downloaded mirror is
+		kept so that later refreshes only transfer and process the entries
+		that changed (see Refresh), and every entry is recorded in the
+		journal's manifest
 		'''
+		self.Sync(TempDIR)
+		entries = self.Mirror(TempDIR)
+		os.makedirs(FinalDIR, exist_ok=True)
+		print('\x1b[33m[.] Linking files...\x1b[0m')
+		for entry, (location, mtime, size) in tqdm.tqdm(entries.items()):
+			self.Link(location, FinalDIR)
+		self.journal.record({entry: (mtime, size) for entry, (location,
+							mtime, size) in entries.items()})
+	def Sync(self, TempDIR):
+		''' Synchronise a mirror of the PDB database with wwPDB '''
 		print('\x1b[33m[.] Downloading PDB database...\x1b[0m')
 		web = 'rsync.wwpdb.org::ftp/data/structures/divided/pdb/'
 		os.system('rsync -rlpt -q -v -z --delete --port=33444 {} {}'
 		.format(web, TempDIR))
 		print('\x1b[32m[+] Download complete\x1b[0m')
-		os.mkdir(FinalDIR)
-		filelist = os.listdir(TempDIR)
-		print('\x1b[33m[.] Moving files...\x1b[0m')
-		for directories in tqdm.tqdm(filelist):
-			files = os.listdir('{}/{}'.format(TempDIR, directories))
-			for afile in files:
-				location = ('{}/{}/{}'.format(TempDIR, directories, afile))
-				os.rename(location, '{}/{}'.format(FinalDIR, afile))
-		os.system('rm -r ./{}'.format(TempDIR))
+	def Mirror(self, TempDIR):
+		''' Return {entry: (path, mtime, size)} of every file in a mirror '''
+		entries = {}
+		for directories in os.listdir(TempDIR):
+			for afile in os.listdir('{}/{}'.format(TempDIR, directories)):
+				location = '{}/{}/{}'.format(TempDIR, directories, afile)
+				stat = os.stat(location)
+				entries[self.Entry(afile)] = (location, stat.st_mtime,
+												stat.st_size)
+		return(entries)
+	def Link(self, location, directory):
+		''' Hard link a mirrored file into a directory, copy it if needed '''
+		destination = '{}/{}'.format(directory, os.path.basename(location))
+		if os.path.exists(destination): return
+		try: os.link(location, destination)
+		except OSError: shutil.copy2(location, destination)
+	def Entry(self, File):
+		'''
+		The upper case PDB ID of a mirrored pdbXXXX.ent.gz file, an
+		extracted XXXX_A.pdb chain, or a cleaned Clean-XXXX_A.pdb chain
+		'''
+		if File.endswith('.ent.gz'): return(File.split('.')[0][3:].upper())
+		return(File.split('Clean-')[-1].split('_')[0].upper())
+	def Refresh(self, TempDIR='DATABASE', **filters):
+		'''
+		Incrementally refresh the dataset after the PDB changed. The mirror
+		is synchronised and diffed against the journal's manifest by mtime
+		and size, the structures and dataset_PS.csv/dataset_CM.hdf5 rows of
+		withdrawn and changed entries are removed, and only the new and
+		changed entries go through Extract, the filters (the same ones as
+		build() by default), Renumber, Clean, and DatasetPSCM, whose rows
+		are appended to the existing datasets. The stages downstream of the
+		datasets are then run again: the PS+CM.hdf5 tensor is re-vectorised
+		and the prefilter.npz calibration is deleted so it is recalibrated
+		'''
+		if not filters: filters = dict(NonProtein=True, Size=(80, 150),
+									Break=True, Loops=10, Rg=15)
+		self.Sync(TempDIR)
+		entries = self.Mirror(TempDIR)
+		manifest = self.journal.manifest()
+		changed = [entry for entry, (location, mtime, size)\
+					in entries.items() if manifest.get(entry) != (mtime, size)]
+		withdrawn = [entry for entry in manifest if entry not in entries]
+		stale = set(changed) | set(withdrawn)
+		directory = 'PDBCleaned'
+		print('\x1b[32m[+] {} new or changed entries, {} withdrawn\x1b[0m'\
+		.format(len(changed), len(withdrawn)))
+		os.makedirs(directory, exist_ok=True)
+		for File in os.listdir(directory):
+			if self.Entry(File) in stale:
+				os.remove('{}/{}'.format(directory, File))
+		for filename in ('dataset_PS.csv', 'dataset_CM.hdf5'):
+			if os.path.isfile(filename): self.Prune(filename, stale)
+		self.journal.forget(stale)
+		staging = 'PDBStaging'
+		os.makedirs(staging, exist_ok=True)
+		for entry in changed: self.Link(entries[entry][0], staging)
+		self.Extract(staging)
+		self.Filter(staging, **filters)
+		self.Renumber(staging)
+		self.Purge(staging)
+		self.Clean(staging)
+		files = ['Clean-{}'.format(File) for File in os.listdir(staging)]
+		self.DatasetPSCM(directory, files=files)
+		shutil.rmtree(staging)
+		self.journal.record({entry: entries[entry][1:] for entry in changed},
+							withdrawn)
+		if not stale: return
+		if os.path.isfile('prefilter.npz'): os.remove('prefilter.npz')
+		self.journal.reopen('VectorisePSCM')
+		self.Stage('VectorisePSCM', self.VectorisePSCM)
+	def Prune(self, filename, entries):
+		'''
+		Remove the rows of the given entries from a dataset .csv file or a
+		sparse contact map .hdf5 file
+		'''
+		removed = 0
+		if filename.endswith('.hdf5'):
+			with Contacts(filename) as data:
+				with ContactWriter(filename + '.tmp', data.size) as pruned:
+					for n, ID in enumerate(data.ids):
+						if self.Entry(ID) in entries: removed += 1
+						else: pruned.write(ID, data[n])
+		else:
+			with open(filename, 'r') as data:
+				with open(filename + '.tmp', 'w') as pruned:
+					pruned.write(next(data))
+					for line in data:
+						if self.Entry(line.split(',', 1)[0]) in entries:
+							removed += 1
+						else: pruned.write(line)
+		os.replace(filename + '.tmp', filename)
+		print('\x1b[32m[+] Removed {} rows from {}\x1b[0m'\
+		.format(removed, filename))
 	def Extract(self, directory):
 		'''
 		Extracts all the .ent.gz files and separate all chains and save them
@@ -93,187 +601,182 @@ class Dataset():
 		file of each chain
 		'''
 		print('\x1b[33m[.] Extracting files...\x1b[0m')
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		io = Bio.PDB.PDBIO()
-		os.chdir(directory)
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			try:
-				TheName = TheFile.split('.')[0].split('pdb')[1].upper()
-				InFile = gzip.open(TheFile, 'rt')
-				structure = Bio.PDB.PDBParser(QUIET=True).get_structure(TheName,
-																		InFile)
-				count = 0
-				for chain in structure.get_chains():
-					io.set_structure(chain)
-					io.save(structure.get_id()+'_'+chain.get_id()+'.pdb')
-				os.remove(TheFile)
-			except Exception as TheError:
+		for File in os.listdir(directory):
+			if File.endswith('.tmp'): os.remove('{}/{}'.format(directory, File))
+		done = {File.split('_')[0] for File in os.listdir(directory)\
+				if File.endswith('.pdb')}
+		files = []
+		for File in os.listdir(directory):
+			if not File.endswith('.ent.gz'): continue
+			if File.split('.')[0].split('pdb')[1].upper() in done:
+				os.remove('{}/{}'.format(directory, File))
+			else: files.append(File)
+		for File, result, TheError in self.Map(self.ExtractFile, directory,
+												files=files):
+			if TheError is not None:
 				print('\x1b[31m[-] Failed to extract\t{}\x1b[33m: {}\x1b[0m'
-						.format(TheFile.upper(), str(TheError)))
-				os.remove(TheFile)
-		os.chdir(current)
+						.format(File.upper(), TheError))
+			os.remove('{}/{}'.format(directory, File))
+	def ExtractFile(self, TheFile):
+		'''
+		Stream one .ent.gz file and route the ATOM and HETATM records of its
+		first model (first alternate location only) by chain ID into a .pdb
+		file per chain, each chain's file is only written once the stream is
+		complete so an interrupted run never leaves a partial chain behind
+		'''
+		directory, File = os.path.split(TheFile)
+		TheName = File.split('.')[0].split('pdb')[1].upper()
+		chains = {}
+		with gzip.open(TheFile, 'rt') as InFile:
+			for line in InFile:
+				if line.startswith('ENDMDL'): break
+				if line.startswith(('ATOM  ', 'HETATM')) and line[16] in ' A':
+					chains.setdefault(line[21], []).append(line)
+		for chain, lines in chains.items():
+			filename = '{}/{}_{}.pdb'.format(directory, TheName, chain)
+			with open(filename + '.tmp', 'w') as OutFile:
+				for serial, line in enumerate(lines, 1):
+					OutFile.write('{}{:>5}{}'.format(line[:6], serial, line[11:]))
+				OutFile.write('TER   {:>5}      {}\n'.format(len(lines)+1,
+														lines[-1][17:27]))
+				OutFile.write('END\n')
+			os.replace(filename + '.tmp', filename)
+		return(len(chains))
+	def Inspect(self, TheFile, NonProtein=False, Size=None, Break=False,
+				Loops=None, Rg=None):
+		'''
+		Parse a structure once and evaluate all the enabled filters on it in
+		one pass, DSSP is run at most once and only if a filter needs it.
+		Returns (True, None) if the structure is kept or (False, reason) if
+		it is rejected. Like the separate filters it replaces, a structure
+		whose size cannot be found is kept by the Size filter, while an error
+		in the Loops filter rejects it
+		'''
+		structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X', TheFile)
+		ppb = Bio.PDB.Polypeptide.PPBuilder()
+		Type = ppb.build_peptides(structure, aa_only=True)
+		if NonProtein and Type == []: return(False, 'NonProtein')
+		if Break and len(Type) > 1: return(False, 'Break')
+		if Rg is not None:
+			atoms = list(structure.get_atoms())
+			coord = np.array([atom.get_coord() for atom in atoms])
+			rg = RadiusOfGyration(coord, [atom.element for atom in atoms])
+			if rg <= Rg: return(False, 'Rg')
+		if Size is not None or Loops is not None:
+			try:
+				dssp = DSSP(TheFile)
+				length = [aa[0] for aa in dssp][-1]
+			except Exception:
+				# The Loops filter rejects structures DSSP fails on, the Size
+				# filter keeps them
+				if Loops is not None: raise
+				print('\x1b[31m[-] Error in finding protein size\x1b[0m')
+				return(True, None)
+			if Size is not None:
+				if length >= int(Size[1]) or length <= int(Size[0]):
+					return(False, 'Size')
+			if Loops is not None:
+				SS = ['L' if aa[2] in ('-', 'T', 'S') else '.' for aa in dssp]
+				loops = [item for item in ''.join(SS).split('.') if item]
+				if any(len(item) > Loops for item in loops):
+					return(False, 'Loops')
+		return(True, None)
+	def Filter(self, directory, NonProtein=False, Size=None, Break=False,
+				Loops=None, Rg=None):
+		'''
+		Fused filter engine, rejects the structures that fail any of the
+		enabled filters in the journal while parsing each structure only once
+		(see Inspect). Size takes a (From, To) tuple, Loops the maximum loop
+		length, and Rg the radius of gyration cutoff. Returns the number of
+		rejected structures per reason
+		'''
+		print('\x1b[33m[.] Filtering structures...\x1b[0m')
+		names = ('NonProtein', 'Size', 'Break', 'Loops', 'Rg')
+		values = (NonProtein, Size, Break, Loops, Rg)
+		enabled = [name for name, value in zip(names, values) if value]
+		stage = 'Filter:{}'.format(','.join(enabled))
+		rejected = {}
+		for File, result, TheError in self.Map(self.Inspect, directory,
+						NonProtein, Size, Break, Loops, Rg, stage=stage):
+			if TheError is None: keep, reason = result
+			else: keep, reason = False, 'Error'
+			if not keep:
+				self.journal.reject(stage, File, reason)
+				rejected[reason] = rejected.get(reason, 0) + 1
+		for reason, count in sorted(rejected.items()):
+			print('\x1b[31m[-] Rejected {} structures\x1b[33m: {}\x1b[0m'\
+			.format(count, reason))
+		return(rejected)
 	def NonProtein(self, directory):
 		''' Remove non-protein structures '''
 		print('\x1b[33m[.] Deleting none-protein structures...\x1b[0m')
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			try:
-				structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X',
-																	TheFile)
-				ppb = Bio.PDB.Polypeptide.PPBuilder()
-				Type = ppb.build_peptides(structure, aa_only=True)
-				if Type == []: os.remove(TheFile)
-				else: continue
-			except: os.remove(TheFile)
-		os.chdir(current)
+		self.Filter(directory, NonProtein=True)
 	def Size(self, directory, Size_From, Size_To):
 		''' Remove structures not within defined size '''
 		print('\x1b[33m[.] Removing unwanted structure sizes...\x1b[0m')
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			try:
-				parser = Bio.PDB.PDBParser()
-				structure = parser.get_structure('X', TheFile)
-				model = structure[0]
-				dssp = Bio.PDB.DSSP(model, TheFile, acc_array='Wilke')
-				for aa in dssp: length = aa[0]
-				if length >= int(Size_To) or length <= int(Size_From):
-					os.remove(TheFile)
-			except: print('\x1b[31m[-] Error in finding protein size\x1b[0m')
-		os.chdir(current)
+		self.Filter(directory, Size=(Size_From, Size_To))
 	def Break(self, directory):
 		''' Remove structures with a broken (non-continuous) chains '''
 		print('\x1b[33m[.] Removing non-continuous structures...\x1b[0m')
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			structure = Bio.PDB.PDBParser(QUIET=True).get_structure('X',
-																TheFile)
-			ppb = Bio.PDB.Polypeptide.PPBuilder()
-			Type = ppb.build_peptides(structure, aa_only=True)
-			try:
-				x = Type[1]
-				os.remove(TheFile)
-			except: continue
-		os.chdir(current)
+		self.Filter(directory, Break=True)
 	def Loops(self, directory, LoopLength):
 		'''
 		Remove structures that have loops that are larger than a
 		spesific length
 		'''
 		print('\x1b[33m[.] Removing structures with long loops...\x1b[0m')
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			try:
-				parser = Bio.PDB.PDBParser()
-				structure = parser.get_structure('X', TheFile)
-				model = structure[0]
-				dssp = Bio.PDB.DSSP(model, TheFile, acc_array='Wilke')
-				SS = list()
-				for res in dssp:
-					ss = res[2]
-					if ss == '-' or ss == 'T' or ss == 'S': SS.append('L')
-					else: SS.append('.')
-				loops = ''.join(SS).split('.')
-				loops = [item for item in loops if item]
-				LargeLoop = None
-				for item in loops:
-					if len(item) <= LoopLength: continue
-					else: LargeLoop = 'LargeLoop'
-				if LargeLoop == 'LargeLoop': os.remove(TheFile)
-				else: continue
-			except: os.remove(TheFile)
-		os.chdir(current)
+		self.Filter(directory, Loops=LoopLength)
 	def Renumber(self, directory):
 		''' Renumber structures starting at 1 '''
 		print('\x1b[33m[.] Renumbering structures...\x1b[0m')
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			pdb = open(TheFile, 'r')
-			PDB = open(TheFile+'X', 'w')
-			count = 0
-			num = 0
-			AA2 = None
-			for line in pdb:
-				count += 1
-				AA1 = line[23:27]
-				if not AA1 == AA2: num += 1
-				final_line =line[:7]+'{:4d}'.format(count)+line[11:17]+\
-							line[17:21]+'A'+'{:4d}'.format(num)+line[26:]
-				AA2 = AA1
-				PDB.write(final_line)
-			PDB.close()
-			os.remove(TheFile)
-			os.rename(TheFile+'X', TheFile)
-		os.chdir(current)
+		for File, result, TheError in self.Map(self.RenumberFile, directory,
+												stage='Renumber'):
+			continue
+	def RenumberFile(self, TheFile):
+		''' Renumber one structure starting at 1 '''
+		pdb = open(TheFile, 'r')
+		PDB = open(TheFile+'X', 'w')
+		count = 0
+		num = 0
+		AA2 = None
+		for line in pdb:
+			count += 1
+			AA1 = line[23:27]
+			if not AA1 == AA2: num += 1
+			final_line =line[:7]+'{:4d}'.format(count)+line[11:17]+\
+						line[17:21]+'A'+'{:4d}'.format(num)+line[26:]
+			AA2 = AA1
+			PDB.write(final_line)
+		pdb.close()
+		PDB.close()
+		os.replace(TheFile+'X', TheFile)
 	def Rg(self, directory, RGcutoff):
 		''' Remove structures that are below the Raduis of Gyration's value '''
 		print('\x1b[33m[.] Removing structure low Rg values...\x1b[0m')
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			mass = list()
-			Structure = open(TheFile, 'r')
-			for line in Structure:
-				line = line.split()
-				if line[0] == 'TER' or line[0] == 'END': continue
-				else:
-					if line[-1] == 'C':   mass.append(12.0107)
-					elif line[-1] == 'O': mass.append(15.9994)
-					elif line[-1] == 'N': mass.append(14.0067)
-					elif line[-1] == 'S': mass.append(32.0650)
-					elif line[-1] == 'H': mass.append(1.00794)
-					else: continue
-			coord = list()
-			p = Bio.PDB.PDBParser()
-			structure = p.get_structure('X', TheFile)
-			for model in structure:
-				for chain in model:
-					for residue in chain:
-						for atom in residue: coord.append(atom.get_coord())
-			xm = [(m*i, m*j, m*k) for (i, j, k), m in zip(coord, mass)]
-			tmass = sum(mass)
-			rr = sum(mi*i + mj*j + mk*k for (i, j, k), (mi, mj, mk)\
-			in zip(coord, xm))
-			mm = sum((sum(i)/tmass)**2 for i in zip( * xm))
-			rg = math.sqrt(rr/tmass-mm)
-			if rg <= RGcutoff: os.remove(TheFile)
-			else: continue
-		os.chdir(current)
+		self.Filter(directory, Rg=RGcutoff)
 	def Clean(self, directory):
 		''' Clean each structure within a directory '''
 		print('\x1b[33m[.] Cleaning structures...\x1b[0m')
-		os.mkdir('PDBCleaned')
-		current = os.getcwd()
-		pdbfilelist = os.listdir(directory)
-		os.chdir(directory)
-		for TheFile in tqdm.tqdm(pdbfilelist):
-			CurFile = open(TheFile, 'r')
-			NewFile = open('Clean-{}'.format(TheFile), 'a')
-			for line in CurFile:
-				if line.split()[0] == 'ATOM': NewFile.write(line)
-			CurFile.close()
-			NewFile.close()
-			os.system('mv Clean-{} ../PDBCleaned'.format(TheFile))
-		os.chdir(current)
+		os.makedirs('PDBCleaned', exist_ok=True)
+		for File, result, TheError in self.Map(self.CleanFile, directory,
+												stage='Clean'):
+			continue
+	def CleanFile(self, TheFile):
+		''' Clean one structure into the PDBCleaned directory '''
+		CurFile = open(TheFile, 'r')
+		NewFile = open('PDBCleaned/Clean-{}'\
+		.format(os.path.basename(TheFile)), 'w')
+		for line in CurFile:
+			if line.split()[0] == 'ATOM': NewFile.write(line)
+		CurFile.close()
+		NewFile.close()
 	def Path(self, directory, path):
 		''' Generate a file with the path to each file '''
 		print('\x1b[33m[.] Generating paths...\x1b[0m')
 		current = os.getcwd()
 		pdbfilelist = os.listdir(directory)
 		os.chdir(directory)
-		PathFile = open('PDB.list', 'a')
+		PathFile = open('PDB.list', 'w')
 		for TheFile in tqdm.tqdm(pdbfilelist):
 			line = '{}/PDBCleaned/{}\n'.format(path, TheFile)
 			PathFile.write(line)
@@ -316,159 +819,147 @@ class Dataset():
 		os.chdir(current)
 	def C_Max(self, filename):
 		''' Find the maximum value of the Distance Map in a dataset '''
-		max_in_line = []
-		with open(filename, 'r') as f:
-			next(f)
-			for line in f:
-				line = line.strip().split(',')[1:]
-				line = [float(item) for item in line]
-				max_in_line.append(max(line))
-			maximum = max(max_in_line)
+		with h5py.File(filename, 'r') as f:
+			maximum = float(f['d'][()].max())
 			print('\x1b[32m[+] Contact Map maximum value: {}\x1b[0m'\
 			.format(maximum))
 			return(maximum)
-	def DatasetPSCM(self, directory):
+	def DatasetPSCM(self, directory, files=None):
 		'''
 		Compile a dataset of each residue's phi and psi angles and another
 		dataset of the contact map for each structure. This dataset is padded
-		with zeros.
+		with zeros. The contact maps are stored sparse in dataset_CM.hdf5,
+		load them with Contacts(). If a list of files is given only their
+		rows are appended to the existing datasets (which are started with
+		their header if they do not exist yet)
 		'''
 		a = 'Compiling phi and psi angles dataset'
 		b = 'as well as a distance matrix dataset'
 		text = a+b
 		print('\x1b[32m{}\x1b[0m'.format(text))
-		# Setup dataset header for angles
-		headerPS = ['PDB_ID']
-		for i in range(1, 150+1):
-			headerPS.append(',phi_{},psi_{}'.format(i, i))
-		headerPS = ''.join(headerPS)
-		with open('./dataset_PS.csv', 'w') as headPS:
-			headPS.write(headerPS+'\n')
-		# Setup dataset header for distance matrices
-		headerCM = ['PDB_ID']
-		for r in range(1, 150+1):
-			for c in range(1, 150+1):
-				headerCM.append(',aa{}_aa{}'.format(r, c))
-		headerCM = ''.join(headerCM)
-		with open('./dataset_CM.csv', 'w') as headCM:
-			headCM.write(headerCM+'\n')
-		for File in tqdm.tqdm(os.listdir(directory)):
-			TheFile = '{}/{}'.format(directory, File)
+		if files is None or not os.path.isfile('dataset_PS.csv'):
+			# Setup dataset header for angles
+			headerPS = ['PDB_ID']
+			for i in range(1, 150+1):
+				headerPS.append(',phi_{},psi_{}'.format(i, i))
+			headerPS = ''.join(headerPS)
+			with open('./dataset_PS.csv', 'w') as headPS:
+				headPS.write(headerPS+'\n')
+		PSdata = open('dataset_PS.csv', 'a')
+		CMdata = ContactWriter('dataset_CM.hdf5', 150, append=files is not None)
+		for File, lines, TheError in self.Map(self.DatasetPSCMFile, directory,
+												files=files):
+			if lines is None: continue
+			AngLine, CM = lines
+			PSdata.write('{},{}\n'.format(File, AngLine))
+			CMdata.write(File, CM)
+		PSdata.close()
+		CMdata.close()
+	def DatasetPSCMFile(self, TheFile):
+		'''
+		The phi and psi angles of one structure as a dataset_PS.csv row and
+		its 150x150 contact map
+		'''
+		# Compile angles
+		pose = pose_from_pdb(TheFile)
+		phi = []
+		psi = []
+		for aa in range(len(pose.residues)):
 			try:
-				# Compile angles
-				pose = pose_from_pdb(TheFile)
-				phi = []
-				psi = []
-				for aa in range(len(pose.residues)):
-					try:
-						p = pose.phi(aa+1)
-						s = pose.psi(aa+1)
-						if p < 0: p = p+360
-						if s < 0: s = s+360
-						phi.append(p)
-						psi.append(s)
-					except: pass
-				angles = []
-				for P, S in zip(phi, psi):
-					angles.append(str(round(P, 5))+','+str(round(S, 5)))
-				assert len(phi) == len(psi)
-				Angles = ','.join(angles)
-				if len(angles) >= 150: AngLine = Angles
-				else:
-					addition = 150-len(angles)
-					zeros = []
-					for adds in range(addition): zeros.append('0.0,0.0')
-					Zeros = ','.join(zeros)
-					AngLine = '{},{}'.format(Angles, Zeros)
-				ThePSLine = '{},{}\n'.format(File, AngLine)
-				with open('dataset_PS.csv', 'a') as PSdata:
-					PSdata.write(ThePSLine)
-				#Compile contact map (Ca-Ca contact <= 12 angstroms)
-				BIO = Bio.PDB.PDBParser(QUIET=True)
-				structure = BIO.get_structure('X', TheFile)
-				ppb = Bio.PDB.Polypeptide.PPBuilder()
-				Type = ppb.build_peptides(structure, aa_only=False)
-				model = Type
-				chain = model[0]
-				CM = []
-				for aa1 in range(0, 150):
-					for aa2 in range(0, 150):
-						try:
-							residue1 = chain[aa1]
-							residue2 = chain[aa2]
-							atom1 = residue1['CA']
-							atom2 = residue2['CA']
-							if atom1-atom2 <= 12:
-								CM.append(str(atom1-atom2))
-							else:
-								CM.append(str(0))
-						except:
-							CM.append(str(0))
-				assert len(CM) == 22500
-				ContactMap = ','.join(CM)
-				TheCMLine = '{},{}\n'.format(File, ContactMap)
-				with open('dataset_CM.csv', 'a') as CMdata:
-					CMdata.write(TheCMLine)
+				p = pose.phi(aa+1)
+				s = pose.psi(aa+1)
+				if p < 0: p = p+360
+				if s < 0: s = s+360
+				phi.append(p)
+				psi.append(s)
 			except: pass
+		angles = []
+		for P, S in zip(phi, psi):
+			angles.append(str(round(P, 5))+','+str(round(S, 5)))
+		assert len(phi) == len(psi)
+		Angles = ','.join(angles)
+		if len(angles) >= 150: AngLine = Angles
+		else:
+			addition = 150-len(angles)
+			zeros = []
+			for adds in range(addition): zeros.append('0.0,0.0')
+			Zeros = ','.join(zeros)
+			AngLine = '{},{}'.format(Angles, Zeros)
+		#Compile contact map (Ca-Ca contact <= 12 angstroms)
+		BIO = Bio.PDB.PDBParser(QUIET=True)
+		structure = BIO.get_structure('X', TheFile)
+		ppb = Bio.PDB.Polypeptide.PPBuilder()
+		Type = ppb.build_peptides(structure, aa_only=False)
+		model = Type
+		chain = model[0]
+		CA = [residue['CA'].get_coord() if 'CA' in residue\
+				else (np.nan, np.nan, np.nan) for residue in chain]
+		CM = ContactMap(CA, 12, 150).astype(np.float32)
+		assert CM.size == 22500
+		return(AngLine, CM)
 	def VectorisePSCM(self, PS_file='dataset_PS.csv',
-						CM_file='dataset_CM.csv',
+						CM_file='dataset_CM.hdf5',
 						C_MAX=12,
-						fp=np.float64):
+						fp=np.float32,
+						chunk=1024,
+						shuffle=True,
+						filename='PS+CM.hdf5'):
 		'''
 		This function vectorises the datasets, normalises them, as well as
-		constructs the final tensor and export the result as a serial.
+		constructs the final tensor and export the result as a serial. The
+		datasets are streamed chunk structures at a time, each chunk is
+		scattered to its places in a random permutation of a pre-sized and
+		compressed HDF5 dataset (one HDF5 chunk per structure), so memory
+		stays bounded by the chunk size
 		'''
-		# 1. Import a single row of PS dataset
-		with open(PS_file) as PSf:
-			next(PSf)
-			P, S = [], []
-			for line in PSf:
+		CMf = Contacts(CM_file, fp)
+		size = len(CMf)
+		if shuffle: order = np.random.permutation(size)
+		else: order = np.arange(size)
+		PSf = open(PS_file)
+		next(PSf)
+		with h5py.File(filename, 'w') as data:
+			dataset = data.create_dataset('default', (size, 150, 152),
+							dtype=fp, chunks=(1, 150, 152), compression='gzip')
+			ids = data.create_dataset('ids', (size,), dtype=h5py.string_dtype())
+			for start in tqdm.tqdm(range(0, size, chunk)):
+				stop = min(start + chunk, size)
+				# 1. Import a chunk of rows of the PS dataset
+				lines = [next(PSf).strip().split(',') for n in range(start, stop)]
+				assert [line[0] for line in lines] == CMf.ids[start:stop]
 				# 2. Isolate different angles
-				line = line.strip().split(',')
-				p = [float(item) for item in line[1::2]]
-				s = [float(item) for item in line[2::2]]
-				assert len(p) == len(s)
-				P.append(np.array(p, dtype=fp))
-				S.append(np.array(s, dtype=fp))
-		with open(CM_file) as CMf:
-			next(CMf)
-			CM = []
-			for line in CMf:
-				# 3. Isolate different points
-				line = [float(item) for item in line.strip().split(',')[1:]]
-				cm = np.reshape(line, (150, 150))
-				CM.append(np.array(cm, dtype=fp))
-		# 4. Construct PS matrices
-		P = np.array(P)
-		S = np.array(S)
-		# 5. Normalise PS angles (min/max) [-1, 1]
-		P /= 180
-		S /= 180
-		P -= 1
-		S -= 1
-		PS = np.array([P, S])
-		PS = np.swapaxes(PS, 0, 2)
-		PS = np.swapaxes(PS, 0, 1)
-		# 6. Construct CM matrices
-		CM = np.array(CM)
-		# 7. Normalise CM contact map (min/max) [-1, 1]
-		CM /= (C_MAX/2)
-		CM -= 1
-		# 8. Construct final dataset matrix
-		dataset = np.concatenate([PS, CM], axis=2)
-		# 9. Suffle dataset
-		sklearn.utils.shuffle(dataset)
-		# 10. Serialise tensors
-		with h5py.File('PS+CM.hdf5', 'w') as data:
-			dataset = data.create_dataset('default', data=dataset)
+				P = np.array([line[1::2] for line in lines], dtype=fp)
+				S = np.array([line[2::2] for line in lines], dtype=fp)
+				# 3. Densify the chunk's sparse contact maps
+				CM = CMf[start:stop]
+				# 4. Normalise PS angles (min/max) [-1, 1]
+				P /= 180
+				S /= 180
+				P -= 1
+				S -= 1
+				# 5. Construct PS matrices
+				PS = np.stack([P, S], axis=2)
+				# 6. Normalise CM contact map (min/max) [-1, 1]
+				CM /= (C_MAX/2)
+				CM -= 1
+				# 7. Construct the chunk of the final dataset matrix
+				block = np.concatenate([PS, CM], axis=2)
+				# 8. Shuffle the chunk into the serialised tensor
+				target = order[start:stop]
+				sort = np.argsort(target)
+				dataset[target[sort]] = block[sort]
+				ids[target[sort]] = np.array(CMf.ids[start:stop],
+											dtype=object)[sort]
+		PSf.close()
+		CMf.close()
 		# IMPORT WITH THIS COMMAND:
-		#with h5py.File('PS+DM.hdf5', 'r') as data: dataset=data['default'][()]
+		#with h5py.File('PS+CM.hdf5', 'r') as data: dataset=data['default'][()]
 	def DatasetAsPSaM(self, directory):
 		'''
 		Compile a dataset of each residue's amino acid identify, secondary
 		structure, phi angle, psi angle, solvent accessible surface area as
-		a .csv file and the contact map as a separate .csv file. to be run
-		after clean() on the ./cleaned directory, also outputs a file
+		a .csv file and the contact map as a separate sparse M.hdf5 file. to
+		be run after clean() on the ./cleaned directory, also outputs a file
 		identifying the sizes of structures, so the largest value can be used
 		with HeaderAsPSaM()
 		'''
@@ -476,66 +967,62 @@ class Dataset():
 		os.makedirs('./Error_NotEqual', exist_ok=True)
 		os.makedirs('./Error_Broken', exist_ok=True)
 		os.makedirs('./Error_Small', exist_ok=True)
-		for File in tqdm.tqdm(os.listdir(directory)):
-			try:
-				TheFile = '{}/{}'.format(directory, File)
-				pose = pose_from_pdb(TheFile)
-				DSSP = pyrosetta.rosetta.protocols.moves.DsspMover()
-				DSSP.apply(pose)
-				sasa_calc = pyrosetta.rosetta.core.scoring.sasa.SasaCalc()
-				sasa_calc.calculate(pose)
-				size = pose.total_residue()
-				aa   = []
-				ss   = []
-				phi  = []
-				psi  = []
-				sasa = []
-				info = []
-				ctmp = []
-				m    = []
-				surf = list(sasa_calc.get_residue_sasa())
-				for r  in range(size):
-					if pose.residue(r+1).is_protein():
-						aa.append(pose.sequence(r+1, r+1))
-						ss.append(pose.secstruct(r+1))
-						p = pose.phi(r+1)
-						if p < 0: p = p + 360
-						phi.append(p)
-						s = pose.psi(r+1)
-						if s < 0: s = s + 360
-						psi.append(s)
-						sasa.append(surf[r])
-				for r  in range(0, size):
-					for R  in range(0, size):
-						if	pose.residue(r+1).is_protein() and\
-							pose.residue(R+1).is_protein():
-							CAr = pose.residue(r+1).xyz('CA')
-							CAR = pose.residue(R+1).xyz('CA')
-							CAr_CAR_vector = CAR-CAr
-							Cont = CAr_CAR_vector.norm()
-							if Cont <= 12: ctmp.append(Cont)
-							else: ctmp.append(0)
-				if len(aa) >= 50:
-						try:
-							assert	len(aa) == len(ss) == len(phi)\
-							== len(psi) == len(sasa) == math.sqrt(len(ctmp))
-							for AA,SS,P,S,SASA in zip(aa,ss,phi,psi,sasa):
-								info.append('{},{},{},{},{}'\
-								.format(AA, SS, P, S, SASA))
-							Info = ','.join(info)
-							with open('./AsPSa.csv', 'a') as data:
-								data.write(File + ',' + Info + '\n')
-							with open('lengths.txt', 'a') as length:
-								length.write(str(len(aa))+'\n')
-							for x in ctmp:
-								m.append('{}'.format(x))
-							M = ','.join(m)
-							with open('./M.csv', 'a') as data:
-								data.write(File + ',' + M + '\n')
-							os.system('mv {} ./Completed'.format(TheFile))
-						except: passos.system('mv {} ./Error_NotEqual'.format(TheFile))
-				else: os.system('mv {} ./Error_Small'.format(TheFile))
-			except: passos.system('mv {} ./Error_Broken'.format(TheFile))
+		Mdata = ContactWriter('M.hdf5', append=True)
+		for File, lines, TheError in self.Map(self.DatasetAsPSaMFile,directory):
+			TheFile = '{}/{}'.format(directory, File)
+			if TheError is not None:
+				os.system('mv {} ./Error_Broken'.format(TheFile))
+				continue
+			category, Info, length, M = lines
+			if category == 'Completed':
+				with open('./AsPSa.csv', 'a') as data:
+					data.write(File + ',' + Info + '\n')
+				with open('lengths.txt', 'a') as lengths:
+					lengths.write(str(length)+'\n')
+				Mdata.write(File, M)
+			os.system('mv {} ./{}'.format(TheFile, category))
+		Mdata.close()
+	def DatasetAsPSaMFile(self, TheFile):
+		'''
+		The AsPSa.csv row and the contact map of one structure, returns
+		which directory the structure belongs to (Completed, Error_NotEqual,
+		or Error_Small), the row, the structure's length, and the map
+		'''
+		pose = pose_from_pdb(TheFile)
+		DSSP = pyrosetta.rosetta.protocols.moves.DsspMover()
+		DSSP.apply(pose)
+		sasa_calc = pyrosetta.rosetta.core.scoring.sasa.SasaCalc()
+		sasa_calc.calculate(pose)
+		size = pose.total_residue()
+		aa   = []
+		ss   = []
+		phi  = []
+		psi  = []
+		sasa = []
+		info = []
+		surf = list(sasa_calc.get_residue_sasa())
+		for r  in range(size):
+			if pose.residue(r+1).is_protein():
+				aa.append(pose.sequence(r+1, r+1))
+				ss.append(pose.secstruct(r+1))
+				p = pose.phi(r+1)
+				if p < 0: p = p + 360
+				phi.append(p)
+				s = pose.psi(r+1)
+				if s < 0: s = s + 360
+				psi.append(s)
+				sasa.append(surf[r])
+		CA = [pose.residue(r+1).xyz('CA') for r in range(size)\
+				if pose.residue(r+1).is_protein()]
+		M = ContactMap([(v.x, v.y, v.z) for v in CA], 12).astype(np.float32)
+		if len(aa) < 50: return('Error_Small', None, None, None)
+		if not len(aa) == len(ss) == len(phi) == len(psi) == len(sasa)\
+		== len(M):
+			return('Error_NotEqual', None, None, None)
+		for AA,SS,P,S,SASA in zip(aa,ss,phi,psi,sasa):
+			info.append('{},{},{},{},{}'.format(AA, SS, P, S, SASA))
+		Info = ','.join(info)
+		return('Completed', Info, len(aa), M)
 	def Fill(self, filename):
 		''' Fills missing .csv table spaces with zeros '''
 		with open(filename) as f:
@@ -552,8 +1039,9 @@ class Dataset():
 					F.write(new_line + '\n')
 	def HeaderAsPSaM(self, length=745, choice='AsPSa'):
 		'''
-		Constructs a .csv header and completes the dataset. To find the value of
-		the largest structure run: sort -nk 1 lengths.txt
+		Constructs a .csv header and completes the dataset, the sparse contact
+		maps are padded to length. To find the value of the largest structure
+		run: sort -nk 1 lengths.txt
 		'''
 		header = ['PDB_ID']
 		if choice == 'AsPSa':
@@ -567,34 +1055,41 @@ class Dataset():
 					for line in data:
 						head.write(line)
 		elif choice == 'M':
-			for r in range(1, length+1):
-				for c in range(1, length+1):
-					header.append(',aa{}_aa{}'.format(r, c))
-			header = ''.join(header)
-			with open('./M.csv', 'r') as data:
-				with open('./dataset_M.csv', 'w') as head:
-					head.write(header+'\n')
-					for line in data:
-						head.write(line)
+			shutil.copy('./M.hdf5', './dataset_M.hdf5')
+			with h5py.File('./dataset_M.hdf5', 'a') as data:
+				data.attrs['size'] = length
 	def build(self, switches='', directory='PDBDatabase'):
+		'''
+		Build the dataset, every stage is journaled so an interrupted build
+		resumes where it stopped
+		'''
 		if len(switches) == 15:
 			switch = list(switches)
-			if switch[0]  == '1': self.Database('DATABASE', directory)
-			if switch[1]  == '1': self.Extract(directory)
-			if switch[2]  == '1': self.NonProtein(directory)
-			if switch[3]  == '1': self.Size(directory, 80, 150)
-			if switch[4]  == '1': self.Break(directory)
-			if switch[5]  == '1': self.Loops(directory, 10)
-			if switch[6]  == '1': self.Renumber(directory)
-			if switch[7]  == '1': self.Rg(directory, 15)
+			if switch[0]  == '1':
+				self.Stage('Database', self.Database, 'DATABASE', directory)
+			if switch[1]  == '1': self.Stage('Extract', self.Extract, directory)
+			if '1' in [switch[i] for i in (2, 3, 4, 5, 7)]:
+				self.Stage('Filter', self.Filter, directory,
+					NonProtein=switch[2] == '1',
+					Size=(80, 150) if switch[3] == '1' else None,
+					Break=switch[4] == '1',
+					Loops=10 if switch[5] == '1' else None,
+					Rg=15 if switch[7] == '1' else None)
+			if switch[6]  == '1':
+				self.Stage('Renumber', self.Renumber, directory)
+			if '1' in switch[1:8]: self.Purge(directory)
 			########## --- HUMAN EYE FILTERING --- ##########
-			if switch[8]  == '1': self.Clean(directory)
-			if switch[9]  == '1': self.Path('PDBCleaned', '{PATH}')
-			if switch[10] == '1': self.RelaxHPC('~/Rosetta', 829)
-			if switch[11] == '1': self.Relax('PDBCleaned')
-			if switch[14] == '1': self.DatasetPSCM('PDBCleaned')
-			if switch[15] == '1': self.C_Max('dataset_CM.csv')
-			if switch[16] == '1': self.VectorisePSCM()
+			if switch[8]  == '1': self.Stage('Clean', self.Clean, directory)
+			if switch[9]  == '1':
+				self.Stage('Path', self.Path, 'PDBCleaned', '{PATH}')
+			if switch[10] == '1':
+				self.Stage('RelaxHPC', self.RelaxHPC, '~/Rosetta', 829)
+			if switch[11] == '1': self.Stage('Relax', self.Relax, 'PDBCleaned')
+			if switch[14] == '1':
+				self.Stage('DatasetPSCM', self.DatasetPSCM, 'PDBCleaned')
+			if switch[15] == '1': self.C_Max('dataset_CM.hdf5')
+			if switch[16] == '1':
+				self.Stage('VectorisePSCM', self.VectorisePSCM)
 		else: print('\x1b[31m[-] Error\x1b[33m: wrong string length\x1b[0m')
 
 def Vall(filename='vall.jul19.2011', m=16800, nx=1490):
@@ -768,74 +1263,63 @@ def DatasetAsPSaM(directory):
 	'''
 	Compile a dataset of each residue's amino acid identify, secondary
 	structure, phi angle, psi angle, solvent accessible surface area as
-	a .csv file and the contact map as a separate .csv file. to be run
-	after clean() on the ./cleaned directory and identifying the number
+	a .csv file and the contact map as a separate sparse M.hdf5 file. to be
+	run after clean() on the ./cleaned directory and identifying the number
 	of residuis of the largest structure
 	'''
 	os.makedirs('./Completed', exist_ok=True)
 	os.makedirs('./Error_NotEqual', exist_ok=True)
 	os.makedirs('./Error_Broken', exist_ok=True)
 	os.makedirs('./Error_Small', exist_ok=True)
-	for File in tqdm.tqdm(os.listdir(directory)):
-		try:
-			TheFile = '{}/{}'.format(directory, File)
-			pose = pose_from_pdb(TheFile)
-			DSSP = pyrosetta.rosetta.protocols.moves.DsspMover()
-			DSSP.apply(pose)
-			sasa_calc = pyrosetta.rosetta.core.scoring.sasa.SasaCalc()
-			sasa_calc.calculate(pose)
-			size = pose.total_residue()
-			aa   = []
-			ss   = []
-			phi  = []
-			psi  = []
-			sasa = []
-			info = []
-			ctmp = []
-			m    = []
-			surf = list(sasa_calc.get_residue_sasa())
-			for r  in range(size):
-				if pose.residue(r+1).is_protein():
-					aa.append(pose.sequence(r+1, r+1))
-					ss.append(pose.secstruct(r+1))
-					p = pose.phi(r+1)
-					if p < 0: p = p + 360
-					phi.append(p)
-					s = pose.psi(r+1)
-					if s < 0: s = s + 360
-					psi.append(s)
-					sasa.append(surf[r])
-			for r  in range(0, size):
-				for R  in range(0, size):
-					if	pose.residue(r+1).is_protein() and\
-						pose.residue(R+1).is_protein():
-						CAr = pose.residue(r+1).xyz('CA')
-						CAR = pose.residue(R+1).xyz('CA')
-						CAr_CAR_vector = CAR-CAr
-						Cont = CAr_CAR_vector.norm()
-						if Cont <= 12: ctmp.append(Cont)
-						else: ctmp.append(0)
-			if len(aa) >= 50:
-					try:
-						assert	len(aa) == len(ss) == len(phi)\
-						== len(psi) == len(sasa) == math.sqrt(len(ctmp))
-						for AA,SS,P,S,SASA in zip(aa,ss,phi,psi,sasa):
-							info.append('{},{},{},{},{}'\
-							.format(AA, SS, P, S, SASA))
-						Info = ','.join(info)
-						with open('./AsPSa.csv', 'a') as data:
-							data.write(File + ',' + Info + '\n')
-						with open('lengths.txt', 'a') as length:
-							length.write(str(len(aa))+'\n')
-						for x in ctmp:
-							m.append('{}'.format(x))
-						M = ','.join(m)
-						with open('./M.csv', 'a') as data:
-							data.write(File + ',' + M + '\n')
-						os.system('mv {} ./Completed'.format(TheFile))
-					except: os.system('mv {} ./Error_NotEqual'.format(TheFile))
-			else: os.system('mv {} ./Error_Small'.format(TheFile))
-		except: os.system('mv {} ./Error_Broken'.format(TheFile))
+	with ContactWriter('M.hdf5', append=True) as Mdata:
+		for File in tqdm.tqdm(os.listdir(directory)):
+			try:
+				TheFile = '{}/{}'.format(directory, File)
+				pose = pose_from_pdb(TheFile)
+				DSSP = pyrosetta.rosetta.protocols.moves.DsspMover()
+				DSSP.apply(pose)
+				sasa_calc = pyrosetta.rosetta.core.scoring.sasa.SasaCalc()
+				sasa_calc.calculate(pose)
+				size = pose.total_residue()
+				aa   = []
+				ss   = []
+				phi  = []
+				psi  = []
+				sasa = []
+				info = []
+				surf = list(sasa_calc.get_residue_sasa())
+				for r  in range(size):
+					if pose.residue(r+1).is_protein():
+						aa.append(pose.sequence(r+1, r+1))
+						ss.append(pose.secstruct(r+1))
+						p = pose.phi(r+1)
+						if p < 0: p = p + 360
+						phi.append(p)
+						s = pose.psi(r+1)
+						if s < 0: s = s + 360
+						psi.append(s)
+						sasa.append(surf[r])
+				CA = [pose.residue(r+1).xyz('CA') for r in range(size)\
+						if pose.residue(r+1).is_protein()]
+				CA = [(v.x, v.y, v.z) for v in CA]
+				M = ContactMap(CA, 12).astype(np.float32)
+				if len(aa) >= 50:
+						try:
+							assert	len(aa) == len(ss) == len(phi)\
+							== len(psi) == len(sasa) == len(M)
+							for AA,SS,P,S,SASA in zip(aa,ss,phi,psi,sasa):
+								info.append('{},{},{},{},{}'\
+								.format(AA, SS, P, S, SASA))
+							Info = ','.join(info)
+							with open('./AsPSa.csv', 'a') as data:
+								data.write(File + ',' + Info + '\n')
+							with open('lengths.txt', 'a') as length:
+								length.write(str(len(aa))+'\n')
+							Mdata.write(File, M)
+							os.system('mv {} ./Completed'.format(TheFile))
+						except: os.system('mv {} ./Error_NotEqual'.format(TheFile))
+				else: os.system('mv {} ./Error_Small'.format(TheFile))
+			except: os.system('mv {} ./Error_Broken'.format(TheFile))
 	def Fill(self, filename):
 		''' Fills missing .csv table spaces with zeros '''
 		with open(filename) as f:
@@ -852,8 +1336,9 @@ def DatasetAsPSaM(directory):
 					F.write(new_line + '\n')
 	def Header(self, length=745, choice='AsPSa'):
 		'''
-		Constructs a .csv header and completes the dataset. To find the value of
-		the largest structure run: sort -nk 1 lengths.txt
+		Constructs a .csv header and completes the dataset, the sparse contact
+		maps are padded to length. To find the value of the largest structure
+		run: sort -nk 1 lengths.txt
 		'''
 		header = ['PDB_ID']
 		if choice == 'AsPSa':
@@ -867,22 +1352,159 @@ def DatasetAsPSaM(directory):
 					for line in data:
 						head.write(line)
 		elif choice == 'M':
-			for r in range(1, length+1):
-				for c in range(1, length+1):
-					header.append(',aa{}_aa{}'.format(r, c))
-			header = ''.join(header)
-			with open('./M.csv', 'r') as data:
-				with open('./dataset_M.csv', 'w') as head:
-					head.write(header+'\n')
-					for line in data:
-						head.write(line)
+			shutil.copy('./M.hdf5', './dataset_M.hdf5')
+			with h5py.File('./dataset_M.hdf5', 'a') as data:
+				data.attrs['size'] = length
+
+def TrimLoop(pose, extra=0):
+	'''
+	Delete the trailing loop (and extra residues before it) of a pose in
+	place, the secondary structure is computed on the pose itself. Raises
+	a ValueError if the whole structure is a loop
+	'''
+	SS = pyrosetta.rosetta.core.scoring.dssp.Dssp(pose).get_dssp_secstruct()
+	core = len(SS.rstrip('L'))
+	if core == 0: raise ValueError('Unsatisfactory structure')
+	start = core + 1 - extra
+	if start <= pose.size(): pose.delete_residue_range_slow(start, pose.size())
+	return(pose)
+
+def PoseDSSP(pose):
+	'''
+	DSSP records (number, amino acid, secondary structure, relative solvent
+	accessibility) of every residue of a pose, computed in memory with
+	PyRosetta's DSSP and SASA instead of running DSSP on a .pdb file. The
+	accessibility is relative to the theoretical maximum of Tien et al. 2013
+	'''
+	MaxASA = {	'A':129, 'P':159, 'N':195, 'H':224,
+				'V':174, 'Y':263, 'C':167, 'K':236,
+				'I':197, 'F':240, 'Q':225, 'S':155,
+				'L':201, 'W':285, 'E':223, 'T':172,
+				'M':224, 'R':274, 'G':104, 'D':193}
+	SS = pyrosetta.rosetta.core.scoring.dssp.Dssp(pose).get_dssp_secstruct()
+	sasa_calc = pyrosetta.rosetta.core.scoring.sasa.SasaCalc()
+	sasa_calc.calculate(pose)
+	surf = list(sasa_calc.get_residue_sasa())
+	records = []
+	for r in range(pose.size()):
+		aa = pose.residue(r+1).name1()
+		ss = {'H':'H', 'E':'E'}.get(SS[r], '-')
+		records.append((r+1, aa, ss, surf[r] / MaxASA[aa]))
+	return(records)
+
+def PoseAtoms(pose):
+	''' The (N, 3) coordinates and the element symbols of every atom of a pose '''
+	coord = []
+	element = []
+	for r in range(1, pose.size()+1):
+		residue = pose.residue(r)
+		for a in range(1, residue.natoms()+1):
+			v = residue.xyz(a)
+			coord.append((v.x, v.y, v.z))
+			element.append(residue.atom_type(a).element())
+	return(np.array(coord, dtype=np.float64), element)
+
+def PoseText(pose):
+	''' The .pdb text of a pose without writing it to a file '''
+	buffer = pyrosetta.rosetta.std.stringbuf()
+	pose.dump_pdb(pyrosetta.rosetta.std.ostream(buffer))
+	return(buffer.str())
+
+def AtomPairs(pose, first, second, distances, sd=1.0):
+	'''
+	Add a CA-CA AtomPairConstraint with a GaussianFunc (mean distance,
+	standard deviation sd) between every pair of residues to a pose, the
+	constraints are collected in one ConstraintSet that is set on the pose
+	'''
+	constraints = pose.constraint_set().clone()
+	for a, A, distance in zip(first, second, distances):
+		a, A = int(a), int(A)
+		atom1 = pyrosetta.rosetta.core.id.AtomID(pose.residue(a).atom_index('CA'), a)
+		atom2 = pyrosetta.rosetta.core.id.AtomID(pose.residue(A).atom_index('CA'), A)
+		func = pyrosetta.rosetta.core.scoring.func.GaussianFunc(float(distance), sd)
+		constraints.add_constraint(pyrosetta.rosetta.core.scoring.constraints\
+							.AtomPairConstraint(atom1, atom2, func))
+	pose.constraint_set(constraints)
+	return(pose)
+
+def Restraints(C, separation=3, top=None):
+	'''
+	The residue pairs to constrain from a symmetric distance map, only the
+	non-zero distances of the upper triangle between residues at least
+	separation apart, and if top is given only the pairs that are among
+	the top shortest distances of either of their residues. Returns the
+	residue numbers (from 1) of both sides of every pair and the distances
+	'''
+	C = np.asarray(C, dtype=np.float64)
+	a, A = np.triu_indices(len(C), max(separation, 1))
+	d = C[a, A]
+	keep = d != 0
+	a, A, d = a[keep], A[keep], d[keep]
+	if top is not None and len(d) > 0:
+		U = np.full(C.shape, np.inf)
+		U[a, A] = d
+		U[A, a] = d
+		top = min(top, len(C))
+		rank = np.argpartition(U, top-1, axis=1)[:, :top]
+		chosen = np.zeros(C.shape, dtype=bool)
+		chosen[np.arange(len(C))[:, None], rank] = True
+		chosen &= np.isfinite(U)
+		keep = chosen[a, A] | chosen[A, a]
+		a, A, d = a[keep], A[keep], d[keep]
+	return(a+1, A+1, d)
+
+class Funnel():
+	'''
+	Per-attempt instrumentation of a generate, fold, and filter loop. Every
+	attempt is appended to a JSON lines file with the stage it ended at
+	(accepted, or the stage that rejected it and why), the CPU seconds spent
+	in each step, and the quality metric components. summary() reports the
+	acceptance rate and the CPU seconds per accepted design
+	'''
+	def __init__(self, filename='funnel.jsonl'):
+		self.filename = filename
+	def write(self, stage, reason=None, seconds=None, components=None):
+		''' Append one attempt to the funnel '''
+		if self.filename is None: return
+		record = {'time': time.time(), 'stage': stage, 'reason': reason,
+				'seconds': seconds or {}, 'components': components or {}}
+		with open(self.filename, 'a') as f:
+			f.write(json.dumps(record) + '\n')
+	def summary(self):
+		''' Print the acceptance rate, costs, and rejections of the funnel '''
+		attempts, accepted, cpu = 0, 0, 0
+		steps = collections.Counter()
+		rejections = collections.Counter()
+		with open(self.filename) as f:
+			for line in f:
+				record = json.loads(line)
+				attempts += 1
+				cpu += sum(record['seconds'].values())
+				steps.update(record['seconds'])
+				if record['stage'] == 'accepted': accepted += 1
+				else: rejections[(record['stage'], record['reason'])] += 1
+		print('\x1b[32m[+] Attempts {}, accepted {} ({:.2%})\x1b[0m'\
+		.format(attempts, accepted, accepted / max(attempts, 1)))
+		print('\x1b[32m[+] CPU seconds per accepted design: {}\x1b[0m'\
+		.format(round(cpu / accepted, 2) if accepted else 'none accepted'))
+		print('\x1b[32m[+] CPU seconds per attempt: {}\x1b[0m'.format(', '\
+		.join('{} {:.3f}'.format(step, total / attempts)\
+		for step, total in steps.items())))
+		for (stage, reason), count in rejections.most_common():
+			print('\x1b[33m[.] Rejected at {}: {} {}\x1b[0m'\
+			.format(stage, reason, count))
 
 class BACKBONE():
-	def gan(self, filename1=None, filename2=None, choice='generate'):
+	def __init__(self, workers=1, prefilter=True, funnel='funnel.jsonl'):
+		self.workers = workers
+		self.prefilter = prefilter
+		self.funnel = funnel
+	def gan(self, filename=None, choice='generate'):
 		'''
 		A generative adversarial neural network that generates novel unnatural
 		protein backbone topologies. This network uses the phi and psi angles
-		as well as a distance matrix as protein structure features
+		as well as a distance matrix as protein structure features, training
+		batches are streamed from the PS+CM.hdf5 tensor of VectorisePSCM()
 		'''
 		lrG = 0.001
 		lrD = 0.001
@@ -897,31 +1519,11 @@ class BACKBONE():
 		batchs = 64
 		epochs = 1
 		C_MAX = 12
-		try:
-			data = pd.read_csv(filename1)
-			phi = data[data.columns[1::2]].values
-			psi = data[data.columns[2::2]].values
-			phi /= 180
-			psi /= 180
-			phi -= 1
-			psi -= 1
-			data = pd.read_csv(filename2)
-			cm = data[data.columns[1:]].values
-			cm = np.reshape(cm, (-1, 150, 150))
-			cm /= (C_MAX/2)
-			cm -= 1
-			CM = cm
-			PS = np.array([phi, psi])
-			PS = np.swapaxes(PS, 0, 2)
-			PS = np.swapaxes(PS, 0, 1)
-			dataset = np.concatenate([PS, CM], axis=2)
-			dataset = np.reshape(dataset,
-			(-1, dataset.shape[1], dataset.shape[2], 1))
-			PS, CM, cm, phi, psi = [], [], [], [], []
-			sklearn.utils.shuffle(dataset)
-			shape = dataset.shape[1:]
-			print(dataset.shape)
-		except: shape = (150, 152, 1)
+		if choice == 'train':
+			dataset = Sampler(filename, batchs)
+			shape = dataset.shape
+			print(dataset.dataset.shape)
+		else: shape = (150, 152, 1)
 		G = Sequential()
 		G.add(Dense(2**(nodeG+1) * 75 * 38, activation='relu',input_dim=latent))
 		G.add(Reshape((75, 38, 2**(nodeG+1))))
@@ -967,9 +1569,7 @@ class BACKBONE():
 			y_false = np.zeros([batchs, 1])
 			k = 3
 			for epoch in range(1, epochs+1):
-				X_real = dataset[np.random.randint(0,
-				dataset.shape[0],
-				size=batchs)]
+				X_real = next(dataset)
 				X_noise = np.random.normal(0.0, 1.0, size=[batchs, latent])
 				X_fake = G.predict(X_noise)
 				dT_loss = D.train_on_batch(X_real, y_true)
@@ -988,113 +1588,206 @@ class BACKBONE():
 				Verb =	'Epoch: {:6d} [DT {:.7f}][DF {:.7f}][G {:.7f}]'\
 						.format(epoch, DT_loss, DF_loss, GN_loss)
 				print(Verb)
+			dataset.close()
 			G.save_weights('weights.h5')
 			return(Epc, DTy, DFy, GNy)
-		if choice == 'generate':
+		if choice in ('generate', 'load'):
 			try: G.load_weights('weights.h5')
 			except: print('Missing file: weights.h5'); exit()
-			noise = np.random.normal(0.0, 1.0, size=[1, latent])
-			gen = G.predict(noise)
-			P = gen[:,:,0]
-			S = gen[:,:,1]
-			C = gen[:,:,2:]
-			P += 1
-			S += 1
-			C += 1
-			P *= 180
-			S *= 180
-			C *= (C_MAX/2)
-			P = np.reshape(P, (150,))
-			S = np.reshape(S, (150,))
-			C = np.reshape(C, (150, 150))
-			return(P, S, C)
-	def train(self, filename=None):
+			self.G = G
+			self.latent = latent
+			self.C_MAX = C_MAX
+			if choice == 'generate':
+				P, S, C = self.sample(1)
+				return(P[0], S[0], C[0])
+	def sample(self, n=1, batch=256):
+		'''
+		Generate n backbones with one batched prediction of the generator,
+		which is only built and loaded once. Returns the stacked (n, 150)
+		phi and psi angles and (n, 150, 150) contact maps
+		'''
+		if getattr(self, 'G', None) is None: self.gan(choice='load')
+		noise = np.random.normal(0.0, 1.0, size=[n, self.latent])
+		gen = self.G.predict(noise, batch_size=batch)
+		gen = np.reshape(gen, (n, 150, 152))
+		P = (gen[:, :, 0] + 1) * 180
+		S = (gen[:, :, 1] + 1) * 180
+		C = (gen[:, :, 2:] + 1) * (self.C_MAX/2)
+		return(P, S, C)
+	def train(self, filename='PS+CM.hdf5'):
 		''' Train the neural network '''
-		self.gan('train', filename)
-	def generate(self, structures=1):
+		return(self.gan(filename, 'train'))
+	def generate(self, structures=1, batch=64):
 		''' Generate structures and fold them '''
-		for i in range(1, structures+1):
+		backbones = self.backbones(batch)
+		for i, (metric, text) in zip(range(1, structures+1), backbones):
+			with open('{}.pdb'.format(str(i)), 'w') as f: f.write(text)
+		backbones.close()
+		self.close()
+	def Pool(self):
+		'''
+		The pool of folding worker processes (each sets up its score function
+		once), it is started once and reused by every backbones() call until
+		close()
+		'''
+		if getattr(self, 'pool', None) is None:
+			self.pool = concurrent.futures.ProcessPoolExecutor(self.workers,
+						initializer=FoldInit)
+		return(self.pool)
+	def close(self):
+		''' Shut the pool of folding workers down '''
+		if getattr(self, 'pool', None) is None: return
+		self.pool.shutdown()
+		self.pool = None
+	def backbones(self, batch=64):
+		'''
+		Endlessly sample candidates batch at a time, drop the ones that fail
+		the Prefilter, and fold the rest across the pool of worker processes,
+		which is kept saturated by refilling it from the sampler as soon as a
+		fold finishes. Yields the SQM and the PDB text of every backbone that
+		passes it as soon as it is folded. Every attempt is recorded in the
+		Funnel
+		'''
+		prefilter = None
+		if self.prefilter:
+			try: prefilter = Prefilter()
+			except FileNotFoundError as TheError:
+				print('\x1b[33m[.] Cannot calibrate the prefilter ({}), running '
+				'without it\x1b[0m'.format(TheError))
+		funnel = Funnel(self.funnel)
+		pool = self.Pool()
+		candidates = collections.deque()
+		futures = {}
+		try:
 			while True:
-				P, S, C = self.gan()
-				try: self.fold(P, S, C)
-				except: continue
-				if self.SQM('backbone.pdb')[1] == True:
-					os.system('mv backbone.pdb {}.pdb'.format(str(i)))
-				else: os.remove('backbone.pdb')
-		def SQM(self, filename):
-			'''
-			Structure Quality Metric:
-			Calculates the ratio of helices and sheets to loops, the the percent of amino
-			acids comprising the structure core, and the radius of gyration as values
-			between 0.0-1.0, it then averages the three values. Returns a value between
-			0.0-1.0 where good structure > 0.8
-			'''
-			parser = Bio.PDB.PDBParser()
-			structure = parser.get_structure('{}'.format(filename), filename)
-			dssp = Bio.PDB.DSSP(structure[0], filename, acc_array='Wilke')
-			AminoAcid = {	'A':129, 'P':159, 'N':195, 'H':224,
-							'V':174, 'Y':263, 'C':167, 'K':236,
-							'I':197, 'F':240, 'Q':225, 'S':155,
-							'L':201, 'W':285, 'E':223, 'T':172,
-							'M':224, 'R':274, 'G':104, 'D':193}
-			sec_struct = []
-			SASA = []
-			for aa in dssp:
-				if   aa[2] == 'G' or aa[2] == 'H' or aa[2] == 'I': ss = 'H'
-				elif aa[2] == 'B' or aa[2] == 'E':                 ss = 'S'
-				elif aa[2] == 'S' or aa[2] == 'T' or aa[2] == '-': ss = 'L'
-				sec_struct.append(ss)
-				sasa = AminoAcid[aa[1]]*aa[3]
-				if sasa <= 25:      sasa = 'C'
-				elif 25 < sasa < 40:sasa = 'B'
-				elif sasa >= 40:    sasa = 'S'
-				SASA.append(sasa)
-			''' Secondary structure measurement '''
-			H = len([x for x in sec_struct if x == 'H'])
-			S = len([x for x in sec_struct if x == 'S'])
-			L = len([x for x in sec_struct if x == 'L'])
-			total = len(sec_struct)
-			ratio = (H+S)/total
-			limit = 1
-			slope = 10
-			bias  = 0.5
-			SS = limit/(1+np.exp(slope*(bias-ratio)))
-			''' SASA measurement '''
-			surface = len([x for x in SASA if x == 'S'])
-			boundery = len([x for x in SASA if x == 'B'])
-			in_core = len([x for x in SASA if x == 'C'])
-			total = len(SASA)
-			percent = (in_core*100)/total
-			Core = (2.50662/math.sqrt(2*(math.pi)))*math.exp(-((percent-30)**2)/100)
-			''' Radius of gyration measurement '''
-			coord = list()
-			mass = list()
-			Structure = open(filename, 'r')
-			for line in Structure:
-				try:
-					line = line.split()
-					x = float(line[6])
-					y = float(line[7])
-					z = float(line[8])
-					coord.append([x, y, z])
-					if   line[-1] == 'C': mass.append(12.0107)
-					elif line[-1] == 'O': mass.append(15.9994)
-					elif line[-1] == 'N': mass.append(14.0067)
-					elif line[-1] == 'S': mass.append(32.065)
-				except: pass
-			xm = [(m*i, m*j, m*k) for (i, j, k), m in zip(coord, mass)]
-			tmass = sum(mass)
-			rr = sum(mi*i + mj*j + mk*k for (i, j, k), (mi, mj, mk) in zip(coord, xm))
-			mm = sum((sum(i)/tmass)**2 for i in zip(*xm))
-			rg = math.sqrt(rr/tmass-mm)
-			Rg = (2.50662/math.sqrt(2*(math.pi)))*math.exp(-((rg-12)**2)/40)
-			''' The metric '''
-			TheMetric = sum([SS, Core, Rg])/3
-			if TheMetric <= 0.8: choice = False
-			else: choice = True
-			return(round(TheMetric, 5), choice)
-	def fold(self, P, S, C):
-		''' Folds a structure using phi/psi angles and contact map '''
+				while len(futures) < 2 * self.workers:
+					if not candidates:
+						tic = time.process_time()
+						sampled = list(zip(*self.sample(batch)))
+						seconds = {'sample': (time.process_time() - tic) / batch}
+						if prefilter is not None:
+							tic = time.process_time()
+							reasons = prefilter(*zip(*sampled))
+							seconds['prefilter'] =\
+								(time.process_time() - tic) / batch
+							for reason in reasons:
+								if reason is not None:
+									funnel.write('prefilter', reason, seconds)
+							sampled = [candidate for candidate, reason\
+										in zip(sampled, reasons) if reason is None]
+							prefilter.report()
+						candidates.extend((candidate, seconds)\
+										for candidate in sampled)
+						continue
+					candidate, seconds = candidates.popleft()
+					futures[pool.submit(FoldJob, candidate)] = seconds
+				done, running = concurrent.futures.wait(futures,
+						return_when=concurrent.futures.FIRST_COMPLETED)
+				for future in done:
+					seconds = futures.pop(future)
+					result = future.result()
+					steps = dict(seconds, **result['seconds'])
+					if result['error'] is not None:
+						funnel.write(result['stage'], result['error'], steps)
+						continue
+					components = dict(result['components'], SQM=result['SQM'])
+					if result['pass'] == False:
+						funnel.write('SQM', 'SQM <= 0.8', steps, components)
+						continue
+					funnel.write('accepted', None, steps, components)
+					yield(result['SQM'], result['text'])
+		finally:
+			for future in futures: future.cancel()
+	def SQM(self, structure, components=False):
+		'''
+		Structure Quality Metric:
+		Calculates the ratio of helices and sheets to loops, the the percent of amino
+		acids comprising the structure core, and the radius of gyration as values
+		between 0.0-1.0, it then averages the three values. Returns a value between
+		0.0-1.0 where good structure > 0.8, with components=True also returns the
+		three values, their raw measurements, and the CPU seconds spent in DSSP.
+		The structure is a .pdb filename or a pose, which is measured in memory
+		'''
+		tic = time.process_time()
+		if isinstance(structure, str): dssp = DSSP(structure)
+		else: dssp = PoseDSSP(structure)
+		toc = time.process_time() - tic
+		AminoAcid = {	'A':129, 'P':159, 'N':195, 'H':224,
+						'V':174, 'Y':263, 'C':167, 'K':236,
+						'I':197, 'F':240, 'Q':225, 'S':155,
+						'L':201, 'W':285, 'E':223, 'T':172,
+						'M':224, 'R':274, 'G':104, 'D':193}
+		sec_struct = []
+		SASA = []
+		for aa in dssp:
+			if   aa[2] == 'G' or aa[2] == 'H' or aa[2] == 'I': ss = 'H'
+			elif aa[2] == 'B' or aa[2] == 'E':                 ss = 'S'
+			elif aa[2] == 'S' or aa[2] == 'T' or aa[2] == '-': ss = 'L'
+			sec_struct.append(ss)
+			if aa[3] == 'NA':
+				raise ValueError('DSSP has no accessibility for residue {} ({})'\
+				.format(aa[0], aa[1]))
+			sasa = AminoAcid[aa[1]]*aa[3]
+			if sasa <= 25:      sasa = 'C'
+			elif 25 < sasa < 40:sasa = 'B'
+			elif sasa >= 40:    sasa = 'S'
+			SASA.append(sasa)
+		''' Secondary structure measurement '''
+		H = len([x for x in sec_struct if x == 'H'])
+		S = len([x for x in sec_struct if x == 'S'])
+		L = len([x for x in sec_struct if x == 'L'])
+		total = len(sec_struct)
+		ratio = (H+S)/total
+		limit = 1
+		slope = 10
+		bias  = 0.5
+		SS = limit/(1+np.exp(slope*(bias-ratio)))
+		''' SASA measurement '''
+		surface = len([x for x in SASA if x == 'S'])
+		boundery = len([x for x in SASA if x == 'B'])
+		in_core = len([x for x in SASA if x == 'C'])
+		total = len(SASA)
+		percent = (in_core*100)/total
+		Core = (2.50662/math.sqrt(2*(math.pi)))*math.exp(-((percent-30)**2)/100)
+		''' Radius of gyration measurement '''
+		if isinstance(structure, str):
+			with open(structure, 'r') as Structure:
+				atoms = [line for line in Structure\
+				if line.startswith(('ATOM', 'HETATM'))]
+			coord = np.array([(line[30:38], line[38:46], line[46:54])\
+			for line in atoms], dtype=np.float64)
+			element = [line[76:78].strip() for line in atoms]
+		else: coord, element = PoseAtoms(structure)
+		rg = RadiusOfGyration(coord, element)
+		Rg = (2.50662/math.sqrt(2*(math.pi)))*math.exp(-((rg-12)**2)/40)
+		''' The metric '''
+		TheMetric = sum([SS, Core, Rg])/3
+		if TheMetric <= 0.8: choice = False
+		else: choice = True
+		if components:
+			return(round(TheMetric, 5), choice, {'SS': SS, 'Core': Core,
+					'Rg': Rg, 'ratio': ratio, 'core': percent, 'rg': rg,
+					'dssp': toc})
+		return(round(TheMetric, 5), choice)
+	def scorefxn(self):
+		''' The score function that relaxes a folded structure '''
+		scorefxn = get_fa_scorefxn()
+		score_manager = pyrosetta.rosetta.core.scoring.ScoreTypeManager()
+		atom_pair_constraint = score_manager.score_type_from_name('atom_pair_constraint')
+		rama_prepro = score_manager.score_type_from_name('rama_prepro')
+		scorefxn.set_weight(atom_pair_constraint, 5)
+		scorefxn.set_weight(rama_prepro, 5)
+		return(scorefxn)
+	def fold(self, P, S, C, scorefxn=None, filename='backbone.pdb',
+				separation=3, top=None):
+		'''
+		Folds a structure using phi/psi angles and contact map, relaxing it
+		with the given score function or a new one from scorefxn(). The
+		contact map is constrained through Restraints() with the given
+		minimum sequence separation and top shortest distances per residue.
+		The fold happens in memory, returns the pose and only exports it to
+		a .pdb file if a filename is given
+		'''
 		P = np.ndarray.tolist(P)
 		S = np.ndarray.tolist(S)
 		size = int(len(P))
@@ -1105,59 +1798,52 @@ class BACKBONE():
 		for count, (phi, psi) in enumerate(zip(P, S)):
 			pose.set_phi(count+1, float(phi))
 			pose.set_psi(count+1, float(psi))
-		pose.dump_pdb('angles.pdb')
-		structure = Bio.PDB.PDBParser().get_structure('angles', 'angles.pdb')
-		dssp = Bio.PDB.DSSP(structure[0], 'angles.pdb', acc_array='Wilke')
-		ppb = Bio.PDB.Polypeptide.PPBuilder()
-		chain = ppb.build_peptides(structure, aa_only=False)[0]
-		SS = []
-		for aa in dssp:
-			if aa[2] == 'G' or aa[2] == 'H' or aa[2] == 'I': SSname = 'H'
-			elif aa[2] == 'B' or aa[2] == 'E': SSname = 'S'
-			else: SSname = 'L'
-			SS.append(SSname)
-		try:
-			for i in enumerate(reversed(SS)):
-				if i[1] != 'L':
-					num = i[0]
-					break
-			for model in structure:
-				for chain in model:
-					for i in reversed(range(150-num+1, 150+1)):
-						chain.detach_child((' ', i, ' '))
-			io = Bio.PDB.PDBIO()
-			io.set_structure(structure)
-			io.save('turnicated.pdb')
-			os.remove('angles.pdb')
-			pose = pose_from_pdb('turnicated.pdb')
-		except:
-			os.remove('angles.pdb')
+		try: TrimLoop(pose)
+		except ValueError:
 			print('[-] Generated structure not satisfactory')
-			raise ValueError('Unsatisfactory structure')
-		size = pose.residues.__len__()
-		with open('constraints.cst', 'w') as thefile:
-			for a in range(1, size+1):
-				for A in range(1, size+1):
-					if C[a][A] !=0:
-						line = 'AtomPair CA {} CA {} GAUSSIANFUNC {} 1.0\n'\
-						.format(a, A, C[a][A])
-						thefile.write(line)
-		con = pyrosetta.rosetta.protocols.constraint_movers.ConstraintSetMover()
-		con.constraint_file('constraints.cst')
-		con.add_constraints(True)
-		con.apply(pose)
-		scorefxn = get_fa_scorefxn()
-		score_manager = pyrosetta.rosetta.core.scoring.ScoreTypeManager()
-		atom_pair_constraint = score_manager.score_type_from_name('atom_pair_constraint')
-		rama_prepro = score_manager.score_type_from_name('rama_prepro')
-		scorefxn.set_weight(atom_pair_constraint, 5)
-		scorefxn.set_weight(rama_prepro, 5)
+			raise
+		size = pose.size()
+		C = np.asarray(C)[:size, :size]
+		AtomPairs(pose, *Restraints(C, separation, top))
+		if scorefxn is None: scorefxn = self.scorefxn()
 		relax = pyrosetta.rosetta.protocols.relax.FastRelax()
 		relax.set_scorefxn(scorefxn)
-		os.remove('turnicated.pdb')
-		os.remove('constraints.cst')
 		relax.apply(pose)
-		pose.dump_pdb('backbone.pdb')
+		if filename: pose.dump_pdb(filename)
+		return(pose)
+
+def FoldInit():
+	''' Set up the relax score function of a folding worker process once '''
+	global FoldScore
+	FoldScore = BACKBONE().scorefxn()
+
+def FoldJob(candidate):
+	'''
+	Fold and score one (P, S, C) candidate in a folding worker, in memory
+	without any file. Returns the SQM, whether it passes (and if it does
+	its PDB text), its components, the error and the stage it was raised at
+	(fold or SQM) if it failed, and the CPU seconds of every step
+	'''
+	BB = BACKBONE()
+	result = {'error': None, 'stage': None, 'seconds': {}}
+	tic = time.process_time()
+	try: pose = BB.fold(*candidate, scorefxn=FoldScore, filename=None)
+	except Exception as TheError:
+		result.update({'error': repr(TheError), 'stage': 'fold'})
+	result['seconds']['fold'] = time.process_time() - tic
+	if result['error'] is not None: return(result)
+	tic = time.process_time()
+	try: metric, choice, components = BB.SQM(pose, components=True)
+	except Exception as TheError:
+		result.update({'error': repr(TheError), 'stage': 'SQM'})
+		result['seconds']['sqm'] = time.process_time() - tic
+		return(result)
+	dssp = components.pop('dssp')
+	result['seconds']['dssp'] = dssp
+	result['seconds']['sqm'] = time.process_time() - tic - dssp
+	result.update({'SQM': metric, 'pass': choice, 'components': components})
+	if choice: result['text'] = PoseText(pose)
+	return(result)
 
 class FRAGMENT():
 	''' A neural network that generates 3-mer and 9-mer fragments'''
@@ -1269,8 +1955,11 @@ class FRAGMENT():
 			dset = y.create_dataset('default', data=Y)
 		with h5py.File('X.hdf5', 'w') as x:
 			dset = x.create_dataset('default', data=X)
-	def fold(self, p, s, o):
-		''' Use the angle output of the LSTM network to fold a structure '''
+	def fold(self, p, s, o, filename='backbone.pdb'):
+		'''
+		Use the angle output of the LSTM network to fold a structure,
+		returns the pose and only exports it if a filename is given
+		'''
 		size = int(len(p))
 		Vs = []
 		for numb in range(size): Vs.append('V')
@@ -1282,7 +1971,8 @@ class FRAGMENT():
 			pose.set_psi(  count, float(S))
 			pose.set_omega(count, float(O))
 			count += 1
-		pose.dump_pdb('backbone.pdb')
+		if filename: pose.dump_pdb(filename)
+		return(pose)
 	def fragments(self, aa='AAA', ss='HHH', p=[], s=[], o=[]):
 		''' Generate 3-mer and 9-mer fragments '''
 		# 3-mer
@@ -1425,14 +2115,78 @@ class FRAGMENT():
 			o = o[:len(aa)]
 			return(p, s, o)
 
+class Daemon(socketserver.StreamRequestHandler):
+	'''
+	The request handler of the daemon mode, the generator and PyRosetta are
+	only set up once when the daemon starts. Every request is a JSON line,
+	every result is streamed back as a JSON line as soon as it is ready and
+	a request ends with a {"done": true} (or an {"error": ...}) line:
+	{"request": "generate", "structures": N, "prefix": "design"}
+	{"request": "sample", "n": N}
+	{"request": "fold", "P": [...], "S": [...], "C": [[...], ...]}
+	'''
+	def handle(self):
+		for line in self.rfile:
+			try:
+				message = json.loads(line)
+				requests = {'generate': self.generate,
+							'sample': self.sample,
+							'fold': self.fold}
+				request = requests[message.pop('request')]
+				for result in request(**message): self.send(result)
+				self.send({'done': True})
+			except Exception as TheError: self.send({'error': repr(TheError)})
+	def send(self, result):
+		''' Stream one result line back to the client '''
+		self.wfile.write((json.dumps(result) + '\n').encode())
+		self.wfile.flush()
+	def generate(self, structures=1, prefix='design', batch=64):
+		''' Generate, fold, and filter structures '''
+		backbones = self.server.BB.backbones(batch)
+		for i, (metric, text) in zip(range(1, structures+1), backbones):
+			filename = os.path.abspath('{}{}.pdb'.format(prefix, i))
+			with open(filename, 'w') as f: f.write(text)
+			yield({'structure': filename, 'SQM': metric})
+		backbones.close()
+	def sample(self, n=1):
+		''' Sample phi/psi angles and contact maps from the generator '''
+		for P, S, C in zip(*self.server.BB.sample(n)):
+			yield({'P': P.tolist(), 'S': S.tolist(), 'C': C.tolist()})
+	def fold(self, P, S, C, filename='backbone.pdb'):
+		''' Fold and score one structure '''
+		BB = self.server.BB
+		filename = os.path.abspath(filename)
+		pose = BB.fold(np.array(P), np.array(S), np.array(C), filename=filename)
+		metric, choice = BB.SQM(pose)
+		yield({'structure': filename, 'SQM': metric, 'pass': choice})
+
+def Serve(filename, handler, **resources):
+	'''
+	Run a daemon on a Unix socket, connections are handled one at a time by
+	the handler with the preloaded resources as attributes of the server
+	'''
+	if os.path.exists(filename): os.remove(filename)
+	server = socketserver.UnixStreamServer(filename, handler)
+	for name, value in resources.items(): setattr(server, name, value)
+	print('\x1b[32m[+] Listening on {}\x1b[0m'.format(filename))
+	try: server.serve_forever()
+	except KeyboardInterrupt: pass
+	finally:
+		server.server_close()
+		os.remove(filename)
+		DSSP.evict()
+
 class SEQUENCE():
 	'''  '''
 	pass
 
 def main():
 	if args.DatasetBack:
-		DB = Dataset()
-		DB.build(sys.argv[2])
+		DB = Dataset(args.workers)
+		DB.build(args.DatasetBack[0])
+	elif args.RefreshBack:
+		DB = Dataset(args.workers)
+		DB.Refresh()
 	elif args.DatasetFrag:  #### ADD TO READ ME
 		DF = Vall()
 		DF.vall()
@@ -1443,17 +2197,25 @@ def main():
 		DS.NonProtein('PDBDatabase')
 		DS.Break('PDBDatabase')
 		DS.Renumber('PDBDatabase')
+		DS.Purge('PDBDatabase')
 		DS.DatasetAsPSaM('cln')
 		DS.Header(280, 'AsPSa')
 		DS.Fill('dataset_header.csv')
 	elif args.TrainBack:
 		print('\x1b[33m[.] Training...\x1b[0m')
 		BB = BACKBONE()
-		BB.train('dataset_PS.csv', 'dataset_DM.csv')
+		BB.train('PS+CM.hdf5')
 		print('\x1b[32m[+] Training done\x1b[0m')
 
 	 #### ADD TO READ ME GENERATE BACKBONE
 
+	elif args.summary:
+		Funnel(args.summary).summary()
+	elif args.daemon:
+		BB = BACKBONE(args.workers)
+		BB.gan(choice='load')
+		try: Serve(args.daemon, Daemon, BB=BB)
+		finally: BB.close()
 	elif args.TrainFrag:  #### ADD TO READ ME
 		F = FRAGMENT()
 		F.lstm()
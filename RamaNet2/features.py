@@ -0,0 +1,323 @@
+'''
+The NumPy featurisation of contact maps, their sparse HDF5 storage, and the
+prefilter of generated backbones. Only NumPy, SciPy, and h5py are needed so
+these can be imported and tested without TensorFlow or PyRosetta
+'''
+
+import os
+import h5py
+import collections
+import scipy.spatial
+import numpy as np
+
+def ContactMap(CA, cutoff=12, size=None, tree=256):
+	'''
+	The CA-CA distance map of an (L, 3) array of CA coordinates where every
+	distance above the cutoff is 0, padded with zeros or truncated to a
+	(size, size) map. Rows of missing atoms (NaN coordinates) stay 0. Up to
+	tree residues all distances are computed with NumPy broadcasting, larger
+	structures only measure the pairs a KD-tree finds within the cutoff
+	'''
+	CA = np.asarray(CA, dtype=np.float64).reshape(-1, 3)
+	if size is None: size = len(CA)
+	CA = CA[:size]
+	CM = np.zeros((size, size))
+	index = np.flatnonzero(np.isfinite(CA).all(axis=1))
+	CA = CA[index]
+	if len(index) <= tree:
+		D = np.sqrt(((CA[:, None, :] - CA[None, :, :])**2).sum(axis=-1))
+		CM[np.ix_(index, index)] = np.where(D <= cutoff, D, 0)
+	else:
+		KD = scipy.spatial.cKDTree(CA)
+		i, j = KD.query_pairs(cutoff, output_type='ndarray').T
+		D = np.sqrt(((CA[i] - CA[j])**2).sum(axis=-1))
+		CM[index[i], index[j]] = D
+		CM[index[j], index[i]] = D
+	return(CM)
+
+class ContactWriter():
+	'''
+	Buffered writer of a sparse contact map dataset. Only the upper triangle
+	contacts (non-zero distances) of each structure's map are kept, as COO
+	i and j (uint16) and d arrays in an HDF5 file, along with the ids of the
+	structures and the offsets of each structure's contacts
+	'''
+	def __init__(self, filename, size=0, dtype=np.float16, append=False,
+				buffer=1024):
+		self.buffer = buffer
+		self.ids = []
+		self.contacts = []
+		if append and os.path.isfile(filename):
+			self.data = h5py.File(filename, 'a')
+			self.size = max(size, int(self.data.attrs['size']))
+			return
+		self.data = h5py.File(filename, 'w')
+		self.size = size
+		self.data.create_dataset('ids', (0,), maxshape=(None,),
+								dtype=h5py.string_dtype())
+		self.data.create_dataset('offsets', data=[0], maxshape=(None,),
+								dtype=np.int64)
+		for name, kind in (('i', np.uint16), ('j', np.uint16), ('d', dtype)):
+			self.data.create_dataset(name, (0,), maxshape=(None,), dtype=kind,
+									chunks=(65536,))
+	def __enter__(self):
+		return(self)
+	def __exit__(self, *exception):
+		self.close()
+	def write(self, ID, CM):
+		''' Add one structure's dense contact map to the dataset '''
+		CM = np.asarray(CM)
+		i, j = np.nonzero(np.triu(CM, 1))
+		self.ids.append(ID)
+		self.contacts.append((i, j, CM[i, j]))
+		self.size = max(self.size, len(CM))
+		if len(self.ids) == self.buffer: self.flush()
+	def flush(self):
+		''' Append the buffered structures to the file '''
+		if self.ids == []: return
+		offsets = self.data['offsets']
+		start = offsets[-1]
+		counts = np.cumsum([len(d) for i, j, d in self.contacts])
+		for n, name in enumerate(('i', 'j', 'd')):
+			column = self.data[name]
+			column.resize((start + counts[-1],))
+			column[start:] = np.concatenate([c[n] for c in self.contacts])
+		offsets.resize((len(offsets) + len(counts),))
+		offsets[-len(counts):] = start + counts
+		ids = self.data['ids']
+		ids.resize((len(ids) + len(self.ids),))
+		ids[-len(self.ids):] = self.ids
+		self.data.attrs['size'] = self.size
+		self.ids = []
+		self.contacts = []
+	def close(self):
+		self.flush()
+		self.data.attrs['size'] = self.size
+		self.data.close()
+
+class Contacts():
+	'''
+	Loader of a sparse contact map dataset written by ContactWriter. Index
+	with an int, a slice, or an array of row numbers to get the dense
+	symmetric (size, size) maps of those structures, only the indexed
+	structures' contacts are read from disk
+	'''
+	def __init__(self, filename, dtype=np.float32):
+		self.data = h5py.File(filename, 'r')
+		self.dtype = dtype
+		self.ids = list(self.data['ids'].asstr()[()])
+		self.offsets = self.data['offsets'][()]
+		self.size = int(self.data.attrs['size'])
+		self.shape = (len(self.ids), self.size, self.size)
+	def __enter__(self):
+		return(self)
+	def __exit__(self, *exception):
+		self.close()
+	def __len__(self):
+		return(len(self.ids))
+	def __getitem__(self, index):
+		if isinstance(index, (int, np.integer)):
+			if index < 0: index += len(self)
+			if not 0 <= index < len(self):
+				raise IndexError('row {} is out of range'.format(index))
+			return(self[[index]][0])
+		rows = np.arange(len(self))[index]
+		CM = np.zeros((len(rows), self.size, self.size), dtype=self.dtype)
+		if len(rows) == 0: return(CM)
+		start, stop = self.offsets[rows], self.offsets[rows + 1]
+		counts = stop - start
+		first, last = start.min(), stop.max()
+		if last - first <= 2 * counts.sum():
+			# One read of the whole span, then pick each row's contacts
+			span = np.concatenate([np.arange(a, b) for a, b\
+					in zip(start - first, stop - first)] + [[]]).astype(int)
+			i, j, d = (self.data[name][first:last][span]\
+						for name in ('i', 'j', 'd'))
+		else:
+			i, j, d = (np.concatenate([self.data[name][a:b] for a, b\
+						in zip(start, stop)]) for name in ('i', 'j', 'd'))
+		row = np.repeat(np.arange(len(rows)), counts)
+		keep = (i < self.size) & (j < self.size)
+		row, i, j, d = row[keep], i[keep], j[keep], d[keep]
+		CM[row, i, j] = d
+		CM[row, j, i] = d
+		return(CM)
+	def close(self):
+		self.data.close()
+
+class Prefilter():
+	'''
+	A cheap check of raw generator output (phi/psi angles in degrees and a
+	contact map) before any PyRosetta work. A candidate is rejected for:
+	Ramachandran: too many residues in (phi, psi) bins that are rare in the
+	training angles of dataset_PS.csv before the trailing loop and padding,
+	Structure: too few helix and sheet residues from the angles before the
+	trailing loop, Symmetry: an asymmetric contact map, Triangle: too many
+	triangle inequality violations between the contacts. The thresholds are
+	calibrated once on the dataset and saved to a .npz file, Counts of the
+	rejection reasons are kept in reasons
+	'''
+	def __init__(self, calibration='prefilter.npz', PS_file='dataset_PS.csv',
+				CM_file='dataset_CM.hdf5', bins=36, quantile=0.99,
+				holdout=0.1, tolerance=0.5):
+		self.reasons = collections.Counter()
+		if not os.path.isfile(calibration):
+			values = self.Calibrate(PS_file, CM_file, bins, quantile, holdout,
+									tolerance)
+			np.savez(calibration, **values)
+		with np.load(calibration) as values:
+			self.table = values['table']
+			for name in ('floor', 'outliers', 'structure', 'symmetry',
+						'triangle', 'cutoff', 'tolerance', 'passed'):
+				value = float(values[name])
+				setattr(self, name, None if np.isnan(value) else value)
+	def Natives(self, PS_file):
+		''' The IDs and the (n, 150) phi and psi angles of dataset_PS.csv '''
+		IDs, P, S = [], [], []
+		with open(PS_file) as PSf:
+			next(PSf)
+			for line in PSf:
+				line = line.strip().split(',')
+				IDs.append(line[0])
+				P.append(line[1::2])
+				S.append(line[2::2])
+		return(IDs, np.array(P, dtype=np.float64), np.array(S, dtype=np.float64))
+	def Table(self, P, S, bins=36):
+		'''
+		The probability of every (phi, psi) bin in the training angles, the
+		zero padding of shorter structures is not counted
+		'''
+		edges = np.linspace(0, 360, bins+1)
+		real = (P != 0) | (S != 0)
+		table = np.histogram2d(P[real], S[real], [edges, edges])[0]
+		return(table / table.sum())
+	def Calibrate(self, PS_file, CM_file, bins=36, quantile=0.99,
+					holdout=0.1, tolerance=0.5):
+		'''
+		Derive the thresholds from the dataset: the density table is built on
+		the training structures and its floor is the density under which the
+		rarest bins hold 1-quantile of the training residues. The outlier,
+		structure, and triangle thresholds are the quantiles a held-out set of
+		native structures (holdout of the dataset, between 100 and 1000 of
+		them, at most half) stays within. The symmetry threshold is not taken
+		from the dataset: ContactWriter stores one triangle of every map and
+		Contacts mirrors it, so the asymmetry of every native is exactly 0 and
+		any quantile of it would reject the smallest generator noise. Instead
+		the mean asymmetry may be up to the distance tolerance, the same slack
+		every distance gets in the Triangle check, and it is saved with the
+		other thresholds. The contact cutoff is the largest distance in the
+		contact maps. The thresholds are then validated by the fraction of the
+		held-out natives that pass
+		'''
+		IDs, P, S = self.Natives(PS_file)
+		order = np.random.RandomState(0).permutation(len(IDs))
+		n = max(min(max(int(len(IDs) * holdout), 100), len(IDs) // 2, 1000), 1)
+		test, train = order[:n], order[n:]
+		if len(train) == 0: train = order
+		self.table = self.Table(P[train], S[train], bins)
+		density = np.sort(self.table.ravel())
+		k = np.searchsorted(np.cumsum(density), 1 - quantile, side='right')
+		self.floor = float(density[min(k, len(density)-1)])
+		self.outliers, self.structure = None, None
+		self.symmetry, self.tolerance = tolerance, tolerance
+		self.triangle, self.cutoff = None, None
+		fractions, outliers = [], []
+		for p, s in zip(P[test], S[test]):
+			fraction, end = self.Structured(p, s)
+			fractions.append(fraction)
+			outliers.append(self.Outliers(p, s, end) if end else 1.0)
+		self.outliers = float(np.quantile(outliers, quantile))
+		self.structure = float(np.quantile(fractions, 1 - quantile))
+		C = np.zeros((len(test), 150, 150))
+		known = []
+		if os.path.isfile(CM_file):
+			with Contacts(CM_file) as CMf:
+				index = {ID: row for row, ID in enumerate(CMf.ids)}
+				known = [t for t in range(len(test)) if IDs[test[t]] in index]
+				C[known] = CMf[[index[IDs[test[t]]] for t in known]]
+		if known:
+			self.cutoff = float(C.max())
+			violations = [self.Violations(c) for c in C[known]]
+			self.triangle = float(np.quantile(violations, quantile))
+		else:
+			print('\x1b[33m[.] No contact maps in {}, skipping the Triangle '
+			'check\x1b[0m'.format(CM_file))
+		self.passed = np.mean([self.check(p, s, c) is None\
+							for p, s, c in zip(P[test], S[test], C)])
+		print('\x1b[32m[+] Prefilter calibrated on {} structures, floor {:.2e}, '
+		'outliers {:.3f}, structure {:.3f}, triangle {}, {:.1%} of {} held-out '
+		'natives pass\x1b[0m'.format(len(train), self.floor, self.outliers,
+		self.structure, self.triangle, self.passed, len(test)))
+		if self.passed < quantile - 0.05:
+			print('\x1b[31m[-] Only {:.1%} of the held-out natives pass the '
+			'prefilter\x1b[0m'.format(self.passed))
+		values = {name: np.nan if getattr(self, name) is None\
+				else getattr(self, name) for name in ('floor', 'outliers',
+				'structure', 'symmetry', 'triangle', 'cutoff', 'tolerance',
+				'passed')}
+		return(dict(values, table=self.table))
+	def __call__(self, P, S, C):
+		'''
+		Check a batch of (n, L) phi and psi angles and (n, L, L) contact
+		maps, returns the rejection reason of every candidate (None if it
+		passes)
+		'''
+		P, S, C = np.asarray(P), np.asarray(S), np.asarray(C, dtype=np.float32)
+		reasons = []
+		for p, s, c in zip(P, S, C):
+			reason = self.check(p, s, c)
+			self.reasons[reason or 'Passed'] += 1
+			reasons.append(reason)
+		return(reasons)
+	def Structured(self, p, s):
+		'''
+		The fraction of helix and sheet residues before the trailing loop and
+		padding, and where that trailing loop starts
+		'''
+		phi = np.where(p > 180, p - 360, p)
+		psi = np.where(s > 180, s - 360, s)
+		helix = (-160 < phi) & (phi < -20) & (-120 < psi) & (psi < 50)
+		sheet = (phi < -40) & ((psi > 90) | (psi < -150))
+		structured = np.flatnonzero(helix | sheet)
+		if len(structured) == 0: return(0.0, 0)
+		end = structured[-1] + 1
+		return(len(structured) / end, end)
+	def Outliers(self, p, s, end):
+		''' The fraction of the first end residues in rare (phi, psi) bins '''
+		bins = len(self.table)
+		i = np.clip((p[:end] % 360 * bins / 360).astype(int), 0, bins-1)
+		j = np.clip((s[:end] % 360 * bins / 360).astype(int), 0, bins-1)
+		return(np.mean(self.table[i, j] < self.floor))
+	def Violations(self, c):
+		'''
+		The fraction of contacts shorter than the cutoff that are longer than
+		a path through another contact by more than the tolerance
+		'''
+		D = (c + c.T) / 2
+		M = (D > 0) & (D < self.cutoff)
+		np.fill_diagonal(M, False)
+		if not M.any(): return(0.0)
+		legs = np.where(M, D, np.inf)
+		paths = np.min(legs[:, :, None] + legs[None, :, :], axis=1)
+		return(np.sum(M & (D > paths + self.tolerance)) / M.sum())
+	def check(self, p, s, c):
+		'''
+		The rejection reason of one candidate, None if it passes. Only the
+		residues before the trailing loop and padding are checked
+		'''
+		fraction, end = self.Structured(p, s)
+		if end == 0: return('Structure')
+		if self.Outliers(p, s, end) > self.outliers: return('Ramachandran')
+		if fraction < self.structure: return('Structure')
+		upper = np.triu_indices(len(c), 1)
+		if np.mean(np.abs(c - c.T)[upper]) > self.symmetry: return('Symmetry')
+		if self.triangle is not None and self.Violations(c) > self.triangle:
+			return('Triangle')
+		return(None)
+	def report(self):
+		''' Print the counts of the rejection reasons '''
+		total = sum(self.reasons.values())
+		text = ', '.join('{} {}'.format(reason, count) for reason, count\
+				in self.reasons.most_common() if reason != 'Passed')
+		print('\x1b[33m[.] Prefilter passed {} of {}, rejected: {}\x1b[0m'
+		.format(self.reasons['Passed'], total, text or 'none'))
@@ -0,0 +1,91 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import features
+
+def Helix(length, random):
+	''' The phi/psi angles (in 0-360 degrees) and CA coordinates of a helix '''
+	p = random.normal(-63, 8, length) % 360
+	s = random.normal(-42, 8, length) % 360
+	t = np.radians(100) * np.arange(length)
+	CA = np.stack([2.3 * np.cos(t), 2.3 * np.sin(t), 1.5 * np.arange(length)], 1)
+	return(p, s, CA + random.normal(0, 0.1, CA.shape))
+
+def Natives(directory, lengths, seed=0):
+	''' Write a dataset_PS.csv and dataset_CM.hdf5 of zero padded helices '''
+	random = np.random.RandomState(seed)
+	rows = []
+	PS_file = os.path.join(directory, 'dataset_PS.csv')
+	CM_file = os.path.join(directory, 'dataset_CM.hdf5')
+	with open(PS_file, 'w') as f, features.ContactWriter(CM_file, 150) as CMf:
+		f.write('PDB_ID' + ''.join(',phi_{},psi_{}'.format(i, i)
+				for i in range(1, 151)) + '\n')
+		for n, length in enumerate(lengths):
+			p, s, CA = Helix(length, random)
+			P, S = np.zeros(150), np.zeros(150)
+			P[:length], S[:length] = p, s
+			C = features.ContactMap(CA, 12, 150)
+			angles = ','.join('{},{}'.format(a, b) for a, b in zip(P, S))
+			f.write('{}.pdb,{}\n'.format(n, angles))
+			CMf.write('{}.pdb'.format(n), C)
+			rows.append((P, S, C))
+	return(PS_file, CM_file, rows)
+
+def Prefilter(directory, lengths):
+	PS_file, CM_file, rows = Natives(directory, lengths)
+	prefilter = features.Prefilter(os.path.join(directory, 'prefilter.npz'),
+				PS_file, CM_file)
+	return(prefilter, rows)
+
+def test_prefilter_accepts_short_padded_natives(tmp_path):
+	lengths = [80, 90, 110, 120, 140, 150] * 50
+	prefilter, rows = Prefilter(str(tmp_path), lengths)
+	passed = {length: [] for length in set(lengths)}
+	for length, (p, s, C) in zip(lengths, rows):
+		passed[length].append(prefilter.check(p, s, C) is None)
+	for length, checks in passed.items():
+		assert np.mean(checks) >= 0.95, length
+
+def test_prefilter_accepts_held_out_natives(tmp_path):
+	prefilter, rows = Prefilter(str(tmp_path), [80, 100, 120, 150] * 75)
+	assert prefilter.passed >= 0.95
+	random = np.random.RandomState(1)
+	for length in (85, 105, 135):
+		p, s, CA = Helix(length, random)
+		P, S = np.zeros(150), np.zeros(150)
+		P[:length], S[:length] = p, s
+		assert prefilter.check(P, S, features.ContactMap(CA, 12, 150)) is None
+
+def test_prefilter_rejects_loops(tmp_path):
+	prefilter, rows = Prefilter(str(tmp_path), [80, 100, 120, 150] * 75)
+	random = np.random.RandomState(2)
+	p = random.uniform(0, 360, 150)
+	s = random.uniform(0, 360, 150)
+	assert prefilter.check(p, s, np.zeros((150, 150))) == 'Ramachandran'
+	P, S, C = rows[0]
+	assert prefilter.check(np.zeros(150), np.zeros(150), C) == 'Structure'
+
+def test_prefilter_rejects_rare_angles(tmp_path):
+	prefilter, rows = Prefilter(str(tmp_path), [80, 100, 120, 150] * 75)
+	P, S, C = rows[1]
+	P, S = P.copy(), S.copy()
+	P[20:50], S[20:50] = 100, 260
+	assert prefilter.check(P, S, C) == 'Ramachandran'
+
+def test_prefilter_rejects_bad_contact_maps(tmp_path):
+	prefilter, rows = Prefilter(str(tmp_path), [80, 100, 120, 150] * 75)
+	P, S, C = rows[3]
+	assert prefilter.symmetry == prefilter.tolerance
+	noise = np.triu(np.random.RandomState(3).uniform(-0.2, 0.2, C.shape), 1)
+	assert prefilter.check(P, S, C + (C > 0) * noise) is None
+	asymmetric = C + np.triu(np.full(C.shape, 5.0), 1)
+	assert prefilter.check(P, S, asymmetric) == 'Symmetry'
+	impossible = C.copy()
+	i = np.arange(148)
+	impossible[i, i+2] = impossible[i+2, i] = 11.5
+	assert prefilter.check(P, S, impossible) == 'Triangle'
+	reasons = prefilter([P, P], [S, S], [C, impossible])
+	assert reasons == [None, 'Triangle']
+	assert prefilter.reasons == {'Passed': 1, 'Triangle': 1}